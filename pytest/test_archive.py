@@ -0,0 +1,112 @@
+import os.path as osp
+import shutil
+import tarfile
+import zipfile
+
+import pytest
+
+from uncompyle6.archive import archive_kind, archive_main, iter_members, source_name
+
+SRC_DIR = osp.join(osp.dirname(__file__), "..", "test", "bytecode_3.8")
+PYC_NAMES = ("01_for_continue.pyc", "01_extended_arg.pyc")
+
+
+def make_archives(tmp_path):
+    zip_path = str(tmp_path / "in.whl")
+    tar_path = str(tmp_path / "in.tar.gz")
+    with zipfile.ZipFile(zip_path, "w") as zip_file, tarfile.open(
+        tar_path, "w:gz"
+    ) as tar_file:
+        for name in PYC_NAMES:
+            zip_file.write(osp.join(SRC_DIR, name), "pkg/" + name)
+            tar_file.add(osp.join(SRC_DIR, name), "pkg/" + name)
+        zip_file.writestr("pkg/README", "not bytecode")
+    return zip_path, tar_path
+
+
+def test_iter_members(tmp_path):
+    zip_path, tar_path = make_archives(tmp_path)
+    assert archive_kind(zip_path) == "zip"
+    assert archive_kind(tar_path) == "tar"
+    assert archive_kind(osp.join(SRC_DIR, PYC_NAMES[0])) is None
+    for path in (zip_path, tar_path):
+        members = [(m.name, m.fp.read()) for m in iter_members(path)]
+        assert members == [
+            ("pkg/" + name, open(osp.join(SRC_DIR, name), "rb").read())
+            for name in PYC_NAMES
+        ]
+
+
+def test_source_name():
+    assert source_name("pkg/mod.pyc") == "pkg/mod.py"
+    assert source_name("/pkg/./mod.pyo") == "pkg/mod.py"
+    with pytest.raises(ValueError):
+        source_name("../mod.pyc")
+
+
+def test_archive_main(tmp_path):
+    zip_path, tar_path = make_archives(tmp_path)
+
+    out_zip = str(tmp_path / "out.zip")
+    assert archive_main([zip_path], out_zip) == (2, 2, 0, 0)
+    with zipfile.ZipFile(out_zip) as zip_file:
+        assert zip_file.namelist() == ["pkg/" + name[:-1] for name in PYC_NAMES]
+        zipped_source = zip_file.read("pkg/01_for_continue.py").decode("utf-8")
+    assert "continue" in zipped_source
+
+    out_dir = tmp_path / "out"
+    assert archive_main([zip_path, tar_path], str(out_dir)) == (4, 4, 0, 0)
+    for archive_name in ("in.whl", "in.tar.gz"):
+        source_path = out_dir / archive_name / "pkg" / "01_for_continue.py"
+        assert source_path.read_text(encoding="utf-8") == zipped_source
+
+
+def test_archive_options(tmp_path):
+    # These decompile to source that checks out.
+    names = ("00_while_true_pass.pyc", "01_for_continue.pyc")
+    in_dir = tmp_path / "in" / "pkg"
+    in_dir.mkdir(parents=True)
+    zip_path = str(tmp_path / "in.zip")
+    with zipfile.ZipFile(zip_path, "w") as zip_file:
+        for name in names:
+            shutil.copy(osp.join(SRC_DIR, name), str(in_dir))
+            zip_file.write(osp.join(SRC_DIR, name), "pkg/" + name)
+
+    # Directories are decompiled the same way, and line-number maps
+    # are written next to the source.
+    out_dir = tmp_path / "out"
+    result = archive_main(
+        [str(tmp_path / "in")], str(out_dir), do_linemaps=True, do_verify="syntax"
+    )
+    assert result == (2, 2, 0, 0)
+    source = (out_dir / "pkg" / "01_for_continue.py").read_text(encoding="utf-8")
+    assert "continue" in source
+    assert (out_dir / "pkg" / "01_for_continue.py.pymap").exists()
+
+    # Worker processes give the same source.
+    out_zip = str(tmp_path / "out.zip")
+    result = archive_main(
+        [zip_path],
+        out_zip,
+        do_verify="syntax",
+        do_linemaps=True,
+        linemap_format="json",
+        jobs=2,
+    )
+    assert result == (2, 2, 0, 0)
+    with zipfile.ZipFile(out_zip) as zip_file:
+        assert zip_file.read("pkg/01_for_continue.py").decode("utf-8") == source
+        assert "pkg/01_for_continue.py.pymap.json" in zip_file.namelist()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_archive_same_source_name(tmp_path, capsys, jobs):
+    # "a.pyc" and "a.pyo" would both be written to "a.py".
+    in_dir = tmp_path / "in"
+    in_dir.mkdir()
+    for suffix in (".pyc", ".pyo"):
+        shutil.copy(osp.join(SRC_DIR, PYC_NAMES[0]), str(in_dir / ("a" + suffix)))
+    out_dir = tmp_path / "out"
+    assert archive_main([str(in_dir)], str(out_dir), jobs=jobs) == (2, 1, 1, 0)
+    assert "already written to a.py" in capsys.readouterr().err
+    assert sorted(p.name for p in out_dir.iterdir()) == ["a.py"]
@@ -0,0 +1,39 @@
+import os.path as osp
+import time
+
+from uncompyle6 import batch
+
+SRC_DIR = osp.join(osp.dirname(__file__), "..", "test", "bytecode_3.8")
+
+
+def test_batch_main(tmp_path):
+    files = ["00_while_true_pass.pyc", "01_for_continue.pyc", "02_async_for.pyc"]
+    result = batch.batch_main(SRC_DIR, str(tmp_path), files, [], jobs=2)
+    assert result[:5] == (3, 3, 0, 0, 0)
+    assert sorted(r.filename for r in result.results) == files
+    assert all(r.status == batch.OKAY_STATUS for r in result.results)
+    for filename in files:
+        assert osp.exists(osp.join(tmp_path, filename[:-1]))
+
+
+def test_batch_timeout(tmp_path, monkeypatch):
+    def fake_main(in_base, out_base, files, source_files, outfile, **options):
+        if files[0] == "hang.pyc":
+            time.sleep(60)
+        print(files[0])
+        return 1, 1, 0, 0
+
+    # Worker processes are forked, so they see this.
+    monkeypatch.setattr(batch, "main", fake_main)
+    files = ["a.pyc", "hang.pyc", "b.pyc", "c.pyc"]
+    start = time.time()
+    result = batch.batch_main(
+        str(tmp_path), str(tmp_path), files, [], jobs=2, timeout=1
+    )
+    assert time.time() - start < 30
+    assert result[:5] == (4, 3, 1, 0, 1)
+    statuses = {r.filename: r.status for r in result.results}
+    assert statuses["hang.pyc"] == batch.TIMEOUT_STATUS
+    assert statuses["c.pyc"] == batch.OKAY_STATUS
+    outputs = {r.filename: r.output for r in result.results}
+    assert outputs["c.pyc"] == "c.pyc\n"
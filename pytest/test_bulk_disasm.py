@@ -0,0 +1,48 @@
+import json
+import os.path as osp
+from io import StringIO
+
+from xdis import load_module
+
+from uncompyle6.bulk_disasm import bulk_disassemble
+from uncompyle6.scanner import get_scanner
+
+TEST_DIR = osp.join(osp.dirname(__file__), "..", "test")
+FILES = [
+    osp.join(TEST_DIR, "bytecode_2.7", "05_if.pyc"),
+    osp.join(TEST_DIR, "bytecode_3.8", "04_async.pyc"),
+    osp.join(TEST_DIR, "bytecode_3.8", "02_async_for.pyc"),
+]
+
+
+def test_bulk_disassemble():
+    out = StringIO()
+    missing = osp.join(TEST_DIR, "no-such-file.pyc")
+    assert bulk_disassemble(FILES + [missing], out, jobs=2) == 1
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+
+    # Files come out in the order given.
+    files = []
+    for record in records:
+        if record["file"] not in files:
+            files.append(record["file"])
+    assert files == FILES + [missing]
+    assert "error" in records[-1]
+
+    for record in records[:-1]:
+        lengths = {
+            len(record[column])
+            for column in ("kind", "op", "offset", "attr", "pattr", "linestart")
+        }
+        assert len(lengths) == 1
+
+    # The columns hold what the scanner gives for the code object.
+    version, _, _, co, _, _, _, _ = load_module(FILES[1])
+    tokens, _ = get_scanner(version).ingest(co)
+    module = records[1]
+    assert module["file"] == FILES[1] and module["path"] == ["<module>"]
+    assert module["kind"] == [t.kind for t in tokens]
+    assert module["offset"] == [t.offset for t in tokens]
+
+    paths = [record["path"] for record in records if record["file"] == FILES[1]]
+    assert ["<module>", "CoroutineTest", "test_with_8"] in paths
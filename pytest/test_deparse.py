@@ -316,3 +316,17 @@ for i in range(2): ...
 .
 """.split("\n")
     parsed = get_parsed_for_fn(for_range_stmt)
+
+
+def test_nested_collection_positions():
+    code = compile("x = [[a, b], (c, [d])]\n", "<test>", "exec")
+    parsed = deparse(code, version=PYTHON_VERSION_TRIPLE)
+    text = parsed.text
+    for node_info in parsed.offsets.values():
+        node = node_info.node
+        fragment = text[node_info.start : node_info.finish]
+        if node.kind == "LOAD_NAME":
+            assert fragment == node.pattr
+        elif node.kind.startswith("BUILD_"):
+            assert fragment[0] in "[(" and fragment[-1] in "])"
+            assert fragment.count("[") == fragment.count("]")
@@ -0,0 +1,50 @@
+from xdis.version_info import PYTHON_VERSION_TRIPLE
+
+from uncompyle6.semantics.fragments import (
+    find_code_path,
+    fragment_map,
+    fragment_maps,
+)
+
+SOURCE = """
+def outer(a):
+    def f(b):
+        y = b + 1
+        return [z * y for z in range(b)]
+    return f(a)
+"""
+
+
+def test_fragment_map():
+    co = compile(SOURCE, "test.py", "exec")
+    f_code = find_code_path(co, "f")[-1]
+    fragment_maps.clear()
+
+    fmap = fragment_map(f_code, version=PYTHON_VERSION_TRIPLE)
+    # Only f is deparsed, not the code around it.
+    assert fmap.text.startswith("y = b + 1\n")
+    assert "outer" not in fmap.text
+
+    offsets = sorted(
+        offset
+        for name, offset in fmap.deparsed.offsets
+        if name == "f" and isinstance(offset, int)
+    )
+    for offset in offsets:
+        node_info = fmap.find(offset)
+        assert node_info is fmap.deparsed.offsets["f", offset]
+        assert fmap.extract(offset).selectedText
+    assert fmap.find(offsets[-1] + 100) is None
+
+    # Offsets without a node of their own get the next node after them.
+    missing = [i for i in range(offsets[-1]) if i not in offsets]
+    for offset in missing:
+        next_offset = min(o for o in offsets if o > offset)
+        assert fmap.find(offset) is fmap.deparsed.offsets["f", next_offset]
+
+    # Maps are cached by code, and comprehensions are deparsed as part of
+    # the function they are in.
+    assert fragment_map(f_code, version=PYTHON_VERSION_TRIPLE) is fmap
+    assert fragment_map(co, "<listcomp>", PYTHON_VERSION_TRIPLE) is fmap
+    assert fragment_map(co, "outer", PYTHON_VERSION_TRIPLE).code.co_name == "outer"
+    assert len(fragment_maps) == 2
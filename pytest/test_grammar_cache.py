@@ -0,0 +1,71 @@
+import os
+
+from uncompyle6.parser import get_python_parser
+from uncompyle6.parsers import grammar_cache
+from uncompyle6.parsers.parse27 import Python27Parser
+from uncompyle6.parsers.parse38 import Python38Parser
+
+
+def check_same_grammar(fresh, cached):
+    assert fresh.rules == cached.rules
+    assert fresh.rule2name == cached.rule2name
+    assert fresh.rule2func.keys() == cached.rule2func.keys()
+    assert fresh.list_like_nt == cached.list_like_nt
+    assert fresh.optional_nt == cached.optional_nt
+    assert fresh.collect == cached.collect
+
+
+def test_grammar_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("UNCOMPYLE6_GRAMMAR_CACHE", str(tmp_path))
+    monkeypatch.setattr(grammar_cache, "_grammar_pickles", {})
+
+    p = get_python_parser((3, 8))
+    check_same_grammar(Python38Parser(), p)
+    cache_files = os.listdir(tmp_path)
+    assert len(cache_files) == 1
+    assert cache_files[0].startswith(grammar_cache.grammar_cache_prefix(Python38Parser))
+
+    # Each parser gets its own grammar tables, so that customizing one
+    # does not affect the next.
+    p.add_unique_rule("expr ::= LOAD_FOO", "LOAD_FOO", 0, {})
+    p2 = get_python_parser((3, 8))
+    assert "LOAD_FOO" not in str(p2.rules["expr"])
+    assert p2.rule2func is not p.rule2func
+
+    # Reading from the on-disk cache in a new process.
+    monkeypatch.setattr(grammar_cache, "_grammar_pickles", {})
+    check_same_grammar(Python27Parser(), get_python_parser((2, 7)))
+    check_same_grammar(Python38Parser(), get_python_parser((3, 8)))
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_grammar_cache_stale(tmp_path, monkeypatch):
+    monkeypatch.setenv("UNCOMPYLE6_GRAMMAR_CACHE", str(tmp_path))
+    monkeypatch.setattr(grammar_cache, "_grammar_pickles", {})
+    stale_path = tmp_path / (
+        grammar_cache.grammar_cache_prefix(Python27Parser) + "0123.pickle"
+    )
+    stale_path.write_bytes(b"stale")
+    # Another process's entry that it hasn't finished writing.
+    temp_path = tmp_path / (grammar_cache.grammar_cache_prefix(Python27Parser) + "x.tmp")
+    temp_path.write_bytes(b"partial")
+
+    # A corrupt entry under the current digest is rebuilt too.
+    current_path = grammar_cache.grammar_cache_path(Python27Parser, str(tmp_path))
+    with open(current_path, "wb") as fp:
+        fp.write(b"corrupt")
+
+    check_same_grammar(Python27Parser(), get_python_parser((2, 7)))
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [os.path.basename(current_path), temp_path.name]
+    )
+
+
+def test_grammar_cache_write_failure(tmp_path, monkeypatch):
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    # A failed write leaves nothing behind.
+    monkeypatch.setattr(grammar_cache.os, "replace", fail)
+    grammar_cache.write_grammar_pickle(Python38Parser, b"grammar", str(tmp_path))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,89 @@
+import json
+from io import StringIO
+
+from uncompyle6.main import decompile
+from uncompyle6.semantics.linemap import (
+    LineMaps,
+    code_deparse_with_map,
+    linemap_data,
+)
+
+SOURCE = """x = 1
+
+def f(a):
+    y = a + 1
+    return y
+
+class C:
+    def m(self):
+        return lambda q: q + 1
+print(x)
+"""
+
+
+def deparse():
+    out = StringIO()
+    deparsed = code_deparse_with_map(compile(SOURCE, "test.py", "exec"), out)
+    return deparsed, out.getvalue().split("\n")
+
+
+def test_linemaps():
+    deparsed, lines = deparse()
+    source_lines = SOURCE.split("\n")
+    for line_number, source_line_number in deparsed.source_linemap.items():
+        assert lines[line_number - 1].strip() == source_lines[
+            source_line_number - 1
+        ].strip().replace("lambda q: q + 1", "(lambda q: q + 1)")
+
+    # Each code object gets the lines of its own.
+    code_linemaps = deparsed.code_linemaps
+    assert set(code_linemaps) == {
+        ("<module>", 1),
+        ("f", 3),
+        ("C", 7),
+        ("m", 8),
+        ("<lambda>", 9),
+    }
+    assert sorted(code_linemaps["f", 3].values()) == [4, 5]
+    assert sorted(code_linemaps["<module>", 1].values()) == [1, 10]
+    merged = {}
+    for linemap in code_linemaps.values():
+        merged.update(linemap)
+    assert merged == deparsed.source_linemap
+
+
+def test_linemap_data():
+    deparsed, _ = deparse()
+    data = json.loads(json.dumps(linemap_data(deparsed, 2)))
+    assert [entry["name"] for entry in data["code"]] == [
+        "<module>",
+        "f",
+        "C",
+        "m",
+        "<lambda>",
+    ]
+    linemaps = LineMaps(data)
+    linemap = deparsed.source_linemap
+    assert [line - 2 for line in linemaps.decompiled_lines(4)] == [
+        line for line in sorted(linemap) if linemap[line] == 4
+    ]
+    # Line 3 has no code of its own, so we get the lines for line 4.
+    assert linemaps.decompiled_lines(3) == linemaps.decompiled_lines(4)
+    assert linemaps.decompiled_lines(100) == []
+    assert linemaps.code_linemap("f")["firstlineno"] == 3
+
+
+def test_decompile_json_linemap():
+    out = StringIO()
+    mapstream = StringIO()
+    decompile(
+        compile(SOURCE, "test.py", "exec"),
+        out=out,
+        mapstream=mapstream,
+        linemap_format="json",
+    )
+    lines = out.getvalue().split("\n")
+    data = json.loads(mapstream.getvalue())
+    # Decompiled line numbers count the header lines in `out`.
+    found = [line for line, source_line in data["lines"] if source_line == 4]
+    assert [lines[line - 1].strip() for line in found] == ["y = a + 1"]
@@ -0,0 +1,48 @@
+from xdis import instruction_size
+from xdis.version_info import IS_PYPY, PYTHON_VERSION_TRIPLE
+
+from uncompyle6.scanner import get_scanner
+
+
+def sample(x, y):
+    for i in x:
+        if i == y:
+            while y:
+                y -= 1
+        elif i > 2:
+            try:
+                y = x[i]
+            except IndexError:
+                break
+    return y
+
+
+def test_offset_tables():
+    scanner = get_scanner(PYTHON_VERSION_TRIPLE, IS_PYPY)
+    co = sample.__code__
+    scanner.ingest(co)
+    code = scanner.code
+    n = len(code)
+
+    # The per-byte lists these tables replace.
+    prev_op = [0]
+    for offset in scanner.op_range(0, n):
+        prev_op += [offset] * instruction_size(code[offset], scanner.opc)
+    assert list(scanner.prev_op) == prev_op
+    assert scanner.prev_op[-1] == prev_op[-1]
+
+    linestarts = list(scanner.opc.findlinestarts(co))
+    lines = []
+    for offset in range(n):
+        later = [start for start, _ in linestarts if start > offset]
+        line_no = [line for start, line in linestarts if start <= offset]
+        lines.append(
+            (line_no[-1] if line_no else linestarts[0][1], later[0] if later else n)
+        )
+    assert [(line.l_no, line.next) for line in scanner.lines] == lines
+    assert tuple(scanner.lines[-1]) == lines[-1]
+
+    if hasattr(scanner, "next_stmt"):
+        stmts = sorted(scanner.stmts)
+        next_stmt = [min([s for s in stmts if s > i] + [n]) for i in range(n)]
+        assert list(scanner.next_stmt) == next_stmt
@@ -0,0 +1,46 @@
+from xdis.version_info import PYTHON_VERSION_TRIPLE, IS_PYPY
+
+from uncompyle6.scanner import get_scanner
+
+
+def sample(x, y):
+    for i in x:
+        if i == y:
+            while y:
+                y -= 1
+        elif i > 2:
+            try:
+                y = x[i]
+            except IndexError:
+                break
+    return y
+
+
+def test_opcode_index():
+    scanner = get_scanner(PYTHON_VERSION_TRIPLE, IS_PYPY)
+    scanner.ingest(sample.__code__)
+    code = scanner.code
+    n = len(code)
+    offsets = list(scanner.op_range(0, n))
+    jump_ops = scanner.opc.JREL_OPS | scanner.opc.JABS_OPS
+    for op in set(code[offset] for offset in offsets):
+        if op == scanner.opc.EXTENDED_ARG:
+            continue
+        expect = [offset for offset in offsets if code[offset] == op]
+        assert scanner.all_instr(0, n, op) == expect
+        assert scanner.first_instr(0, n, op) == expect[0]
+        assert scanner.last_instr(0, n, op) == expect[-1]
+        middle = offsets[len(offsets) // 2]
+        assert scanner.all_instr(middle, n, [op]) == [o for o in expect if o >= middle]
+        if op in jump_ops:
+            for source in expect:
+                target = scanner.get_target(source)
+                sources = [o for o in expect if scanner.get_target(o) == target]
+                assert scanner.all_instr(0, n, op, target) == sources
+                assert scanner.first_instr(0, n, op, target) == sources[0]
+                assert scanner.last_instr(0, n, op, target) == sources[-1]
+                assert scanner.inst_matches(0, n, op, target) == [
+                    inst.offset
+                    for inst in scanner.insts
+                    if inst.opcode == op and scanner.get_target(inst.offset) == target
+                ]
@@ -0,0 +1,64 @@
+import os.path as osp
+from io import StringIO
+
+from xdis.load import load_module
+
+from uncompyle6.main import decompile
+from uncompyle6.semantics.output import OutputBuffer
+
+PYC_PATH = osp.join(
+    osp.dirname(__file__), "..", "test", "bytecode_3.8", "01_for_continue.pyc"
+)
+
+
+def test_output_buffer_marks():
+    f = OutputBuffer()
+    f.write("def f(")
+    assert f.tell() == 6
+    f.mark()
+    f.write("a, ")
+    f.write("*")
+    assert f.tell() == 4
+    assert f.endswith("*") and not f.endswith("def *")
+    assert f.getvalue() == "a, *"
+    f.mark()
+    f.write("args")
+    assert f.take() == "args"
+    assert f.tail(3) == ", *"
+    assert f.take() == "a, *"
+    f.write("x):\n    return (")
+    assert f.last_line() == "    return ("
+    assert f.getvalue() == "def f(x):\n    return ("
+    assert f.tell() == 22
+
+
+def test_output_buffer_flush():
+    out = StringIO()
+    f = OutputBuffer(out, flush_size=10, keep=True)
+    f.write("x = 1\n")
+    assert out.getvalue() == ""
+    f.mark()
+    f.write("y = 2\n")
+    # Text can't be passed on while a traversal may still take it.
+    assert out.getvalue() == ""
+    f.write(f.take())
+    assert out.getvalue() == "x = 1\ny = 2\n"
+    f.write("z = ")
+    assert f.last_line() == "z = "
+    assert f.tell() == 16
+    f.write("3")
+    f.flush()
+    assert out.getvalue() == "x = 1\ny = 2\nz = 3"
+    assert f.written_text() == out.getvalue()
+
+
+def test_streamed_text():
+    # Source that is written out as it is generated isn't kept, unless
+    # it is asked for.
+    version, _, _, co, is_pypy, _, _, _ = load_module(PYC_PATH, {})
+    out = StringIO()
+    assert decompile(co, version, out, is_pypy=is_pypy).text is None
+    out = StringIO()
+    deparsed = decompile(co, version, out, is_pypy=is_pypy, keep_text=True)
+    assert deparsed.text.startswith("for i in range(2):")
+    assert deparsed.text in out.getvalue()
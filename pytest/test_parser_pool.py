@@ -0,0 +1,113 @@
+import os.path as osp
+from io import StringIO
+
+from xdis.load import load_module
+from xdis.version_info import PYTHON_VERSION_TRIPLE
+
+from uncompyle6.parser import (
+    checkin_parser,
+    checkout_parser,
+    clear_parser_pool,
+    get_python_parser,
+    parser_pool,
+)
+from uncompyle6.scanner import get_scanner
+from uncompyle6.semantics.pysource import SourceWalker, code_deparse
+
+PYC_PATH = osp.join(
+    osp.dirname(__file__), "..", "test", "bytecode_3.8", "01_for_continue.pyc"
+)
+
+
+def test_grammar_snapshot():
+    p = get_python_parser((3, 8))
+    rules = {lhs: list(r) for lhs, r in p.rules.items()}
+    snapshot = p.snapshot_grammar()
+    p.add_unique_rule("expr ::= LOAD_FOO", "LOAD_FOO", 0, {})
+    assert "LOAD_FOO" in str(p.rules["expr"])
+    p.restore_grammar(snapshot)
+    assert p.rules == rules
+    assert "LOAD_FOO" not in p.customized
+    assert p.ruleschanged
+
+    # Rolling back twice to the same snapshot works.
+    p.add_unique_rule("expr ::= LOAD_BAR", "LOAD_BAR", 0, {})
+    p.restore_grammar(snapshot)
+    assert p.rules == rules
+
+
+def test_parser_pool():
+    parser_pool.clear()
+    p = checkout_parser("3.8")
+    assert p.version == (3, 8)
+    p.add_unique_rule("expr ::= LOAD_FOO", "LOAD_FOO", 0, {})
+    checkin_parser(p)
+
+    # We get back the same parser, with its customizations undone.
+    p2 = checkout_parser((3, 8, 5))
+    assert p2 is p
+    assert "LOAD_FOO" not in str(p2.rules["expr"])
+
+    # Parsers for a different compile mode are kept separately.
+    p3 = checkout_parser((3, 8), compile_mode="lambda")
+    assert p3 is not p
+    checkin_parser(p2)
+    checkin_parser(p3)
+    parser_pool.clear()
+
+
+def test_mode_parser():
+    parser_pool.clear()
+    # A walker is made for a scanner that has ingested some code.
+    scanner = get_scanner((3, 8))
+    scanner.ingest(load_module(PYC_PATH, {})[3])
+    walker = SourceWalker((3, 8), None, scanner, compile_mode="lambda")
+    p = walker.mode_parser("exec")
+    assert p is not walker.p and type(p).__name__ == "Python38Parser"
+    p.add_unique_rule("expr ::= LOAD_FOO", "LOAD_FOO", 0, {})
+
+    # The same parser is used again, with its customizations undone.
+    assert walker.mode_parser("exec") is p
+    assert "LOAD_FOO" not in str(p.rules["expr"])
+
+    # Both parsers go back to the pool when the walker is done.
+    walker.checkin_parser()
+    assert checkout_parser((3, 8)) is p
+    assert checkout_parser((3, 8), compile_mode="lambda") is not p
+    parser_pool.clear()
+
+
+def test_walker_after_checkin():
+    # Walking a function definition parses the function's code.
+    co = compile("def f(a):\n    return a + 1\n", "<f>", "exec")
+    deparsed = code_deparse(co, out=StringIO(), version=PYTHON_VERSION_TRIPLE)
+    text = deparsed.traverse(deparsed.ast)
+    assert "return a + 1" in text
+
+    # A walker whose parser has gone back to the pool checks out
+    # another when it has more to parse.
+    deparsed.checkin_parser()
+    assert deparsed.p is None
+    assert deparsed.traverse(deparsed.ast) == text
+    deparsed.checkin_parser()
+    clear_parser_pool()
+    assert not parser_pool
+
+
+def test_no_tree_checkin():
+    class NoTreeWalker(SourceWalker):
+        def build_ast(self, *args, **kwargs):
+            return None
+
+    # A walker that builds no tree isn't returned, but its parser
+    # still goes back to the pool.
+    clear_parser_pool()
+    co = compile("x = 1\n", "<x>", "exec")
+    assert (
+        code_deparse(
+            co, out=StringIO(), version=PYTHON_VERSION_TRIPLE, walker=NoTreeWalker
+        )
+        is None
+    )
+    assert sum(len(parsers) for parsers in parser_pool.values()) == 1
+    clear_parser_pool()
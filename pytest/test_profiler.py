@@ -0,0 +1,63 @@
+import json
+from io import StringIO
+
+from uncompyle6.main import decompile
+from uncompyle6.profiler import Profiler
+
+SOURCE = """
+def f(a):
+    return [x + 1 for x in a]
+
+print(f([1, 2]))
+"""
+
+
+def profile(trace_memory=False):
+    profiler = Profiler(trace_memory=trace_memory)
+    profiler.start_file("test.pyc")
+    code = compile(SOURCE, "test.py", "exec")
+    decompile(code, out=StringIO(), profiler=profiler)
+    profiler.close()
+    return profiler
+
+
+def test_profiler_records():
+    records = profile().records
+    phases = {(r["code"], r["phase"]) for r in records}
+    for code_name in ("<module>", "f", "<listcomp>"):
+        for phase in ("ingest", "customize_grammar_rules", "parse", "transform"):
+            assert (code_name, phase) in phases
+    assert ("<module>", "gen_source") in phases
+
+    for record in records:
+        assert record["file"] == "test.pyc"
+        assert 0 <= record["self_time"] <= record["time"]
+        if record["phase"] == "ingest":
+            assert record["tokens"] > 0
+        elif record["phase"] == "customize_grammar_rules":
+            assert record["rules"] > 0
+        elif record["phase"] == "parse":
+            assert record["chart_items"] > record["tokens"] > 0
+
+    # The nested code objects are decompiled while generating the
+    # module's source.
+    gen_source = [r for r in records if r["phase"] == "gen_source"][0]
+    assert gen_source["time"] > gen_source["self_time"]
+
+
+def test_profiler_output(tmp_path):
+    profiler = profile(trace_memory=True)
+    assert all("allocated" in record for record in profiler.records)
+
+    jsonl_path = str(tmp_path / "profile.jsonl")
+    profiler.save(jsonl_path)
+    with open(jsonl_path) as fp:
+        assert [json.loads(line) for line in fp] == profiler.records
+
+    trace_path = str(tmp_path / "profile.json")
+    profiler.save(trace_path)
+    with open(trace_path) as fp:
+        events = json.load(fp)["traceEvents"]
+    assert len(events) == len(profiler.records)
+    assert {event["ph"] for event in events} == {"X"}
+    assert "parse f:2" in {event["name"] for event in events}
@@ -0,0 +1,60 @@
+from io import StringIO
+
+from spark_parser import GenericASTBuilder
+
+from xdis.version_info import PYTHON_VERSION_TRIPLE
+
+from uncompyle6.parser import PythonParser, get_python_parser
+from uncompyle6.parsers.treenode import SyntaxTree
+from uncompyle6.scanners.tok import Token
+from uncompyle6.semantics.pysource import code_deparse
+
+SOURCE = """
+def f(a, b):
+    for x in a:
+        if x == 1:
+            b.append(x)
+            b.append(a)
+        elif x == 2:
+            b.append(-x)
+        elif x == 3:
+            if b:
+                continue
+            b.pop()
+        else:
+            b.clear()
+    if a:
+        return b
+    elif b:
+        return a
+    return None
+"""
+
+
+def deparse(co):
+    out = StringIO()
+    deparsed = code_deparse(co, out)
+    return out.getvalue(), repr(deparsed.ast)
+
+
+def test_reduce_trees(monkeypatch):
+    co = compile(SOURCE, "<test>", "exec")
+    text, tree = deparse(co)
+
+    # Without the trees saved for reduction checks, we get the same
+    # parse tree.
+    monkeypatch.setattr(PythonParser, "reduce_ast", GenericASTBuilder.reduce_ast)
+    monkeypatch.setattr(PythonParser, "buildTree", GenericASTBuilder.buildTree)
+    assert deparse(co) == (text, tree)
+    assert "elif x == 3:" in text
+
+
+def test_shared_nodes_are_copied():
+    p = get_python_parser(PYTHON_VERSION_TRIPLE)
+    stmt1, stmt2 = Token("POP_TOP", offset=0), Token("POP_TOP", offset=2)
+    stmts = SyntaxTree("stmts", [stmt1])
+    p.shared_nodes.add(id(stmts))
+    rv = p.nonterminal("stmts", [stmts, stmt2])
+    assert list(rv) == [stmt1, stmt2]
+    assert rv is not stmts and len(stmts) == 1
+    p.shared_nodes.clear()
@@ -0,0 +1,72 @@
+import os
+import os.path as osp
+from io import StringIO
+
+import pytest
+from xdis.load import load_module
+
+from uncompyle6.code_fns import code_digest
+from uncompyle6.main import decompile_file, main
+from uncompyle6.parser import ParserError
+from uncompyle6.result_cache import FAILED_STATUS, ResultCache
+from uncompyle6.semantics.pysource import SourceWalkerError
+
+SRC_DIR = osp.join(osp.dirname(__file__), "..", "test", "bytecode_3.8")
+PYC_PATH = osp.join(SRC_DIR, "01_for_continue.pyc")
+
+
+def test_code_digest():
+    co = load_module(PYC_PATH, {})[3]
+    assert code_digest(co) == code_digest(load_module(PYC_PATH, {})[3])
+    assert code_digest(co) != code_digest(compile("pass", "x.py", "exec"))
+
+    # The file name doesn't matter.
+    assert code_digest(compile("x = 1", "a.py", "exec")) == code_digest(
+        compile("x = 1", "b.py", "exec")
+    )
+    assert code_digest(frozenset(["a", "b"])) == code_digest(frozenset(["b", "a"]))
+
+
+def test_result_cache(tmp_path):
+    out1 = StringIO()
+    decompile_file(PYC_PATH, out1, cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 1
+    out2 = StringIO()
+    deparsed = decompile_file(PYC_PATH, out2, cache_dir=str(tmp_path))
+    assert out1.getvalue() == out2.getvalue()
+    assert deparsed[0].f is out2
+
+    # Failures are cached too.
+    cache = ResultCache(str(tmp_path))
+    key = os.listdir(tmp_path)[0][: -len(".json")]
+    cache.put(key, FAILED_STATUS, "x = ", message="parse error")
+    with pytest.raises(SourceWalkerError):
+        decompile_file(PYC_PATH, StringIO(), cache_dir=str(tmp_path))
+
+    # A parse error is raised again as one.
+    cache.put(key, FAILED_STATUS, "x = ", message="parse error", error="ParserError")
+    with pytest.raises(ParserError, match="parse error"):
+        decompile_file(PYC_PATH, StringIO(), cache_dir=str(tmp_path))
+
+
+def test_result_cache_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path), max_size=1200)
+    for i in range(10):
+        cache.put("key%d" % i, "okay", "x" * 500)
+        os.utime(cache.path("key%d" % i), ns=(i * 10**9, i * 10**9))
+    cache.evict()
+    assert sorted(os.listdir(tmp_path)) == ["key8.json", "key9.json"]
+    assert cache.get("key9")["source"] == "x" * 500
+    assert cache.get("key0") is None
+
+
+def test_result_cache_shared(tmp_path, monkeypatch):
+    # main() makes one cache for all of its files, so the directory is
+    # scanned for its size only once.
+    scans = []
+    evict = ResultCache.evict
+    monkeypatch.setattr(ResultCache, "evict", lambda self: scans.append(evict(self)))
+    files = ["00_while_true_pass.pyc", "01_extended_arg.pyc", "01_for_continue.pyc"]
+    main(SRC_DIR, str(tmp_path / "out"), files, [], cache_dir=str(tmp_path / "cache"))
+    assert len(os.listdir(tmp_path / "cache")) == 3
+    assert len(scans) == 1
@@ -0,0 +1,60 @@
+import py_compile
+
+import pytest
+
+from uncompyle6.verifier import Verifier
+from uncompyle6.verify import (
+    CmpErrorCode,
+    CmpErrorMember,
+    cmp_code_fingerprints,
+    code_fingerprint,
+)
+
+SOURCE = """
+def f(a, *args, b=2):
+    for x in args:
+        if x > a:
+            break
+    else:
+        return {1, 2, 3}
+    return [y * b for y in range(a)]
+"""
+
+
+def test_fingerprints():
+    co = compile(SOURCE, "test.py", "exec")
+    # Line numbers and file names don't matter.
+    moved = compile("# comment\n\n" + SOURCE, "other.py", "exec")
+    assert code_fingerprint(co, {}) == code_fingerprint(moved, {})
+    cmp_code_fingerprints(co, moved)
+
+    changed = compile(SOURCE.replace("y * b", "y + b"), "test.py", "exec")
+    with pytest.raises(CmpErrorCode) as excinfo:
+        cmp_code_fingerprints(co, changed)
+    # The difference is found inside the code objects it is in.
+    assert excinfo.value.name == "<module>.f.<listcomp>"
+
+    changed = compile(SOURCE.replace("if x > a:", "if x < a:"), "test.py", "exec")
+    with pytest.raises(CmpErrorCode):
+        cmp_code_fingerprints(co, changed)
+
+    changed = compile(SOURCE.replace("b=2", "b=2, **kw"), "test.py", "exec")
+    with pytest.raises(CmpErrorMember) as excinfo:
+        cmp_code_fingerprints(co, changed)
+    assert excinfo.value.member == "co_flags"
+
+
+def test_roundtrip_check(tmp_path):
+    source_path = tmp_path / "good.py"
+    source_path.write_text(SOURCE)
+    pyc_path = str(tmp_path / "good.pyc")
+    py_compile.compile(str(source_path), pyc_path)
+    bad_path = tmp_path / "bad.py"
+    bad_path.write_text(SOURCE.replace("break", "continue"))
+
+    with Verifier(jobs=2) as verifier:
+        good = verifier.submit(str(source_path), "roundtrip", pyc_path).result()
+        bad = verifier.submit(str(bad_path), "roundtrip", pyc_path).result()
+    assert good.valid, good.errors
+    assert not bad.valid
+    assert "Code differs in '<module>.f'" in bad.errors
@@ -0,0 +1,44 @@
+import random
+
+from uncompyle6.scanner import StructIndex
+
+
+def innermost_by_scan(structs, offset):
+    """The linear scan that StructIndex.innermost() replaces."""
+    parent = structs[0]
+    start = parent["start"]
+    end = parent["end"]
+    for struct in structs:
+        current_start = struct["start"]
+        current_end = struct["end"]
+        if (current_start <= offset < current_end) and (
+            current_start >= start and current_end <= end
+        ):
+            start = current_start
+            end = current_end
+            parent = struct
+    return parent
+
+
+def test_struct_index():
+    rng = random.Random(6)
+    for _ in range(50):
+        n = 200
+        root = {"type": "root", "start": 0, "end": n - 1}
+        structs = StructIndex(root)
+        plain = [root]
+        for offset in range(0, n, 2):
+            # Structures get added both ahead of and behind the
+            # current offset, and can overlap.
+            for _ in range(rng.randrange(3)):
+                start = rng.randrange(max(0, offset - 20), min(n, offset + 40))
+                end = rng.randrange(start, min(n, start + 60) + 1)
+                struct = {"type": "if-then", "start": start, "end": end}
+                structs.append(struct)
+                plain.append(struct)
+            assert structs.innermost(offset) is innermost_by_scan(plain, offset)
+        assert structs == plain
+
+        # Going backwards still works.
+        for offset in (150, 10, 0):
+            assert structs.innermost(offset) is innermost_by_scan(plain, offset)
@@ -0,0 +1,39 @@
+from uncompyle6.semantics.consts import (
+    MAX_COMPILED_TEMPLATES,
+    TABLE_DIRECT,
+    compile_template,
+)
+
+
+def test_compile_template():
+    fmt = "%|%[0]{pattr} = %c(%{%c})\n"
+    steps, tail = compile_template(fmt)
+    assert [step[:4] for step in steps] == [
+        ("", "|", None, None),
+        ("", "{", 0, "pattr"),
+        (" = ", "c", None, None),
+        ("(", "{", None, "%c"),
+    ]
+    assert tail == ")\n"
+    assert eval(steps[1][4], {"pattr": "x"}) == "x"
+    # Sub-templates are left for the template engine to expand.
+    assert steps[3][4] == "%c"
+
+    # A template is compiled only once.
+    assert compile_template(fmt) is compile_template(fmt)
+
+
+def test_compile_table_templates():
+    for entry in TABLE_DIRECT.values():
+        fmt = entry[0] if isinstance(entry, tuple) else entry
+        steps, tail = compile_template(fmt)
+        assert "%" not in tail
+        assert all("%" not in step[0] for step in steps)
+
+
+def test_compiled_templates_bounded():
+    # Templates built from decompiled text don't pile up.
+    compile_template.cache_clear()
+    for i in range(MAX_COMPILED_TEMPLATES + 10):
+        compile_template("%%c(a%d, %%p)" % i)
+    assert compile_template.cache_info().currsize == MAX_COMPILED_TEMPLATES
@@ -20,5 +20,28 @@ def test_token():
     assert t.format().strip() == expect.strip()
 
 
+def test_token_offset():
+    t = Token("LOAD_CONST", offset=10, attr=None, pattr=None, has_arg=True)
+    assert t.offset == 10
+    assert t.off2int() == 10
+
+    # Instruction with an extended arg
+    t = Token("LOAD_CONST", offset=10, has_arg=True, has_extended_arg=True)
+    assert t.offset == "10_12"
+    assert t.off2int() == 12
+    assert t.off2int(prefer_last=False) == 10
+
+    # Second COME_FROM at offset 10
+    t = Token("COME_FROM", offset=10, sub_offset=1, has_arg=True)
+    assert t.offset == "10_1"
+    assert t.off2int() == 10
+
+    # String offsets are still accepted.
+    t = Token("COME_FROM", offset="10_12", has_arg=True)
+    assert (t.int_offset, t.sub_offset) == (10, 12)
+    assert t.off2int() == 12
+
+
 if __name__ == "__main__":
     test_token()
+    test_token_offset()
@@ -0,0 +1,71 @@
+from xdis.version_info import PYTHON_VERSION_TRIPLE
+
+from uncompyle6.scanner import TokenCache, get_scanner
+
+
+def f(a):
+    return a + 1
+
+
+def g(b):
+    for x in b:
+        if x:
+            return x
+
+
+def test_token_cache():
+    scanner = get_scanner(PYTHON_VERSION_TRIPLE)
+    cache = TokenCache()
+
+    tokens, customize = cache.ingest(scanner, f.__code__)
+    f_insts = scanner.insts
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # Changing the tokens we were given doesn't change what is cached.
+    kinds = [t.kind for t in tokens]
+    tokens[0].kind = "CHANGED"
+    del tokens[1:]
+
+    cache.ingest(scanner, g.__code__)
+    assert scanner.insts is not f_insts
+    tokens2, customize2 = cache.ingest(scanner, f.__code__)
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert [t.kind for t in tokens2] == kinds
+    assert customize2 == customize
+    # The parser looks at the instructions of the code just ingested.
+    assert scanner.insts is f_insts
+
+    # Class names are part of the key.
+    cache.ingest(scanner, f.__code__, "C")
+    assert cache.misses == 3
+
+
+def test_token_cache_eviction():
+    scanner = get_scanner(PYTHON_VERSION_TRIPLE)
+    f_tokens, _ = scanner.ingest(f.__code__)
+    g_tokens, _ = scanner.ingest(g.__code__)
+    cache = TokenCache(max_tokens=len(f_tokens) + len(g_tokens) - 1)
+
+    cache.ingest(scanner, f.__code__)
+    cache.ingest(scanner, g.__code__)
+    assert cache.token_count == len(g_tokens)
+    cache.ingest(scanner, g.__code__)
+    assert cache.hits == 1
+    cache.ingest(scanner, f.__code__)
+    assert cache.misses == 3
+
+
+def test_scanner_token_cache():
+    scanner = get_scanner(PYTHON_VERSION_TRIPLE)
+    assert scanner.token_cache is None
+    # Without a cache, each ingest scans the code again.
+    tokens, _ = scanner.cached_ingest(f.__code__)
+    assert scanner.cached_ingest(f.__code__)[0][0] is not tokens[0]
+
+    cache = scanner.token_cache = TokenCache()
+    scanner.cached_ingest(f.__code__)
+    scanner.cached_ingest(f.__code__)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # The next caller gets a scanner without one.
+    assert get_scanner(PYTHON_VERSION_TRIPLE).token_cache is None
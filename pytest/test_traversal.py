@@ -0,0 +1,149 @@
+import sys
+from io import StringIO
+
+from spark_parser import GenericASTTraversal
+from xdis.version_info import PYTHON_VERSION_TRIPLE
+
+from uncompyle6.parsers.treenode import SyntaxTree
+from uncompyle6.scanners.tok import Token
+from uncompyle6.semantics.check_ast import checker
+from uncompyle6.semantics.helper import find_all_globals, find_none
+from uncompyle6.semantics.pysource import code_deparse
+from uncompyle6.semantics.transform import TreeTransform
+from uncompyle6.semantics.traversal import HandlerTable, StackTraversal, tree_tokens
+
+# Deeper than a recursive walk can go.
+DEPTH = sys.getrecursionlimit() * 2
+
+
+def sample_tree():
+    return SyntaxTree(
+        "stmts",
+        [
+            SyntaxTree("stmt", [Token("LOAD_GLOBAL", pattr="a"), Token("POP_TOP")]),
+            SyntaxTree(
+                "pruned", [SyntaxTree("stmt", [Token("LOAD_GLOBAL", pattr="b")])]
+            ),
+            SyntaxTree("stmt", [Token("LOAD_NAME", pattr="c")]),
+        ],
+    )
+
+
+def deep_tree(depth):
+    tree = SyntaxTree("expr", [Token("LOAD_GLOBAL", pattr="x")])
+    for _ in range(depth):
+        tree = SyntaxTree("expr", [tree])
+    return tree
+
+
+def recorder(base):
+    class Recorder(base):
+        def __init__(self):
+            super().__init__(ast=None)
+            self.events = []
+
+        def default(self, node):
+            self.events.append(("default", node.kind))
+
+        def n_stmt(self, node):
+            self.events.append(("n_stmt", len(node)))
+
+        def n_stmt_exit(self, node):
+            self.events.append(("n_stmt_exit", len(node)))
+
+        def n_pruned(self, node):
+            self.events.append(("n_pruned", len(node)))
+            self.prune()
+
+    return Recorder
+
+
+def test_stack_traversal():
+    # Handlers are called as GenericASTTraversal calls them.
+    expected = recorder(GenericASTTraversal)()
+    expected.preorder(sample_tree())
+    walker = recorder(StackTraversal)()
+    walker.preorder(sample_tree())
+    assert walker.events == expected.events
+
+    class Positions(StackTraversal):
+        def __init__(self):
+            super().__init__(ast=None)
+            self.count = 0
+            self.spans = []
+
+        def preorder_start(self, node):
+            self.count += 1
+            return self.count
+
+        def preorder_finish(self, node, start):
+            self.spans.append((node.kind, start, self.count))
+
+        def n_pruned(self, node):
+            self.prune()
+
+    walker = Positions()
+    walker.preorder(sample_tree())
+    assert walker.spans == [
+        ("LOAD_GLOBAL", 3, 3),
+        ("POP_TOP", 4, 4),
+        ("stmt", 2, 4),
+        ("pruned", 5, 5),
+        ("LOAD_NAME", 7, 7),
+        ("stmt", 6, 7),
+        ("stmts", 1, 7),
+    ]
+
+    walker = recorder(StackTraversal)()
+    walker.preorder(deep_tree(DEPTH))
+    assert len(walker.events) == DEPTH + 2
+
+
+def test_handler_table():
+    walker = recorder(StackTraversal)()
+    # Handlers set on the walker itself are found too.
+    walker.n_stmts = lambda node: walker.events.append(("n_stmts", len(node)))
+    walker.preorder(sample_tree())
+    assert walker.events[0] == ("n_stmts", 3)
+    assert walker.handlers["stmt"] == walker.n_stmt
+    assert walker.handlers["LOAD_GLOBAL"] is None
+    assert walker.exit_handlers["stmt"] == walker.n_stmt_exit
+    assert "pruned" not in walker.exit_handlers
+
+    # Kinds are looked up once.
+    table = HandlerTable(walker)
+    assert table["new"] is None
+    walker.n_new = walker.n_stmt
+    assert table["new"] is None
+    assert "stmt" not in table
+
+
+def test_tree_tokens():
+    tree = sample_tree()
+    assert [t.pattr for t in tree_tokens(tree) if t.pattr] == ["a", "b", "c"]
+    assert [t.pattr for t in tree_tokens(tree, skip=("pruned",)) if t.pattr] == [
+        "a",
+        "c",
+    ]
+
+
+def test_deep_trees():
+    tree = deep_tree(DEPTH)
+    assert find_all_globals(tree, set()) == {"x"}
+    assert not find_none(tree)
+    errors = []
+    checker(tree, False, errors)
+    assert errors == []
+    assert tree.first_child() is tree.last_child()
+    assert len(repr(tree).split("\n")) == DEPTH + 2
+
+    transform = TreeTransform(PYTHON_VERSION_TRIPLE)
+    tree = transform.transform(tree, deep_tree.__code__)
+    assert tree.info.all_globals == {"x"}
+
+    # A long string concatenation is a deep tree.
+    source = "s = 'a'%s\n" % "".join(" + x" for _ in range(1000))
+    co = compile(source, "<concat>", "exec")
+    out = StringIO()
+    code_deparse(co, out=out, version=PYTHON_VERSION_TRIPLE)
+    assert out.getvalue().count("+ x") == 1000
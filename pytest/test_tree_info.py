@@ -0,0 +1,56 @@
+from io import StringIO
+
+from xdis.version_info import PYTHON_VERSION_TRIPLE
+
+from uncompyle6.semantics.helper import (
+    find_all_globals,
+    find_globals_and_nonlocals,
+    find_tree_globals,
+)
+from uncompyle6.semantics.pysource import code_deparse
+
+counter = 0
+
+
+def f(a):
+    global counter
+    counter += a
+    print(len(a))
+
+    def g():
+        nonlocal a
+        a = None
+
+    return g
+
+
+def test_tree_info():
+    co = f.__code__
+    out = StringIO()
+    deparsed = code_deparse(co, out=out, version=PYTHON_VERSION_TRIPLE)
+    tree = deparsed.ast
+    info = tree.info
+    assert info.errors == []
+    assert info.globals == {"counter"}
+    assert {"counter", "print", "len"} <= info.all_globals
+
+    # The names found while transforming are those a search of the
+    # transformed tree finds.
+    globs, nonlocals = find_globals_and_nonlocals(
+        tree, set(), set(), co, PYTHON_VERSION_TRIPLE
+    )
+    all_globals = find_all_globals(tree, set())
+    assert find_tree_globals(tree, co, PYTHON_VERSION_TRIPLE) == (
+        all_globals,
+        globs,
+        nonlocals,
+    )
+
+    # What we are given is a copy.
+    all_globals, _, _ = find_tree_globals(tree, co, PYTHON_VERSION_TRIPLE)
+    all_globals.add("spam")
+    assert "spam" not in tree.info.all_globals
+
+    # The inner function's tree gives its "nonlocal" statement.
+    assert "global counter" in out.getvalue()
+    assert "nonlocal a" in out.getvalue()
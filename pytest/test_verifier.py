@@ -0,0 +1,126 @@
+import sys
+import time
+
+import uncompyle6.verifier as verifier_module
+from uncompyle6.verifier import DEFAULT_RUN_TIMEOUT, Verifier
+
+PROGRAMS = {
+    "good.py": "import sys\nprint('hello', sys.argv[0].endswith('good.py'))\n",
+    "fails.py": "raise ValueError('oops')\n",
+    "exits.py": "import sys\nsys.exit(3)\n",
+    # Programs are run in an interpreter that hasn't loaded uncompyle6.
+    "clean.py": "import sys\nassert 'uncompyle6' not in sys.modules\n",
+    "syntax.py": "def f(:\n    pass\n",
+    # Programs end as they would on their own.
+    "atexit.py": (
+        "import atexit, threading, time\n"
+        "atexit.register(print, 'at exit')\n"
+        "threading.Thread(target=lambda: (time.sleep(0.2), print('thread'))).start()\n"
+    ),
+}
+
+
+def write_programs(tmp_path):
+    paths = {}
+    for name, source in PROGRAMS.items():
+        path = tmp_path / name
+        path.write_text(source)
+        paths[name] = str(path)
+    return paths
+
+
+def test_syntax_check(tmp_path):
+    paths = write_programs(tmp_path)
+    with Verifier(jobs=2) as verifier:
+        futures = {name: verifier.submit(path, "syntax") for name, path in paths.items()}
+        results = {name: future.result() for name, future in futures.items()}
+    assert not results["syntax.py"].valid
+    assert results["syntax.py"].errors
+    assert all(results[name].valid for name in paths if name != "syntax.py")
+
+
+def test_run_check(tmp_path):
+    paths = write_programs(tmp_path)
+    with Verifier(jobs=2, timeout=20) as verifier:
+        futures = {name: verifier.submit(path, "run") for name, path in paths.items()}
+        results = {name: future.result() for name, future in futures.items()}
+        # Worker interpreters are reused.
+        assert len(verifier.workers) <= 2
+
+    assert results["good.py"].valid
+    assert results["good.py"].output == "hello True\n"
+    assert results["clean.py"].valid, results["clean.py"].errors
+    assert not results["fails.py"].valid
+    assert "ValueError: oops" in results["fails.py"].errors
+    assert not results["exits.py"].valid
+    assert not results["syntax.py"].valid
+    assert "SyntaxError" in results["syntax.py"].errors
+    assert results["atexit.py"].output == "thread\nat exit\n"
+
+
+def test_run_timeout(tmp_path):
+    if sys.platform.startswith("win"):
+        return
+    path = tmp_path / "loop.py"
+    path.write_text("while True:\n    pass\n")
+    # Programs can't run forever by default.
+    with Verifier(jobs=1) as verifier:
+        assert verifier.timeout == DEFAULT_RUN_TIMEOUT
+    with Verifier(jobs=1, timeout=1) as verifier:
+        result = verifier.submit(str(path), "run").result()
+        assert not result.valid
+        # The worker survives the program being killed.
+        good = tmp_path / "good.py"
+        good.write_text("print(1)\n")
+        assert verifier.submit(str(good), "run").result().valid
+
+
+def test_run_memory(tmp_path):
+    if sys.platform.startswith("win"):
+        return
+    path = tmp_path / "big.py"
+    path.write_text("x = bytearray(512 * 1024 * 1024)\n")
+    with Verifier(jobs=1, timeout=20, max_memory=256 * 1024 * 1024) as verifier:
+        result = verifier.submit(str(path), "run").result()
+        assert not result.valid
+        assert "MemoryError" in result.errors
+        # The limit is the program's, not the worker's.
+        small = tmp_path / "small.py"
+        small.write_text("x = bytearray(1024)\n")
+        assert verifier.submit(str(small), "run").result().valid
+
+
+def test_run_ignores_alarm(tmp_path):
+    if sys.platform.startswith("win"):
+        return
+    path = tmp_path / "sleeps.py"
+    path.write_text(
+        "import signal, time\n"
+        "signal.signal(signal.SIGALRM, signal.SIG_IGN)\n"
+        "time.sleep(30)\n"
+    )
+    with Verifier(jobs=1, timeout=1) as verifier:
+        start = time.time()
+        result = verifier.submit(str(path), "run").result()
+        assert time.time() - start < 10
+        assert not result.valid
+        assert "timed out" in result.errors
+        # The worker goes on to run other programs.
+        good = tmp_path / "good.py"
+        good.write_text("print(1)\n")
+        assert verifier.submit(str(good), "run").result().valid
+
+
+def test_worker_read_deadline(tmp_path, monkeypatch):
+    # A worker that doesn't reply in time is killed and replaced.
+    hangs = tmp_path / "hangs.py"
+    hangs.write_text("import time\ntime.sleep(60)\n")
+    monkeypatch.setattr(verifier_module, "RUN_WORKER_PATH", str(hangs))
+    monkeypatch.setattr(verifier_module, "WORKER_GRACE", 0.5)
+    good = tmp_path / "good.py"
+    good.write_text("print(1)\n")
+    with Verifier(jobs=1, timeout=0.5) as verifier:
+        result = verifier.submit(str(good), "run").result()
+        assert not result.valid
+        assert "timed out" in result.errors
+        assert verifier.workers[0].process.poll() is not None
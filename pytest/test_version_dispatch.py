@@ -0,0 +1,29 @@
+from uncompyle6.parser import get_parser_class, parser_classes
+from uncompyle6.scanner import get_scanner, scanner_classes
+
+
+def test_get_scanner():
+    scanner_classes.clear()
+    scanner = get_scanner((3, 8, 2))
+    assert type(scanner).__name__ == "Scanner38"
+    assert type(get_scanner((2, 7), is_pypy=True)).__name__ == "ScannerPyPy27"
+    assert set(scanner_classes) == {((3, 8), False), ((2, 7), True)}
+
+    # Each caller gets a scanner of its own, of the remembered class.
+    other = get_scanner("3.8.10", show_asm=True)
+    assert other is not scanner and type(other) is type(scanner)
+    assert other.show_asm and not scanner.show_asm
+
+
+def test_get_parser_class():
+    parser_classes.clear()
+    assert get_parser_class((3, 8)).__name__ == "Python38Parser"
+    assert get_parser_class((3, 8), "single").__name__ == "Python38ParserSingle"
+    assert get_parser_class((2, 4), "eval").__name__ == "Python24ParserSingle"
+    assert get_parser_class((2, 7)) is get_parser_class((2, 7), "exec")
+    assert set(parser_classes) == {
+        ((3, 8), False),
+        ((3, 8), True),
+        ((2, 4), True),
+        ((2, 7), False),
+    }
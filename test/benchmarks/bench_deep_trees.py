@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Benchmark of decompiling code whose parse trees are deep.
+
+We generate and compile modules with deeply nested expressions, such
+as a long string concatenation or a chain of method calls, and
+decompile each several times with a uncompyle6.profiler.Profiler. For
+each kind of module, the least time spent transforming the parse tree
+and generating source is printed, or the error if decompiling failed.
+
+Generating source still recurses for each level of nesting, so at
+depths past a few hundred to about a thousand, depending on the kind,
+this fails with RecursionError. See uncompyle6.semantics.traversal.
+
+For example:
+
+    bench_deep_trees.py --depth 300 --repeat 5
+"""
+
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import click
+
+from uncompyle6.main import decompile
+from uncompyle6.profiler import Profiler
+
+
+def deep_sources(depth: int) -> dict:
+    """Return Python source with nesting `depth` for each kind of
+    deep tree."""
+    return {
+        "concat": "s = 'a'%s\n" % "".join(" + x" for _ in range(depth)),
+        "attr": "y = x%s\n" % (".a" * depth),
+        "subscript": "y = x%s\n" % ("[0]" * depth),
+        "method": "y = x%s\n" % (".f()" * depth),
+    }
+
+
+def phase_times(co, repeat: int) -> tuple:
+    """Decompile `co` `repeat` times, returning the least time spent
+    in the "transform" and "gen_source" phases."""
+    best = {"transform": float("inf"), "gen_source": float("inf")}
+    for _ in range(repeat):
+        profiler = Profiler()
+        # Parse errors are reported on stdout.
+        with redirect_stdout(StringIO()):
+            decompile(co, out=StringIO(), profiler=profiler)
+        times = dict.fromkeys(best, 0.0)
+        for record in profiler.records:
+            if record["phase"] in times:
+                times[record["phase"]] += record["self_time"]
+        for phase, seconds in times.items():
+            best[phase] = min(best[phase], seconds)
+    return best["transform"], best["gen_source"]
+
+
+@click.command()
+@click.option("--depth", default=300, help="Nesting depth of the trees.")
+@click.option("--repeat", default=5, help="Number of times to decompile each.")
+def main(depth, repeat):
+    start = time.perf_counter()
+    print("%-10s %10s %10s" % ("kind", "transform", "gen_source"))
+    for kind, source in deep_sources(depth).items():
+        co = compile(source, "<%s>" % kind, "exec")
+        try:
+            transform, gen_source = phase_times(co, repeat)
+        except Exception as e:
+            print("%-10s %s" % (kind, e.__class__.__name__))
+            continue
+        print("%-10s %10.4f %10.4f" % (kind, transform, gen_source))
+    print("total %.2f seconds" % (time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
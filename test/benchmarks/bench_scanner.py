@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Regression benchmark for the scanner on one very large function.
+
+We generate a function with about 100,000 bytecode instructions made
+up of many nested loops and if blocks, and time scanning it. The
+control-flow detection time per instruction for the large function is
+compared against that for a function a tenth of its size. If control
+flow detection is linear, the two should be about the same.
+
+The function is compiled by the Python given with --python, by default
+the one running this, so the scanner for that Python version is the
+one measured. For example, to measure Scanner3 control-flow detection:
+
+    bench_scanner.py --python python3.6 --instructions 20000
+
+(Scanner3 can't handle a function with more than 64K bytes of
+bytecode, hence the smaller size.)
+
+The exit code is nonzero if the per-instruction time ratio is above
+--max-ratio.
+"""
+
+import os.path as osp
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+from xdis import iscode
+from xdis.load import load_module
+from xdis.version_info import PythonImplementation
+
+from uncompyle6.scanner import get_scanner
+
+BLOCK = """\
+    for i{n} in x:
+        if i{n} == {n}:
+            while y > {n}:
+                if y & 1:
+                    y -= 1
+                else:
+                    y -= 2
+        elif i{n} < 0:
+            try:
+                y = x[{n}]
+            except IndexError:
+                y = 0
+"""
+
+# Rough number of instructions in BLOCK.
+BLOCK_SIZE = 45
+
+
+def make_function(python: str, instructions: int, tmp_dir: str):
+    """Return the bytecode version, the implementation and the code object
+    for a function with about `instructions` instructions compiled by
+    `python`."""
+    count = max(1, instructions // BLOCK_SIZE)
+    source = "def f(x, y):\n" + "".join(BLOCK.format(n=n) for n in range(count))
+    source_path = osp.join(tmp_dir, f"bench{instructions}.py")
+    bytecode_path = source_path + "c"
+    with open(source_path, "w") as fp:
+        fp.write(source)
+    subprocess.check_call(
+        [
+            python,
+            "-c",
+            "import py_compile, sys; py_compile.compile(*sys.argv[1:3], doraise=True)",
+            source_path,
+            bytecode_path,
+        ]
+    )
+    version, _, _, co, implementation, _, _, _ = load_module(bytecode_path, {})
+    return version, implementation, [c for c in co.co_consts if iscode(c)][0]
+
+
+def time_scan(version, implementation, co) -> tuple:
+    """Return the number of instructions in `co`, the time taken to
+    scan it, and how much of that time was spent in control-flow
+    detection."""
+    scanner = get_scanner(
+        version, is_pypy=implementation == PythonImplementation.PyPy
+    )
+    find_jump_targets = scanner.find_jump_targets
+    control_flow_time = 0
+
+    def timed_find_jump_targets(debug):
+        nonlocal control_flow_time
+        start = time.perf_counter()
+        targets = find_jump_targets(debug)
+        control_flow_time += time.perf_counter() - start
+        return targets
+
+    scanner.find_jump_targets = timed_find_jump_targets
+    start = time.perf_counter()
+    scanner.ingest(co)
+    return len(scanner.insts), time.perf_counter() - start, control_flow_time
+
+
+@click.command()
+@click.option("--python", default=sys.executable, help="Python to compile with.")
+@click.option("--instructions", default=100_000, help="size of the large function.")
+@click.option(
+    "--max-ratio",
+    default=3.0,
+    help="largest acceptable ratio of per-instruction times.",
+)
+def main(python: str, instructions: int, max_ratio: float):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        small = time_scan(*make_function(python, instructions // 10, tmp_dir))
+        big = time_scan(*make_function(python, instructions, tmp_dir))
+    for n, total_time, control_flow_time in (small, big):
+        print(
+            f"{n} instructions: {total_time:.3f}s, "
+            f"control flow {control_flow_time:.3f}s"
+        )
+    ratio = (big[2] / big[0]) / (small[2] / small[0])
+    print(f"per-instruction control-flow time ratio: {ratio:.2f}")
+    sys.exit(0 if ratio <= max_ratio else 1)
+
+
+if __name__ == "__main__":
+    main()
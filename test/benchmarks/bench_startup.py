@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Benchmark of start-up time: decompiling one small bytecode file with
+the uncompyle6 command, for each bytecode version.
+
+For each version we run
+
+    python -X importtime -m uncompyle6.bin.uncompile <file>
+
+several times on the smallest bytecode file in ../bytecode_<version>,
+using the uncompyle6 in this source tree. For each version, the least
+time spent importing modules and the least time for the whole run are
+printed, along with the number of parser and scanner modules imported,
+such as uncompyle6.parsers.parse27 and uncompyle6.scanners.scanner27.
+Only those that the version decompiled needs should be imported: the
+version's own module and those it is based on.
+
+For example:
+
+    bench_startup.py --repeat 5 2.7 3.8
+"""
+
+import glob
+import os
+import os.path as osp
+import re
+import subprocess
+import sys
+import time
+
+import click
+
+BYTECODE_DIR = osp.join(osp.dirname(osp.abspath(__file__)), "..")
+SOURCE_DIR = osp.join(BYTECODE_DIR, "..")
+
+PARSER_MODULE = re.compile(r"uncompyle6\.parsers\.parse\d+(base)?$")
+SCANNER_MODULE = re.compile(r"uncompyle6\.scanners\.(scanner|pypy)\d+(base)?$")
+
+
+def bytecode_versions() -> list:
+    """Return the versions that there is test bytecode for, oldest first."""
+    versions = []
+    for path in glob.glob(osp.join(BYTECODE_DIR, "bytecode_*")):
+        match = re.fullmatch(r"bytecode_(\d+)\.(\d+)", osp.basename(path))
+        if match:
+            versions.append((int(match.group(1)), int(match.group(2))))
+    return ["%d.%d" % version for version in sorted(versions)]
+
+
+def smallest_bytecode(version: str):
+    """Return the path of the smallest bytecode file for `version`, or
+    None if there is none."""
+    paths = glob.glob(osp.join(BYTECODE_DIR, f"bytecode_{version}", "*.pyc"))
+    return min(paths, key=osp.getsize) if paths else None
+
+
+def import_times(stderr: str) -> dict:
+    """Return the time in microseconds spent importing each module,
+    not counting the modules it imports, from -X importtime output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        # Skip the heading.
+        if len(fields) == 3 and fields[0].strip().isdigit():
+            times[fields[2].strip()] = int(fields[0])
+    return times
+
+
+def run_once(python: str, path: str) -> tuple:
+    """Decompile `path` with uncompyle6 run by `python`. Return the
+    seconds that took and the import times."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [SOURCE_DIR] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+    start = time.perf_counter()
+    result = subprocess.run(
+        [python, "-X", "importtime", "-m", "uncompyle6.bin.uncompile", path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        env=env,
+    )
+    return time.perf_counter() - start, import_times(result.stderr)
+
+
+@click.command()
+@click.option(
+    "--python", default=sys.executable, help="Python to run uncompyle6 with."
+)
+@click.option("--repeat", default=5, help="Number of times to run each.")
+@click.argument("versions", nargs=-1)
+def main(python, repeat, versions):
+    if not versions:
+        versions = bytecode_versions()
+    print(
+        "%-8s %10s %10s %8s %8s"
+        % ("version", "import ms", "run s", "parsers", "scanners")
+    )
+    total_import = total_run = 0.0
+    for version in versions:
+        path = smallest_bytecode(version)
+        if path is None:
+            print("%-8s no bytecode" % version)
+            continue
+        best_import = best_run = float("inf")
+        for _ in range(repeat):
+            seconds, times = run_once(python, path)
+            best_import = min(best_import, sum(times.values()) / 1000)
+            best_run = min(best_run, seconds)
+        parsers = sum(1 for name in times if PARSER_MODULE.match(name))
+        scanners = sum(1 for name in times if SCANNER_MODULE.match(name))
+        print(
+            "%-8s %10.1f %10.3f %8d %8d"
+            % (version, best_import, best_run, parsers, scanners)
+        )
+        total_import += best_import
+        total_run += best_run
+    print("%-8s %10.1f %10.3f" % ("total", total_import, total_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Benchmark of the template engine over a corpus of Python modules.
+
+We compile the Python modules below a directory, by default the
+standard library of the Python running this, and decompile them
+twice with a uncompyle6.profiler.Profiler: once with the format
+templates compiled afresh each time they are used, which is how the
+template engine used to work, and once with compiled templates cached.
+The time spent generating source, not counting the phases for nested
+code objects, is printed for each.
+
+For example:
+
+    bench_templates.py --files 50
+"""
+
+import os
+import os.path as osp
+import sysconfig
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import click
+
+import uncompyle6.semantics.consts as consts
+from uncompyle6.main import decompile
+from uncompyle6.profiler import Profiler
+
+
+class NoCache(dict):
+    """A stand-in for consts.compiled_templates that never has anything."""
+
+    def get(self, key, default=None):
+        return default
+
+    def __setitem__(self, key, value):
+        pass
+
+
+def corpus(top: str, files: int, max_size: int) -> list:
+    """Return the code objects for up to `files` modules below `top`,
+    skipping those with more than `max_size` bytes of source."""
+    code_objects = []
+    for root, dirs, file_names in os.walk(top):
+        dirs[:] = sorted(d for d in dirs if d not in ("test", "tests", "idlelib"))
+        for file_name in sorted(file_names):
+            if not file_name.endswith(".py"):
+                continue
+            path = osp.join(root, file_name)
+            if osp.getsize(path) > max_size:
+                continue
+            try:
+                with open(path, encoding="utf-8") as fp:
+                    code_objects.append(compile(fp.read(), path, "exec"))
+            except (SyntaxError, UnicodeDecodeError, ValueError):
+                continue
+            if len(code_objects) >= files:
+                return code_objects
+    return code_objects
+
+
+def gen_source_time(code_objects: list) -> float:
+    profiler = Profiler()
+    # Parse errors are reported on stdout.
+    with redirect_stdout(StringIO()):
+        for co in code_objects:
+            try:
+                decompile(co, out=StringIO(), profiler=profiler)
+            except Exception:
+                # Some modules hit decompiler bugs; we still count the
+                # time spent on them.
+                pass
+    return sum(
+        record["self_time"]
+        for record in profiler.records
+        if record["phase"] == "gen_source"
+    )
+
+
+@click.command()
+@click.option("--files", default=20, help="number of modules to decompile")
+@click.option(
+    "--max-size",
+    default=20000,
+    help="skip modules with more source than this many bytes; parsing "
+    "large modules takes a long time",
+)
+@click.argument("top", default=sysconfig.get_paths()["stdlib"])
+def main(files: int, max_size: int, top: str):
+    code_objects = corpus(top, files, max_size)
+    print(f"{len(code_objects)} modules from {top}")
+
+    cache = consts.compiled_templates
+    consts.compiled_templates = NoCache()
+    start = time.perf_counter()
+    uncached = gen_source_time(code_objects)
+    print(
+        f"uncompiled templates: {uncached:.2f}s generating source, "
+        f"{time.perf_counter() - start:.2f}s in all"
+    )
+
+    consts.compiled_templates = cache
+    start = time.perf_counter()
+    cached = gen_source_time(code_objects)
+    print(
+        f"compiled templates:   {cached:.2f}s generating source, "
+        f"{time.perf_counter() - start:.2f}s in all"
+    )
+    print(f"speedup generating source: {uncached / cached:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Benchmark of the memory used by scanner tokens.
+
+We scan the code objects of a bytecode file, by default the module
+that has this benchmark, and then build a copy of each token while
+tracing memory allocation. The memory per token is printed, along
+with the size of one token object and its attribute storage.
+
+Run this before and after a change to Token to see the difference.
+For example:
+
+    bench_token.py ../bytecode_3.8/02_async.pyc
+"""
+
+import sys
+import tracemalloc
+
+import click
+from xdis import iscode
+from xdis.load import load_file, load_module
+from xdis.version_info import PYTHON_VERSION_TRIPLE, IS_PYPY, PythonImplementation
+
+from uncompyle6.scanner import get_scanner
+from uncompyle6.scanners.tok import Token
+
+
+def code_objects(co):
+    yield co
+    for c in co.co_consts:
+        if iscode(c):
+            yield from code_objects(c)
+
+
+def scan(path: str) -> list:
+    """Return the tokens for all the code objects in `path`."""
+    if path.endswith(".py"):
+        version, is_pypy = PYTHON_VERSION_TRIPLE, IS_PYPY
+        co = load_file(path)
+    else:
+        version, _, _, co, implementation, _, _, _ = load_module(path, {})
+        is_pypy = implementation == PythonImplementation.PyPy
+    scanner = get_scanner(version, is_pypy=is_pypy)
+    tokens = []
+    for c in code_objects(co):
+        tokens.extend(scanner.ingest(c)[0])
+    return tokens
+
+
+def copy_tokens(tokens: list) -> list:
+    return [
+        Token(
+            t.kind,
+            t.attr,
+            t.pattr,
+            t.offset,
+            t.linestart,
+            t.op,
+            t.has_arg,
+            t.opc,
+            optype=t.optype,
+        )
+        for t in tokens
+    ]
+
+
+@click.command()
+@click.argument("path", default=__file__)
+def main(path: str):
+    tokens = scan(path)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    copies = copy_tokens(tokens)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    n = len(copies)
+    token = copies[0]
+    token_size = sys.getsizeof(token)
+    if not hasattr(Token, "__slots__"):
+        token_size += sys.getsizeof(token.__dict__)
+    print(f"{n} tokens")
+    print(f"traced memory per token: {(after - before) / n:.1f} bytes")
+    print(f"size of a token and its attribute storage: {token_size} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Count the tree nodes visited by the walks over each parse tree between
+parsing and generating source code.
+
+We decompile each bytecode file given, counting the nodes and tokens
+visited by each of these walks, where it is used:
+
+    checker                      check_ast.checker()
+    transform                    TreeTransform.preorder()
+    find_all_globals             helper.find_all_globals()
+    find_globals_and_nonlocals   helper.find_globals_and_nonlocals()
+    find_none                    helper.find_none()
+
+Run this on the same files before and after a change to how the
+parse tree is analyzed to see the difference. For example:
+
+    bench_tree_walks.py ../bytecode_3.8/*.pyc
+"""
+
+import sys
+from collections import Counter
+from io import StringIO
+
+import click
+
+import uncompyle6.semantics.check_ast
+import uncompyle6.semantics.helper
+from uncompyle6.main import decompile_file
+from uncompyle6.parsers.treenode import SyntaxTree
+from uncompyle6.semantics.transform import TreeTransform
+
+WALKS = (
+    "checker",
+    "transform",
+    "find_all_globals",
+    "find_globals_and_nonlocals",
+    "find_none",
+)
+
+
+def count_visits(visits: Counter):
+    """Patch the walks so that each adds the number of nodes and tokens
+    it looks at to `visits`."""
+
+    def counted(name, fn):
+        def walk(node, *args, **kwargs):
+            # The tokens in a node are looked at by the same call.
+            visits[name] += 1 + sum(
+                1 for kid in node if not isinstance(kid, SyntaxTree)
+            )
+            return fn(node, *args, **kwargs)
+
+        return walk
+
+    for module_name, module in list(sys.modules.items()):
+        if not module_name.startswith("uncompyle6"):
+            continue
+        for name in WALKS:
+            fn = getattr(uncompyle6.semantics.helper, name, None)
+            if name == "checker":
+                fn = uncompyle6.semantics.check_ast.checker
+            if fn is not None and getattr(module, name, None) is fn:
+                setattr(module, name, counted(name, fn))
+
+    preorder = TreeTransform.preorder
+
+    def counted_preorder(self, node=None):
+        visits["transform"] += 1
+        return preorder(self, node)
+
+    TreeTransform.preorder = counted_preorder
+
+
+@click.command()
+@click.argument("paths", nargs=-1, required=True)
+def main(paths):
+    visits = Counter()
+    count_visits(visits)
+    totals = Counter()
+    for path in paths:
+        visits.clear()
+        try:
+            decompile_file(path, StringIO())
+        except Exception as e:
+            print(f"{path}: {e.__class__.__name__}")
+            continue
+        totals.update(visits)
+        print(f"{path}: {sum(visits.values())}")
+    print()
+    for name in WALKS:
+        print(f"{name:28} {totals[name]:10}")
+    print(f"{'total':28} {sum(totals.values()):10}")
+    print(f"{'per file':28} {sum(totals.values()) / len(paths):10.0f}")
+
+
+if __name__ == "__main__":
+    main()
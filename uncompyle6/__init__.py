@@ -33,6 +33,13 @@ __docformat__ = "restructuredtext"
 from uncompyle6.version import __version__  # noqa
 
 if hasattr(sys, "setrecursionlimit"):
+    # Generating source recurses for each level of nesting in an
+    # expression: SourceWalker handlers and template_engine() call
+    # preorder() for the subtrees they expand. So this limit is what
+    # bounds how deeply nested an expression we can decompile; about
+    # 1200 terms of a string concatenation, or 400 calls in a chain of
+    # method calls. See uncompyle6.semantics.traversal.
+    #
     # pyston doesn't have setrecursionlimit
     sys.setrecursionlimit(5000)
 
@@ -0,0 +1,569 @@
+#  Copyright (c) 2026 by Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Decompile the bytecode files inside zip and tar archives and directory
+trees.
+
+This is for things like wheels, eggs, zipapps and unpacked PyInstaller
+bundles, which can hold hundreds of thousands of bytecode files.
+Nothing is extracted to disk: bytecode files are read from directory
+trees and tar archives through memory maps, and from zip archives
+member by member, one at a time as they are decompiled. So memory use
+doesn't grow with the number of files.
+
+The decompiled source is written to standard output, to a directory
+tree that mirrors the input, or to a single zip or tar archive. Line
+number maps go to the same place, and the source can be checked as it
+is for files given on their own. Files can be decompiled in worker
+processes as uncompyle6.batch does; they are still read one at a time,
+as workers become free.
+"""
+
+import mmap
+import os
+import os.path as osp
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from collections import namedtuple
+from io import BytesIO, StringIO
+from typing import Iterator, Optional, Tuple
+
+from xdis.load import load_module_from_file_object
+from xdis.version_info import PYTHON_VERSION_TRIPLE, version_tuple_to_str
+
+from uncompyle6.batch import (
+    FAILED_STATUS,
+    MEMORY_STATUS,
+    OKAY_STATUS,
+    FileResult,
+    limit_memory,
+    run_workers,
+)
+from uncompyle6.main import decompile_module
+from uncompyle6.parser import ParserError
+from uncompyle6.profiler import NULL_PROFILER
+from uncompyle6.result_cache import ResultCache
+from uncompyle6.semantics.pysource import SourceWalkerError
+from uncompyle6.verifier import CHECK_DESCRIPTIONS, DEFAULT_RUN_MEMORY, Verifier
+
+BYTECODE_SUFFIXES = (".pyc", ".pyo")
+
+# Compression used for output tar archives, by file-name suffix.
+TAR_COMPRESSION = {
+    ".tar": "",
+    ".tar.gz": "gz",
+    ".tgz": "gz",
+    ".tar.bz2": "bz2",
+    ".tbz2": "bz2",
+    ".tar.xz": "xz",
+    ".txz": "xz",
+}
+ZIP_SUFFIXES = (".zip", ".whl", ".egg", ".pyz")
+
+# A bytecode file in an archive or directory. `name` is its path
+# relative to the top of the archive or directory, with "/" as the
+# separator. `fp` is a binary file object to read the bytecode from;
+# it is only good until the next member is asked for.
+Member = namedtuple("Member", "name fp")
+
+
+def map_file(path: str):
+    """Return a read-only memory map of the file at `path`."""
+    with open(path, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            # Empty files can't be mapped.
+            return BytesIO()
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def archive_kind(path: str) -> Optional[str]:
+    """Return "zip" or "tar" if `path` is a file that is a zip or tar
+    archive, and None otherwise. We go by the contents, since zipapps
+    and eggs, for example, don't have a ".zip" suffix."""
+    if not osp.isfile(path) or path.endswith(BYTECODE_SUFFIXES):
+        return None
+    if zipfile.is_zipfile(path):
+        return "zip"
+    if tarfile.is_tarfile(path):
+        return "tar"
+    return None
+
+
+def iter_directory(top: str) -> Iterator[Member]:
+    """Yield the bytecode files below directory `top`, in sorted order."""
+    for root, dirs, files in os.walk(top):
+        dirs.sort()
+        for file_name in sorted(files):
+            if not file_name.endswith(BYTECODE_SUFFIXES):
+                continue
+            path = osp.join(root, file_name)
+            name = osp.relpath(path, top).replace(os.sep, "/")
+            fp = map_file(path)
+            try:
+                yield Member(name, fp)
+            finally:
+                fp.close()
+
+
+def iter_zip(path: str) -> Iterator[Member]:
+    """Yield the bytecode files in the zip archive `path`. Only the
+    central directory and the members we read are read from the file,
+    so we don't map it: zipfile wants a file object that mmap doesn't
+    quite provide before Python 3.13."""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and info.filename.endswith(BYTECODE_SUFFIXES):
+                yield Member(info.filename, BytesIO(archive.read(info)))
+
+
+def iter_tar(path: str) -> Iterator[Member]:
+    """Yield the bytecode files in the tar archive `path`, which may be
+    compressed. The archive is read as a stream, in a single pass."""
+    with map_file(path) as data, tarfile.open(fileobj=data, mode="r|*") as archive:
+        for info in archive:
+            if info.isfile() and info.name.endswith(BYTECODE_SUFFIXES):
+                yield Member(info.name, BytesIO(archive.extractfile(info).read()))
+
+
+def iter_members(path: str) -> Iterator[Member]:
+    """Yield the bytecode files in `path`, which can be a directory, a zip
+    or tar archive, or a single bytecode file."""
+    if osp.isdir(path):
+        return iter_directory(path)
+    kind = archive_kind(path)
+    if kind == "zip":
+        return iter_zip(path)
+    elif kind == "tar":
+        return iter_tar(path)
+    return iter([Member(osp.basename(path), map_file(path))])
+
+
+def source_name(name: str) -> str:
+    """Return the relative path to write the source for member `name` to.
+    This is `name` without its final "c" or "o", and with any leading
+    "/" removed. ValueError is raised if `name` has a ".." component,
+    since it could then be written outside of the output directory."""
+    parts = [
+        part for part in name.replace("\\", "/").split("/") if part not in ("", ".")
+    ]
+    if ".." in parts or not parts:
+        raise ValueError(f"unsafe member name {name!r}")
+    return "/".join(parts)[:-1]
+
+
+class StreamWriter:
+    """Writes decompiled source to a text stream, standard output by
+    default."""
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+
+    def write(self, name: str, text: str):
+        self.out.write(text)
+
+    def close(self):
+        self.out.flush()
+
+
+class TreeWriter:
+    """Writes decompiled source to files below a directory."""
+
+    def __init__(self, out_base: str):
+        self.out_base = out_base
+
+    def path(self, name: str) -> str:
+        """Return the path that `name` is written to."""
+        return osp.join(self.out_base, *name.split("/"))
+
+    def write(self, name: str, text: str):
+        path = self.path(name)
+        os.makedirs(osp.dirname(path), exist_ok=True)
+        with open(path, mode="w", encoding="utf-8") as fp:
+            fp.write(text)
+
+    def close(self):
+        pass
+
+
+class ZipWriter:
+    """Writes decompiled source to a zip archive."""
+
+    def __init__(self, path: str):
+        self.archive = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+
+    def write(self, name: str, text: str):
+        self.archive.writestr(name, text.encode("utf-8"))
+
+    def close(self):
+        self.archive.close()
+
+
+class TarWriter:
+    """Writes decompiled source to a tar archive."""
+
+    def __init__(self, path: str, compression: str):
+        self.archive = tarfile.open(path, f"w:{compression}")
+
+    def write(self, name: str, text: str):
+        data = text.encode("utf-8")
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.archive.addfile(info, BytesIO(data))
+
+    def close(self):
+        self.archive.close()
+
+
+def open_writer(output: Optional[str]):
+    """Return a writer for `output`. This is standard output if `output`
+    is None, a zip or tar archive if `output` has one of the suffixes in
+    ZIP_SUFFIXES or TAR_COMPRESSION, and otherwise a directory."""
+    if output is None:
+        return StreamWriter()
+    if output.endswith(ZIP_SUFFIXES):
+        return ZipWriter(output)
+    for suffix, compression in TAR_COMPRESSION.items():
+        if output.endswith(suffix):
+            return TarWriter(output, compression)
+    return TreeWriter(output)
+
+
+def decompile_member(
+    name: str,
+    member: Member,
+    infile: str,
+    result_cache: Optional[ResultCache] = None,
+    profiler=NULL_PROFILER,
+    do_linemaps: bool = False,
+    **options,
+) -> FileResult:
+    """Decompile `member`, which was read from `infile`, and return a
+    FileResult for it under `name`. Its `output` is the source, and its
+    `linemap` the line-number map if `do_linemaps` is true. Other
+    keyword arguments are passed on to decompile_module().
+    """
+    start = time.time()
+    out = StringIO()
+    mapstream = StringIO() if do_linemaps else None
+    version = None
+    profiler.start_file(infile)
+    try:
+        code_objects = {}
+        with profiler.phase("load"):
+            module = load_module_from_file_object(member.fp, member.name, code_objects)
+        version = module[0]
+        decompile_module(
+            module,
+            code_objects,
+            out,
+            mapstream=mapstream,
+            result_cache=result_cache,
+            profiler=profiler,
+            **options,
+        )
+    except (
+        ValueError,
+        SyntaxError,
+        ParserError,
+        SourceWalkerError,
+        ImportError,
+        RuntimeError,
+    ) as e:
+        if isinstance(e, RuntimeError) and not str(e).startswith("Unsupported Python"):
+            raise
+        return FileResult(
+            name,
+            FAILED_STATUS,
+            (1, 0, 1, 0),
+            time.time() - start,
+            str(e),
+            out.getvalue(),
+            None,
+            version,
+        )
+    return FileResult(
+        name,
+        OKAY_STATUS,
+        (1, 1, 0, 0),
+        time.time() - start,
+        "",
+        out.getvalue(),
+        mapstream.getvalue() if mapstream else None,
+        version,
+    )
+
+
+def member_worker_loop(conn, cache_dir, options, max_memory):
+    """Body of a worker process for archive_main(). Decompile each
+    (member name, infile, bytecode) task that arrives on `conn`, and
+    send back the FileResult from decompile_member() under the name
+    `infile`. If bytecode is None, it is read from `infile`. None means
+    stop.
+    """
+    limit_memory(max_memory)
+    result_cache = ResultCache(cache_dir) if cache_dir else None
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+        member_name, infile, data = task
+        fp = map_file(infile) if data is None else BytesIO(data)
+        try:
+            result = decompile_member(
+                infile, Member(member_name, fp), infile, result_cache, **options
+            )
+        except MemoryError:
+            # Let the parent start a new worker.
+            conn.send(FileResult(infile, MEMORY_STATUS, (1, 0, 1, 0), 0, "", ""))
+            break
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            result = FileResult(
+                infile,
+                FAILED_STATUS,
+                (1, 0, 1, 0),
+                0,
+                f"{e.__class__.__name__}: {e}",
+                "",
+            )
+        finally:
+            fp.close()
+        conn.send(result)
+    conn.close()
+
+
+def archive_main(
+    paths: list,
+    output: Optional[str] = None,
+    showasm: Optional[str] = None,
+    showast={},
+    showgrammar: bool = False,
+    source_encoding=None,
+    start_offset: int = 0,
+    stop_offset: int = -1,
+    cache_dir: Optional[str] = None,
+    profiler=NULL_PROFILER,
+    do_verify: Optional[str] = None,
+    do_linemaps: bool = False,
+    linemap_format: str = "comment",
+    jobs: int = 1,
+    timeout: Optional[float] = None,
+    max_memory: Optional[int] = None,
+) -> Tuple[int, int, int, int]:
+    """
+    Decompile all the bytecode files in `paths`, each of which can be
+    a directory, a zip or tar archive, or a bytecode file.
+
+    The source for a bytecode file is written to `output` under the
+    path of the file in its archive or directory, minus the final
+    "c". When there is more than one path, this is prefixed by the
+    base name of the path it came from. Source for a file that fails to
+    decompile gets a "_failed" suffix. A file whose source would be
+    written under the same name as that of an earlier file is counted
+    as failed and not decompiled. See open_writer() for what `output`
+    can be.
+
+    With `do_linemaps`, the line-number map for a file is written to
+    `output` too, under the name of its source plus ".pymap", or
+    ".pymap.json" if `linemap_format` is "json". `do_verify` is as in
+    uncompyle6.main.main(); source that isn't written to a directory is
+    checked from a temporary file. Programs run to check them are held
+    to `max_memory` too.
+
+    If `jobs` is more than 1, or there is a `timeout` or `max_memory`,
+    files are decompiled in worker processes; these are as in
+    uncompyle6.batch.batch_main(). Otherwise `profiler` is as in
+    uncompyle6.main.decompile().
+
+    Return the same counts as uncompyle6.main.main().
+    """
+    tot_files = okay_files = failed_files = verify_failed_files = 0
+    options = {
+        "showasm": showasm,
+        "showast": showast,
+        "showgrammar": showgrammar,
+        "source_encoding": source_encoding,
+        "start_offset": start_offset,
+        "stop_offset": stop_offset,
+        "do_linemaps": do_linemaps,
+        "linemap_format": linemap_format,
+    }
+    linemap_suffix = ".pymap.json" if linemap_format == "json" else ".pymap"
+    writer = open_writer(output)
+    verifier = None
+    if do_verify:
+        verifier = Verifier(max_memory=max_memory or DEFAULT_RUN_MEMORY)
+    # Where we write what we check that isn't written to a directory.
+    temp_dir = tempfile.mkdtemp(prefix="py-dis-") if do_verify else None
+    # Futures for the checks that haven't been reported yet, with the
+    # file checked and the temporary files to remove afterwards.
+    checks = []
+
+    def members():
+        """Yield the name to write the source to, the member, its path,
+        and whether it is in an archive, for each bytecode file. A file
+        whose source would be written under the same name as that of an
+        earlier file, such as "a.pyo" after "a.pyc", counts as failed."""
+        nonlocal tot_files, failed_files
+        # The file whose source is written under each name.
+        written_from = {}
+        for path in paths:
+            prefix = osp.basename(osp.normpath(path)) + "/" if len(paths) > 1 else ""
+            in_archive = archive_kind(path) is not None
+            is_container = osp.isdir(path) or in_archive
+            for member in iter_members(path):
+                infile = osp.join(path, member.name) if is_container else path
+                try:
+                    name = prefix + source_name(member.name)
+                except ValueError as e:
+                    tot_files += 1
+                    failed_files += 1
+                    sys.stderr.write(f"\n# file {infile}\n# {e}\n")
+                    continue
+                if name in written_from:
+                    tot_files += 1
+                    failed_files += 1
+                    sys.stderr.write(
+                        f"\n# file {infile}\n# source for {written_from[name]} "
+                        f"is already written to {name}\n"
+                    )
+                    continue
+                written_from[name] = infile
+                yield name, member, infile, in_archive
+
+    def temp_file(name: str, data) -> str:
+        path = osp.join(temp_dir, *name.split("/"))
+        os.makedirs(osp.dirname(path), exist_ok=True)
+        with open(path, "wb") as fp:
+            fp.write(data)
+        return path
+
+    def submit_check(result: FileResult, infile: str, bytecode):
+        """Start checking the source in `result`. `bytecode` is that of
+        a file in an archive for a round-trip check, and None otherwise."""
+        if PYTHON_VERSION_TRIPLE[:2] != result.version[:2]:
+            sys.stdout.write(
+                f"\n# skipping running {infile}; it is "
+                f"{version_tuple_to_str(result.version, end=2)}, and we are "
+                f"{version_tuple_to_str(PYTHON_VERSION_TRIPLE, end=2)}\n"
+            )
+            return
+        temp_paths = []
+        if isinstance(writer, TreeWriter):
+            source_path = writer.path(result.filename)
+        else:
+            source_path = temp_file(result.filename, result.output.encode("utf-8"))
+            temp_paths.append(source_path)
+        pyc_path = infile
+        if bytecode is not None:
+            pyc_path = temp_file(result.filename + "c", bytecode)
+            temp_paths.append(pyc_path)
+        future = verifier.submit(source_path, do_verify, pyc_path)
+        checks.append((future, infile, temp_paths))
+
+    def report_checks(wait: bool):
+        """Report the checks that have finished, or all of them if
+        `wait` is True."""
+        nonlocal verify_failed_files
+        for check in list(checks):
+            future, infile, temp_paths = check
+            if not (wait or future.done()):
+                continue
+            checks.remove(check)
+            result = future.result()
+            for path in temp_paths:
+                os.remove(path)
+            if result.output:
+                print(result.output)
+            if not result.valid:
+                verify_failed_files += 1
+                if result.errors:
+                    print(result.errors)
+                check_type = CHECK_DESCRIPTIONS[result.check]
+                sys.stderr.write(f"\n# {check_type} failed on file {infile}\n")
+
+    def report(result: FileResult, infile: str, bytecode=None):
+        nonlocal tot_files, okay_files, failed_files
+        tot_files += 1
+        if result.status == OKAY_STATUS:
+            okay_files += 1
+            writer.write(result.filename, result.output)
+        else:
+            failed_files += 1
+            sys.stderr.write(f"\n# file {infile}\n# {result.message}\n")
+            writer.write(result.filename + "_failed", result.output)
+        if result.linemap is not None:
+            writer.write(result.filename + linemap_suffix, result.linemap)
+        if result.status == OKAY_STATUS:
+            if isinstance(writer, StreamWriter):
+                print("\n# okay decompiling", infile)
+            if verifier is not None:
+                submit_check(result, infile, bytecode)
+        report_checks(wait=False)
+
+    try:
+        if jobs > 1 or timeout is not None or max_memory is not None:
+            # The name to write the source to and, if needed for checking,
+            # the bytecode of each file that a worker has, by its path.
+            # Workers send back the path as the FileResult file name.
+            assigned = {}
+
+            def tasks():
+                for name, member, infile, in_archive in members():
+                    # Files on disk are read by the worker.
+                    data = member.fp.read() if in_archive else None
+                    assigned[infile] = (name, data if do_verify == "roundtrip" else None)
+                    yield infile, (member.name, infile, data)
+
+            def report_worker(result: FileResult):
+                infile = result.filename
+                name, bytecode = assigned.pop(infile)
+                report(result._replace(filename=name), infile, bytecode)
+
+            run_workers(
+                tasks(),
+                member_worker_loop,
+                (cache_dir, options, max_memory),
+                jobs,
+                timeout,
+                report_worker,
+            )
+        else:
+            result_cache = ResultCache(cache_dir) if cache_dir else None
+            for name, member, infile, in_archive in members():
+                bytecode = None
+                if in_archive and do_verify == "roundtrip":
+                    # Loading the bytecode closes member.fp.
+                    bytecode = member.fp.getvalue()
+                result = decompile_member(
+                    name, member, infile, result_cache, profiler, **options
+                )
+                report(result, infile, bytecode)
+        report_checks(wait=True)
+    finally:
+        writer.close()
+        if verifier is not None:
+            verifier.close()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    return tot_files, okay_files, failed_files, verify_failed_files
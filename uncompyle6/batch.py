@@ -0,0 +1,384 @@
+#  Copyright (c) 2026 by Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Decompile many files using a pool of worker processes.
+
+Each worker is a long-lived process that runs uncompyle6.main.main() on
+one file at a time, so the scanners, parsers and grammars it has loaded
+stay warm from one file to the next. Files are handed out largest
+first to whichever worker is idle, so a big file doesn't end up
+holding up the batch at the end.
+
+A file that takes longer than the per-file timeout, or a worker that
+dies, say because it ran past its memory limit, is recorded as a
+failure for that file. The worker is then replaced by a fresh one and
+the batch continues.
+"""
+
+import multiprocessing
+import os.path as osp
+import sys
+import time
+from collections import namedtuple
+from contextlib import redirect_stdout
+from io import StringIO
+from multiprocessing.connection import wait
+from typing import Any, Iterator, Optional, Tuple
+
+from uncompyle6.main import compile_file, main
+from uncompyle6.result_cache import ResultCache
+from uncompyle6.verifier import DEFAULT_RUN_MEMORY, DEFAULT_RUN_TIMEOUT, Verifier
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+# Result of decompiling a single file. `status` is one of the *_STATUS
+# values below; `counts` is the (total, okay, failed, verify failed)
+# tuple that main() returns for the file. `output` is what main() wrote
+# to stdout for the file. For a member of an archive or directory,
+# `output` is its source, `linemap` is its line-number map, if one
+# was asked for, and `version` is its bytecode version; see
+# uncompyle6.archive.
+FileResult = namedtuple(
+    "FileResult",
+    "filename status counts elapsed message output linemap version",
+    defaults=(None, None),
+)
+
+# Result of decompiling a batch of files. The first four fields are the
+# same as what main() returns; `results` is a list of FileResult.
+BatchResult = namedtuple(
+    "BatchResult",
+    "tot_files okay_files failed_files verify_failed_files timeout_files results",
+)
+
+OKAY_STATUS = "okay"
+FAILED_STATUS = "failed"
+VERIFY_FAILED_STATUS = "verify failed"
+SKIPPED_STATUS = "skipped"
+TIMEOUT_STATUS = "timeout"
+MEMORY_STATUS = "out of memory"
+CRASHED_STATUS = "crashed"
+
+# The statuses of files whose worker process had to be replaced.
+WORKER_FAILURES = (TIMEOUT_STATUS, MEMORY_STATUS, CRASHED_STATUS)
+
+
+def file_status(counts: tuple) -> str:
+    """Return the status of a file given the counts from main()."""
+    tot_files, okay_files, failed_files, verify_failed_files = counts
+    if failed_files:
+        return FAILED_STATUS
+    elif verify_failed_files:
+        return VERIFY_FAILED_STATUS
+    elif okay_files:
+        return OKAY_STATUS
+    return SKIPPED_STATUS
+
+
+def limit_memory(max_memory: Optional[int]):
+    """Limit the address space of the current process to `max_memory`
+    bytes, if we can."""
+    if not max_memory or resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        max_memory = min(max_memory, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (max_memory, hard))
+
+
+def worker_loop(conn, in_base, out_base, outfile, options, max_memory, timeout):
+    """Body of a worker process. Decompile each file name that arrives
+    on `conn`, and send back a FileResult for it. None means stop.
+    """
+    limit_memory(max_memory)
+    # Keep the worker interpreter that checks files from one file to the
+    # next. A program that we run to check it may take no longer than
+    # a file may, nor use more memory.
+    verifier = None
+    if options.get("do_verify"):
+        verifier = Verifier(
+            jobs=1,
+            timeout=timeout or DEFAULT_RUN_TIMEOUT,
+            max_memory=max_memory or DEFAULT_RUN_MEMORY,
+        )
+    # Likewise the result cache, which keeps track of its size.
+    options = dict(options)
+    cache_dir = options.pop("cache_dir", None)
+    result_cache = ResultCache(cache_dir) if cache_dir else None
+    while True:
+        try:
+            filename = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if filename is None:
+            break
+        start = time.time()
+        message = ""
+        # Workers run concurrently, so we collect the output for a file
+        # and let the parent write it out in one piece.
+        out = StringIO()
+        try:
+            with redirect_stdout(out):
+                counts = main(
+                    in_base,
+                    out_base,
+                    [filename],
+                    [],
+                    outfile,
+                    verifier=verifier,
+                    result_cache=result_cache,
+                    **options,
+                )
+            status = file_status(counts)
+        except MemoryError:
+            # We can't trust this process after running out of memory, so
+            # report the file and let the parent start a new worker.
+            conn.send(
+                FileResult(
+                    filename,
+                    MEMORY_STATUS,
+                    (1, 0, 1, 0),
+                    time.time() - start,
+                    "",
+                    out.getvalue(),
+                )
+            )
+            break
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            status = FAILED_STATUS
+            counts = (1, 0, 1, 0)
+            message = f"{e.__class__.__name__}: {e}"
+        conn.send(
+            FileResult(
+                filename, status, counts, time.time() - start, message, out.getvalue()
+            )
+        )
+    if verifier is not None:
+        verifier.close()
+    conn.close()
+
+
+class Worker:
+    """A worker process together with our end of its pipe and the name of
+    the file it is working on, if any. `target` is the body of the
+    process, which is called with its end of the pipe and then
+    `worker_args`; see worker_loop()."""
+
+    def __init__(self, target, worker_args):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=target, args=(child_conn,) + worker_args, daemon=True
+        )
+        self.process.start()
+        # Close our copy of the child's end, so that we see EOF on
+        # self.conn if the worker dies.
+        child_conn.close()
+        self.filename = None
+        self.start = None
+
+    def assign(self, filename: str, task):
+        self.filename = filename
+        self.start = time.time()
+        self.conn.send(task)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.conn.close()
+
+
+def largest_first(in_base: str, filenames: list) -> list:
+    """Return `filenames` sorted by decreasing file size."""
+
+    def size(filename: str) -> int:
+        try:
+            return osp.getsize(osp.join(in_base, filename))
+        except OSError:
+            return 0
+
+    return sorted(filenames, key=size, reverse=True)
+
+
+def run_workers(
+    tasks: Iterator[Tuple[str, Any]],
+    target,
+    worker_args: tuple,
+    jobs: int,
+    timeout: Optional[float],
+    report,
+):
+    """Hand out `tasks`, an iterator of (file name, task) pairs, to `jobs`
+    worker processes running `target`, taking the next task only when a
+    worker is free. Each task is sent to a worker, which sends back a
+    FileResult for it. `report` is called with each FileResult as it
+    arrives, and with one made up here for a file whose worker timed
+    out, ran out of memory or died. Such a worker is replaced by a new
+    one.
+
+    `timeout` is the maximum number of seconds to spend on a single
+    file, or None for no limit.
+    """
+    tasks = iter(tasks)
+
+    def assign_next(worker):
+        """Give `worker` the next task, if there is one."""
+        task = next(tasks, None)
+        if task is None:
+            worker.filename = None
+        else:
+            worker.assign(*task)
+
+    def replace(worker, status: str, message: str):
+        """Report a failure for the file `worker` is on, and return a new
+        worker to take its place."""
+        report(
+            FileResult(
+                worker.filename,
+                status,
+                (1, 0, 1, 0),
+                time.time() - worker.start,
+                message,
+                "",
+            )
+        )
+        worker.kill()
+        new_worker = Worker(target, worker_args)
+        assign_next(new_worker)
+        return new_worker
+
+    workers = []
+    try:
+        for _ in range(max(1, jobs)):
+            task = next(tasks, None)
+            if task is None:
+                break
+            worker = Worker(target, worker_args)
+            workers.append(worker)
+            worker.assign(*task)
+        while any(worker.filename for worker in workers):
+            busy = [worker for worker in workers if worker.filename]
+            wait_time = None
+            if timeout is not None:
+                now = time.time()
+                wait_time = max(0, min(w.start + timeout - now for w in busy))
+            wait([worker.conn for worker in busy], wait_time)
+
+            for i, worker in enumerate(workers):
+                if not worker.filename:
+                    continue
+                if worker.conn.poll():
+                    try:
+                        result = worker.conn.recv()
+                    except (EOFError, OSError):
+                        workers[i] = replace(
+                            worker,
+                            CRASHED_STATUS,
+                            "worker process died with exit code "
+                            f"{worker.process.exitcode}",
+                        )
+                        continue
+                    if result.status == MEMORY_STATUS:
+                        workers[i] = replace(worker, MEMORY_STATUS, "out of memory")
+                        continue
+                    report(result)
+                    assign_next(worker)
+                elif timeout is not None and time.time() - worker.start >= timeout:
+                    workers[i] = replace(
+                        worker, TIMEOUT_STATUS, f"timed out after {timeout} seconds"
+                    )
+    finally:
+        for worker in workers:
+            worker.stop()
+
+
+def batch_main(
+    in_base: str,
+    out_base: Optional[str],
+    compiled_files: list,
+    source_files: list,
+    outfile: Optional[str] = None,
+    jobs: int = 2,
+    timeout: Optional[float] = None,
+    max_memory: Optional[int] = None,
+    **options,
+) -> BatchResult:
+    """Like uncompyle6.main.main(), but decompile `compiled_files`
+    using `jobs` worker processes.
+
+    `timeout` is the maximum number of seconds to spend on a single
+    file, and `max_memory` is the maximum number of bytes a worker
+    process may use. Either can be None for no limit. Other keyword
+    arguments are passed on to main().
+    """
+    compiled_files = list(compiled_files)
+    for source_path in source_files:
+        compiled_files.append(compile_file(source_path))
+
+    results = []
+
+    def report(result):
+        results.append(result)
+        if result.status in WORKER_FAILURES:
+            sys.stderr.write(
+                f"\n# file {osp.join(in_base, result.filename)}\n# {result.message}\n"
+            )
+        else:
+            sys.stdout.write(result.output)
+            sys.stdout.flush()
+
+    run_workers(
+        ((filename, filename) for filename in largest_first(in_base, compiled_files)),
+        worker_loop,
+        (in_base, out_base, outfile, options, max_memory, timeout),
+        jobs,
+        timeout,
+        report,
+    )
+
+    tot_files = okay_files = failed_files = verify_failed_files = timeout_files = 0
+    for result in results:
+        t, o, f, v = result.counts
+        tot_files += t
+        okay_files += o
+        failed_files += f
+        verify_failed_files += v
+        if result.status == TIMEOUT_STATUS:
+            timeout_files += 1
+    return BatchResult(
+        tot_files,
+        okay_files,
+        failed_files,
+        verify_failed_files,
+        timeout_files,
+        results,
+    )
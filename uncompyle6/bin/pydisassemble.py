@@ -21,6 +21,7 @@ import getopt
 import os
 import sys
 
+from uncompyle6.bulk_disasm import bulk_disassemble
 from uncompyle6.code_fns import disassemble_file
 from uncompyle6.version import __version__
 
@@ -48,10 +49,17 @@ Examples:
   {0} foo.pyc
   {0} foo.py    # same thing as above but find the file
   {0} foo.pyc bar.pyc  # disassemble foo.pyc and bar.pyc
+  {0} --format=jsonl -j 8 *.pyc > tokens.jsonl
 
 See also `pydisasm' from the `xdis' package.
 
 Options:
+  --format {{text|jsonl}}
+                     write tokens as text, the default, or as JSON Lines:
+                     one line per code object, with the tokens given
+                     column by column. See uncompyle6/bulk_disasm.py
+  -j | --jobs <n>    with --format=jsonl, disassemble files in <n>
+                     processes; the default is the number of CPUs
   -V | --version     show version and stop
   -h | --help        show this message
 
@@ -75,12 +83,16 @@ Type -h for for full help."""
 
     try:
         opts, files = getopt.getopt(
-            sys.argv[1:], "hVU", ["help", "version", "uncompyle6"]
+            sys.argv[1:],
+            "hVUj:",
+            ["help", "version", "uncompyle6", "format=", "jobs="],
         )
     except getopt.GetoptError as e:
         print(f"{os.path.basename(sys.argv[0])}: {e}", file=sys.stderr)
         sys.exit(-1)
 
+    output_format = "text"
+    jobs = None
     for opt, val in opts:
         if opt in ("-h", "--help"):
             print(__doc__)
@@ -88,18 +100,37 @@ Type -h for for full help."""
         elif opt in ("-V", "--version"):
             print(f"{program} {__version__}")
             sys.exit(0)
+        elif opt == "--format":
+            if val not in ("text", "jsonl"):
+                print(f"Unknown format {val}; use text or jsonl", file=sys.stderr)
+                sys.exit(1)
+            output_format = val
+        elif opt in ("-j", "--jobs"):
+            try:
+                jobs = int(val)
+            except ValueError:
+                print(f"--jobs needs a number, not {val}", file=sys.stderr)
+                sys.exit(1)
         else:
             print(opt)
             print(usage_short, file=sys.stderr)
             sys.exit(1)
 
+    readable_files = []
     for file in files:
-        if os.path.exists(files[0]):
-            disassemble_file(file, sys.stdout)
+        if os.path.exists(file):
+            readable_files.append(file)
         else:
-            print(f"Can't read {files[0]} - skipping", file=sys.stderr)
-            pass
+            print(f"Can't read {file} - skipping", file=sys.stderr)
         pass
+
+    if output_format == "jsonl":
+        if readable_files and bulk_disassemble(readable_files, sys.stdout, jobs):
+            sys.exit(1)
+        return
+
+    for file in readable_files:
+        disassemble_file(file, sys.stdout)
     return
 
 
@@ -15,7 +15,10 @@ from typing import List
 import click
 from xdis.version_info import version_tuple_to_str
 
+from uncompyle6.archive import archive_kind, archive_main
+from uncompyle6.batch import batch_main
 from uncompyle6.main import main, status_msg
+from uncompyle6.profiler import NULL_PROFILER, Profiler
 from uncompyle6.verify import VerifyCmpError
 from uncompyle6.version import __version__
 
@@ -27,6 +30,13 @@ def usage():
     sys.exit(1)
 
 
+def save_profile(profiler, path):
+    """Write what `profiler` recorded to `path`, if profiling."""
+    if profiler.enabled:
+        profiler.close()
+        profiler.save(path)
+
+
 # __doc__ = """
 # Usage:
 #   %s [OPTIONS]... [ FILE | DIR]...
@@ -51,14 +61,30 @@ def usage():
 #   --compile | -c <python-file>
 #                 attempts a decompilation after compiling <python-file>
 #   -d            print timestamps
-#   -p <integer>  use <integer> number of processes
+#   -j <integer>  use <integer> number of processes
+#   --timeout <seconds>
+#                 give up on a file after <seconds> seconds
+#   --max-memory <megabytes>
+#                 limit each worker process, and programs run to verify,
+#                 to <megabytes> of memory
+#   --cache-dir <path>
+#                 cache decompilation results in <path>
 #   -r            recurse directories looking for .pyc and .pyo files
+#   --output-archive <path>
+#                 write decompiled files into zip or tar archive <path>
+#   --profile <path>
+#                 write per-phase times for each code object to <path>
+#   --profile-memory
+#                 add memory allocated in each phase to --profile output
 #   --fragments   use fragments deparser
 #   --verify      compare generated source with input byte-code
 #   --verify-run  compile generated source, run it and check exit code
 #   --syntax-verify compile generated source
 #   --linemaps    generated line number correspondencies between byte-code
 #                 and generated source output
+#   --linemap-format {comment|json}
+#                 write --linemaps as a Python comment, or as JSON with a
+#                 map for each code object
 #   --encoding  <encoding>
 #                 use <encoding> in generated source according to pep-0263
 #   --help        show this message
@@ -104,10 +130,20 @@ def usage():
     help="show line number correspondencies between byte-code "
     "and generated source output",
 )
+@click.option(
+    "--linemap-format",
+    "linemap_format",
+    type=click.Choice(["comment", "json"]),
+    default="comment",
+    help="how to write --linemaps: as a Python comment, or as JSON with a map "
+    "for each code object. JSON maps go into files ending in .pymap.json.",
+)
 @click.option(
     "--verify",
-    type=click.Choice(["run", "syntax"]),
+    type=click.Choice(["run", "syntax", "roundtrip"]),
     default=None,
+    help="check the decompiled source. 'run' runs it with limits on its time "
+    "and memory, but with your privileges, so use it only on code you trust.",
 )
 @click.option(
     "--recurse/--no-recurse",
@@ -138,6 +174,61 @@ def usage():
     help="stop decomplation when seeing an offset greater or equal to this; default is "
     "-1 which indicates no stopping point.",
 )
+@click.option(
+    "--jobs",
+    "-j",
+    "jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="decompile using this many worker processes; default is 1.",
+)
+@click.option(
+    "--timeout",
+    "timeout",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="give up on a file after this many seconds. Implies a worker process.",
+)
+@click.option(
+    "--max-memory",
+    "max_memory",
+    default=None,
+    type=click.IntRange(min=1),
+    help="limit each worker process, and each program run by --verify run, "
+    "to this many megabytes of memory. Implies a worker process.",
+)
+@click.option(
+    "--cache-dir",
+    "cache_dir",
+    default=None,
+    type=click.Path(file_okay=False, dir_okay=True, writable=True, resolve_path=True),
+    help="cache decompilation results in this directory, and reuse results "
+    "found there.",
+)
+@click.option(
+    "--output-archive",
+    "output_archive",
+    default=None,
+    type=click.Path(file_okay=True, dir_okay=False, writable=True, resolve_path=True),
+    help="write decompiled files into this zip or tar archive. The kind of "
+    "archive is taken from the suffix, e.g. .zip or .tar.gz.",
+)
+@click.option(
+    "--profile",
+    "profile",
+    default=None,
+    type=click.Path(file_okay=True, dir_okay=False, writable=True),
+    help="write the time taken by each phase of decompiling each code object "
+    "to this file. A path ending in .json gets a Chrome trace; any other "
+    "path gets JSON Lines.",
+)
+@click.option(
+    "--profile-memory/--no-profile-memory",
+    "profile_memory",
+    default=False,
+    help="with --profile, also record the memory allocated in each phase. "
+    "This slows decompilation down a lot.",
+)
 @click.argument("files", nargs=-1, type=click.Path(readable=True), required=True)
 def main_bin(
     asm: bool,
@@ -146,15 +237,28 @@ def main_bin(
     tree: bool,
     tree_plus: bool,
     linemaps: bool,
+    linemap_format: str,
     verify,
     recurse_dirs: bool,
     outfile,
     start_offset: int,
     stop_offset: int,
+    jobs: int,
+    timeout,
+    max_memory,
+    cache_dir,
+    output_archive,
+    profile,
+    profile_memory: bool,
     files,
 ):
     """
     Cross Python bytecode decompiler for Python bytecode up to Python 3.8.
+
+    FILES can also be zip or tar archives, such as wheels, eggs or
+    zipapps. The bytecode files in these are decompiled without
+    extracting them. With --recurse, the bytecode files below the
+    directories in FILES are decompiled.
     """
 
     version_tuple = sys.version_info[0:2]
@@ -166,25 +270,83 @@ def main_bin(
         )
         sys.exit(-1)
 
-    numproc = 0
-    out_base = None
-
     out_base = None
     source_paths: List[str] = []
     timestamp = False
     timestampfmt = "# %Y.%m.%d %H:%M:%S %Z"
     pyc_paths = files
 
-    # Expand directory if "recurse" was specified.
-    if recurse_dirs:
-        expanded_files = []
+    # A second -a turns show_asm="after" into show_asm="before"
+    if asm_plus or asm:
+        asm_opt = "both" if asm_plus else "after"
+    else:
+        asm_opt = None
+
+    show_ast = {"before": tree or tree_plus, "after": tree_plus}
+
+    if profile and (jobs > 1 or timeout or max_memory):
+        print(
+            "--profile can't be used with --jobs, --timeout or --max-memory",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    if profile:
+        profiler = Profiler(trace_memory=profile_memory)
+    else:
+        profiler = NULL_PROFILER
+
+    # Archives and directories, and any files given along with them, are
+    # read member by member rather than expanded into a list of files.
+    if (
+        output_archive
+        or any(archive_kind(f) for f in pyc_paths)
+        or (recurse_dirs and any(os.path.isdir(f) for f in pyc_paths))
+    ):
+        if output_archive:
+            output = output_archive
+        elif outfile and outfile != "-":
+            if not os.path.isdir(outfile):
+                print(
+                    "--output must be a directory when decompiling archives "
+                    "or directories",
+                    file=sys.stderr,
+                )
+                sys.exit(1)
+            output = outfile
+        else:
+            output = None
+        archive_paths = []
         for f in pyc_paths:
-            if os.path.isdir(f):
-                for root, _, dir_files in os.walk(f):
-                    for df in dir_files:
-                        if df.endswith(".pyc") or df.endswith(".pyo"):
-                            expanded_files.append(os.path.join(root, df))
-        pyc_paths = expanded_files
+            if os.path.isdir(f) and not recurse_dirs:
+                print(f"Skipping directory {f}; use --recurse", file=sys.stderr)
+            else:
+                archive_paths.append(f)
+        try:
+            result = archive_main(
+                archive_paths,
+                output,
+                showasm=asm_opt,
+                showgrammar=show_grammar,
+                showast=show_ast,
+                start_offset=start_offset,
+                stop_offset=stop_offset,
+                cache_dir=cache_dir,
+                profiler=profiler,
+                do_verify=verify,
+                do_linemaps=linemaps,
+                linemap_format=linemap_format,
+                jobs=jobs,
+                timeout=timeout,
+                max_memory=max_memory * 1024 * 1024 if max_memory else None,
+            )
+        except KeyboardInterrupt:
+            pass
+        else:
+            if result[0] > 1:
+                print("# " + status_msg(*result))
+        finally:
+            save_profile(profiler, profile)
+        return
 
     # argl, commonprefix works on strings, not on path parts,
     # thus we must handle the case with files in 'some/classes'
@@ -209,17 +371,10 @@ def main_bin(
         out_base = outfile
         outfile = None
 
-    # A second -a turns show_asm="after" into show_asm="before"
-    if asm_plus or asm:
-        asm_opt = "both" if asm_plus else "after"
-    else:
-        asm_opt = None
-
     if timestamp:
         print(time.strftime(timestampfmt))
 
-    if numproc <= 1:
-        show_ast = {"before": tree or tree_plus, "after": tree_plus}
+    if jobs <= 1 and timeout is None and max_memory is None:
         try:
             result = main(
                 src_base,
@@ -232,8 +387,11 @@ def main_bin(
                 showast=show_ast,
                 do_verify=verify,
                 do_linemaps=linemaps,
+                linemap_format=linemap_format,
                 start_offset=start_offset,
                 stop_offset=stop_offset,
+                cache_dir=cache_dir,
+                profiler=profiler,
             )
             if len(pyc_paths) > 1:
                 mess = status_msg(*result)
@@ -246,73 +404,38 @@ def main_bin(
             pass
         except VerifyCmpError:
             raise
+        finally:
+            save_profile(profiler, profile)
     else:
-        from multiprocessing import Process, Queue
-
         try:
-            from Queue import Empty
-        except ImportError:
-            from queue import Empty
-
-        fqueue = Queue(len(pyc_paths) + numproc)
-        for f in pyc_paths:
-            fqueue.put(f)
-        for i in range(numproc):
-            fqueue.put(None)
-
-        rqueue = Queue(numproc)
-
-        tot_files = okay_files = failed_files = verify_failed_files = 0
-
-        def process_func():
-            (tot_files, okay_files, failed_files, verify_failed_files) = (
-                0,
-                0,
-                0,
-                0,
-            )
-            try:
-                while 1:
-                    f = fqueue.get()
-                    if f is None:
-                        break
-                    (t, o, f, v) = main(src_base, out_base, [f], [], outfile)
-                    tot_files += t
-                    okay_files += o
-                    failed_files += f
-                    verify_failed_files += v
-            except (Empty, KeyboardInterrupt):
-                pass
-            rqueue.put((tot_files, okay_files, failed_files, verify_failed_files))
-            rqueue.close()
-
-        try:
-            procs = [Process(target=process_func) for i in range(numproc)]
-            for p in procs:
-                p.start()
-            for p in procs:
-                p.join()
-            try:
-                (tot_files, okay_files, failed_files, verify_failed_files) = (
-                    0,
-                    0,
-                    0,
-                    0,
-                )
-                while True:
-                    (t, o, f, v) = rqueue.get(False)
-                    tot_files += t
-                    okay_files += o
-                    failed_files += f
-                    verify_failed_files += v
-            except Empty:
-                pass
-            print(
-                "# decompiled %i files: %i okay, %i failed, %i verify failed"
-                % (tot_files, okay_files, failed_files, verify_failed_files)
+            result = batch_main(
+                src_base,
+                out_base,
+                pyc_paths,
+                source_paths,
+                outfile,
+                jobs=jobs,
+                timeout=timeout,
+                max_memory=max_memory * 1024 * 1024 if max_memory else None,
+                showasm=asm_opt,
+                showgrammar=show_grammar,
+                showast=show_ast,
+                do_verify=verify,
+                do_linemaps=linemaps,
+                linemap_format=linemap_format,
+                start_offset=start_offset,
+                stop_offset=stop_offset,
+                cache_dir=cache_dir,
             )
-        except (KeyboardInterrupt, OSError):
+        except KeyboardInterrupt:
             pass
+        else:
+            if len(pyc_paths) > 1:
+                mess = status_msg(*result[:4])
+                if result.timeout_files:
+                    mess += f", {result.timeout_files} timed out"
+                print("# " + mess)
+                pass
 
     if timestamp:
         print(time.strftime(timestampfmt))
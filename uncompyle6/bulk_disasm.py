@@ -0,0 +1,154 @@
+#  Copyright (c) 2026 by Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Disassemble many bytecode files into the token stream that the
+uncompyle6 parser sees, as data rather than text.
+
+The output is JSON Lines, one line per code object, with the tokens
+given column by column:
+
+    {"file": "foo.pyc", "version": "3.8.0", "path": ["<module>", "f"],
+     "firstlineno": 3, "kind": [...], "op": [...], "offset": [...],
+     "attr": [...], "pattr": [...], "linestart": [...]}
+
+`path` is the co_name of each code object from the module down to this
+one. Code objects come in the order code_fns.disco_loop() prints them:
+breadth first. Values of `attr` and `pattr` that JSON has no type for,
+such as code objects and tuples, are given by their repr(), with the
+items of a frozenset sorted. A file
+that can't be disassembled gets a single line:
+
+    {"file": "foo.pyc", "error": "..."}
+
+Files are spread over a pool of processes.
+"""
+
+import json
+import math
+import multiprocessing
+import os
+from collections import deque
+from typing import Optional, TextIO
+
+from xdis import iscode, load_module
+from xdis.version_info import PythonImplementation, version_tuple_to_str
+
+from uncompyle6.code_fns import check_object_path
+from uncompyle6.scanner import get_scanner
+
+
+def json_value(value):
+    """Return `value` as something that json.dumps() writes as is."""
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float) and math.isfinite(value):
+        return value
+    if iscode(value):
+        return "<code object %s>" % value.co_name
+    if isinstance(value, frozenset):
+        # The iteration order of a set can vary from run to run.
+        return "frozenset({%s})" % ", ".join(sorted(repr(item) for item in value))
+    return repr(value)
+
+
+def code_records(scanner, co, filename: str, version: tuple) -> list:
+    """Disassemble `co` and the code objects in it, returning a list
+    with a record of the tokens for each of them."""
+    records = []
+    version_str = version_tuple_to_str(version)
+    queue = deque([(co, ())])
+    while queue:
+        co, parent_path = queue.popleft()
+        name = co.co_name
+        if isinstance(name, bytes):
+            # Bytecode from Python 2 can have names that are bytes.
+            name = name.decode("latin-1")
+        path = parent_path + (name,)
+        tokens, _ = scanner.ingest(co)
+        for t in tokens:
+            if iscode(t.pattr):
+                queue.append((t.pattr, path))
+            elif iscode(t.attr):
+                queue.append((t.attr, path))
+        records.append(
+            {
+                "file": filename,
+                "version": version_str,
+                "path": list(path),
+                "firstlineno": getattr(co, "co_firstlineno", None),
+                "kind": [t.kind for t in tokens],
+                "op": [t.op for t in tokens],
+                "offset": [t.offset for t in tokens],
+                "attr": [json_value(t.attr) for t in tokens],
+                "pattr": [json_value(t.pattr) for t in tokens],
+                "linestart": [t.linestart for t in tokens],
+            }
+        )
+    return records
+
+
+def file_records(filename: str) -> list:
+    """Return the token records for each code object in bytecode file
+    `filename`. As with code_fns.disassemble_file(), a Python source file
+    is taken to mean the bytecode file compiled from it."""
+    filename = check_object_path(filename)
+    version, _, _, co, python_implementation, _, _, _ = load_module(filename)
+    scanner = get_scanner(
+        version, is_pypy=python_implementation == PythonImplementation.PyPy
+    )
+    if not isinstance(co, list):
+        co = [co]
+    records = []
+    for code in co:
+        records += code_records(scanner, code, filename, version)
+    return records
+
+
+def file_jsonl(filename: str) -> tuple:
+    """Return the JSON Lines for bytecode file `filename`, and whether
+    disassembling it failed."""
+    try:
+        lines = [json.dumps(record) + "\n" for record in file_records(filename)]
+        failed = False
+    except Exception as e:
+        lines = [json.dumps({"file": filename, "error": str(e) or repr(e)}) + "\n"]
+        failed = True
+    return "".join(lines), failed
+
+
+def bulk_disassemble(filenames: list, out: TextIO, jobs: Optional[int] = None) -> int:
+    """Write the JSON Lines for each of `filenames` to `out`, in the
+    order given, using `jobs` processes. Return the number of files that
+    couldn't be disassembled.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(filenames))
+    failed = 0
+    if jobs <= 1:
+        results = map(file_jsonl, filenames)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap(file_jsonl, filenames, chunksize=4)
+    try:
+        for lines, file_failed in results:
+            failed += file_failed
+            out.write(lines)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return failed
@@ -31,6 +31,7 @@ Second, we need structured instruction information for the
 want to run on earlier Python versions.
 """
 
+import hashlib
 import sys
 from collections import deque
 
@@ -40,6 +41,61 @@ from xdis.version_info import PythonImplementation, version_tuple_to_str
 from uncompyle6.scanner import get_scanner
 
 
+# Code-object attributes that go into code_digest(). co_filename is left
+# out, so that the same code compiled under different paths matches.
+DIGEST_ATTRIBUTES = (
+    "co_argcount",
+    "co_posonlyargcount",
+    "co_kwonlyargcount",
+    "co_nlocals",
+    "co_flags",
+    "co_code",
+    "co_names",
+    "co_varnames",
+    "co_freevars",
+    "co_cellvars",
+    "co_name",
+    "co_firstlineno",
+    "co_lnotab",
+    "co_linetable",
+)
+
+
+def _digest_update(h, value):
+    """Add `value`, a code object or a constant found in one, to hash
+    `h`. Unlike marshal, this works for code objects of any Python
+    version."""
+    if iscode(value):
+        h.update(b"C")
+        for name in DIGEST_ATTRIBUTES:
+            _digest_update(h, getattr(value, name, None))
+        h.update(b"K")
+        _digest_update(h, tuple(value.co_consts))
+    elif isinstance(value, (tuple, list)):
+        h.update(b"(%d" % len(value))
+        for item in value:
+            _digest_update(h, item)
+        h.update(b")")
+    elif isinstance(value, frozenset):
+        # The iteration order of a set can vary from run to run.
+        h.update(b"{")
+        for item_digest in sorted(code_digest(item) for item in value):
+            h.update(item_digest.encode("ascii"))
+        h.update(b"}")
+    else:
+        h.update(f"{type(value).__name__}:{value!r};".encode("utf-8", "backslashreplace"))
+
+
+def code_digest(co) -> str:
+    """Return a hex digest of code object `co` and everything nested
+    in it. Code objects which are the same apart from their file name
+    have the same digest. `co` can also be a constant.
+    """
+    h = hashlib.sha1()
+    _digest_update(h, co)
+    return h.hexdigest()
+
+
 def disco(version, co, out=None, is_pypy=False):
     """
     disassembles and deparses a given code block ``co``.
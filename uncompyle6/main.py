@@ -13,14 +13,16 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import ast
 import datetime
+import functools
+import inspect
+import json
 import os
 import os.path as osp
 import py_compile
-import subprocess
 import sys
 import tempfile
+from io import StringIO
 from typing import Any, Optional, TextIO, Tuple
 
 from xdis import iscode
@@ -34,13 +36,26 @@ from xdis.version_info import (
 
 from uncompyle6.code_fns import check_object_path
 from uncompyle6.parser import ParserError
+from uncompyle6.profiler import NULL_PROFILER
+from uncompyle6.result_cache import (
+    FAILED_STATUS,
+    OKAY_STATUS,
+    CachedDeparse,
+    CachedParserError,
+    ResultCache,
+)
 from uncompyle6.semantics.fragments import code_deparse as code_deparse_fragments
-from uncompyle6.semantics.linemap import deparse_code_with_map
+from uncompyle6.semantics.linemap import deparse_code_with_map, linemap_data
 from uncompyle6.semantics.pysource import (
     PARSER_DEFAULT_DEBUG,
     SourceWalkerError,
     code_deparse,
 )
+from uncompyle6.verifier import (
+    CHECK_DESCRIPTIONS,
+    Verifier,
+    syntax_check as verifier_syntax_check,
+)
 from uncompyle6.version import __version__
 
 # from uncompyle6.linenumbers import line_number_mapping
@@ -62,14 +77,7 @@ def _get_outstream(outfile: str) -> Any:
 
 
 def syntax_check(filename: str) -> bool:
-    with open(filename) as f:
-        source = f.read()
-    valid = True
-    try:
-        ast.parse(source)
-    except SyntaxError:
-        valid = False
-    return valid
+    return verifier_syntax_check(filename).valid
 
 
 def decompile(
@@ -90,6 +98,10 @@ def decompile(
     compile_mode="exec",
     start_offset: int = 0,
     stop_offset: int = -1,
+    result_cache: Optional[ResultCache] = None,
+    profiler=NULL_PROFILER,
+    linemap_format: str = "comment",
+    keep_text: bool = False,
 ) -> Any:
     """
     ingests and deparses a given code block 'co'
@@ -97,6 +109,24 @@ def decompile(
     if `bytecode_version` is None, use the current Python interpreter
     version.
 
+    If `result_cache` is given, the decompiled source is looked up
+    there first and saved there afterwards. The cache is not used
+    when showing debugging information or decompiling part of `co`.
+
+    If `profiler` is an uncompyle6.profiler.Profiler, the time spent
+    in each phase of decompilation is recorded there. The fragments
+    deparser is not profiled.
+
+    If `mapstream` is given, the line-number correspondences between
+    `co` and the source written are written to it. `linemap_format`
+    says how: "comment" writes the whole-source map as a Python comment,
+    and "json" writes a line of JSON with the maps for each code object
+    as well. See uncompyle6.semantics.linemap.linemap_data().
+
+    Source is written to `out` as it is generated, so the `text`
+    attribute of the walker returned is None unless `keep_text` is True,
+    or the source came from `result_cache`.
+
     Caller is responsible for closing `out` and `mapstream`
     """
     if bytecode_version is None:
@@ -105,8 +135,13 @@ def decompile(
     # store final output stream for case of error
     real_out = out or sys.stdout
 
+    # The number of lines written before the decompiled source.
+    header_lines = 0
+
     def write(s):
+        nonlocal header_lines
         s += "\n"
+        header_lines += s.count("\n")
         real_out.write(s)
 
     assert iscode(co), f"""{co} does not smell like code"""
@@ -140,7 +175,51 @@ def decompile(
         grammar["reduce"] = True
 
     debug_opts = {"asm": showasm, "tree": showast, "grammar": grammar}
+    header_count = 3 + len(sys_version_lines)
 
+    def write_linemap(linemap):
+        linemap = [
+            (line_no, source_line_no + header_count)
+            for line_no, source_line_no in linemap
+        ]
+        mapstream.write(f"\n\n# {linemap}\n")
+
+    def write_linemap_data(deparsed):
+        data = linemap_data(deparsed, header_lines)
+        mapstream.write(json.dumps(data, separators=(",", ":")) + "\n")
+
+    if (
+        result_cache is None
+        or showasm
+        or any(showast.values())
+        or showgrammar
+        or do_fragments
+        or (mapstream and linemap_format != "comment")
+        or start_offset != 0
+        or stop_offset != -1
+    ):
+        cache_key = None
+    else:
+        cache_key = result_cache.key(co, magic_int, is_pypy, compile_mode)
+        if mapstream and isinstance(mapstream, str):
+            mapstream = _get_outstream(mapstream)
+        entry = result_cache.get(cache_key)
+        if entry is not None and (entry["linemap"] is not None or not mapstream):
+            real_out.write(entry["source"])
+            if entry["status"] == FAILED_STATUS:
+                if entry.get("error") == "ParserError":
+                    raise CachedParserError(entry["message"])
+                raise SourceWalkerError(entry["message"])
+            if mapstream:
+                write_linemap(entry["linemap"])
+            real_out.write("\n")
+            return CachedDeparse(
+                out, bytecode_version, entry["source"], dict(entry["linemap"] or [])
+            )
+        # Collect the source text so that we can save it in the cache.
+        out = StringIO()
+
+    deparsed = None
     try:
         if mapstream:
             if isinstance(mapstream, str):
@@ -155,20 +234,23 @@ def decompile(
                 code_objects=code_objects,
                 is_pypy=is_pypy,
                 debug_opts=debug_opts,
+                profiler=profiler,
+                stream_output=True,
+                keep_text=keep_text,
             )
-            header_count = 3 + len(sys_version_lines)
-            if deparsed is not None:
-                linemap = [
-                    (line_no, deparsed.source_linemap[line_no] + header_count)
-                    for line_no in sorted(deparsed.source_linemap.keys())
-                ]
-                mapstream.write(f"\n\n# {linemap}\n")
-        else:
-            if do_fragments:
-                deparse_fn = code_deparse_fragments
+            if deparsed is None:
+                pass
+            elif linemap_format == "json":
+                write_linemap_data(deparsed)
             else:
-                deparse_fn = code_deparse
-            deparsed = deparse_fn(
+                write_linemap(
+                    [
+                        (line_no, deparsed.source_linemap[line_no])
+                        for line_no in sorted(deparsed.source_linemap.keys())
+                    ]
+                )
+        elif do_fragments:
+            deparsed = code_deparse_fragments(
                 co,
                 out,
                 bytecode_version,
@@ -178,12 +260,54 @@ def decompile(
                 start_offset=start_offset,
                 stop_offset=stop_offset,
             )
-            pass
-        real_out.write("\n")
-        return deparsed
-    except SourceWalkerError as e:
+        else:
+            deparsed = code_deparse(
+                co,
+                out,
+                bytecode_version,
+                is_pypy=is_pypy,
+                debug_opts=debug_opts,
+                compile_mode=compile_mode,
+                start_offset=start_offset,
+                stop_offset=stop_offset,
+                profiler=profiler,
+                stream_output=True,
+                keep_text=keep_text,
+            )
+    except (ParserError, SourceWalkerError) as e:
+        if cache_key is not None:
+            real_out.write(out.getvalue())
+            result_cache.put(
+                cache_key,
+                FAILED_STATUS,
+                out.getvalue(),
+                message=str(e),
+                error=e.__class__.__name__,
+            )
+        if isinstance(e, ParserError):
+            raise
         # deparsing failed
         raise SourceWalkerError(str(e))
+    except BaseException:
+        if cache_key is not None:
+            real_out.write(out.getvalue())
+        raise
+
+    if cache_key is not None:
+        source = out.getvalue()
+        real_out.write(source)
+        if deparsed is not None:
+            linemap = None
+            if mapstream:
+                linemap = sorted(deparsed.source_linemap.items())
+            result_cache.put(cache_key, OKAY_STATUS, source, linemap)
+            deparsed.f = real_out
+    if deparsed is not None:
+        # Let the next code object use our parser. If the caller parses
+        # more with this walker, it checks out another.
+        deparsed.checkin_parser()
+    real_out.write("\n")
+    return deparsed
 
 
 def compile_file(source_path: str) -> str:
@@ -213,14 +337,71 @@ def decompile_file(
     do_fragments=False,
     start_offset=0,
     stop_offset=-1,
+    cache_dir: Optional[str] = None,
+    profiler=NULL_PROFILER,
+    linemap_format: str = "comment",
+    result_cache: Optional[ResultCache] = None,
 ) -> Any:
     """
     decompile Python byte-code file (.pyc). Return objects to
     all of the deparsed objects found in `filename`.
+
+    If `cache_dir` is given, decompilation results are cached in
+    that directory. See uncompyle6.result_cache. A caller decompiling
+    many files should rather make one ResultCache and pass it as
+    `result_cache`, so that the cache's size is kept track of from one
+    file to the next.
+
+    `profiler` and `linemap_format` are as in decompile().
     """
 
     filename = check_object_path(filename)
     code_objects = {}
+    profiler.start_file(filename)
+    with profiler.phase("load"):
+        module = load_module(filename, code_objects)
+    if result_cache is None and cache_dir:
+        result_cache = ResultCache(cache_dir)
+    return decompile_module(
+        module,
+        code_objects,
+        outstream,
+        showasm,
+        showast,
+        showgrammar,
+        source_encoding,
+        mapstream,
+        do_fragments,
+        start_offset,
+        stop_offset,
+        result_cache,
+        profiler,
+        linemap_format,
+    )
+
+
+def decompile_module(
+    module: tuple,
+    code_objects: dict,
+    outstream: Optional[TextIO] = None,
+    showasm: Optional[str] = None,
+    showast={},
+    showgrammar=False,
+    source_encoding=None,
+    mapstream=None,
+    do_fragments=False,
+    start_offset=0,
+    stop_offset=-1,
+    result_cache: Optional[ResultCache] = None,
+    profiler=NULL_PROFILER,
+    linemap_format: str = "comment",
+) -> Any:
+    """
+    decompile a module that has been loaded by one of the
+    xdis.load functions. `module` is the tuple that these return, and
+    `code_objects` is the dictionary that was passed to them. Return
+    objects to all of the deparsed objects found in the module.
+    """
     (
         version,
         timestamp,
@@ -230,7 +411,7 @@ def decompile_file(
         source_size,
         _,
         _,
-    ) = load_module(filename, code_objects)
+    ) = module
 
     if isinstance(co, list):
         deparsed = []
@@ -251,6 +432,9 @@ def decompile_file(
                     mapstream=mapstream,
                     start_offset=start_offset,
                     stop_offset=stop_offset,
+                    result_cache=result_cache,
+                    profiler=profiler,
+                    linemap_format=linemap_format,
                 ),
             )
     else:
@@ -273,12 +457,35 @@ def decompile_file(
                 compile_mode="exec",
                 start_offset=start_offset,
                 stop_offset=stop_offset,
+                result_cache=result_cache,
+                profiler=profiler,
+                linemap_format=linemap_format,
             )
         ]
     return deparsed
 
 
+def with_verifier(func):
+    """Decorate main() so that a call that checks files without being
+    given a Verifier makes one for that call, and stops its worker
+    interpreters when the call is done, however it ends."""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        arguments = bound.arguments
+        if not arguments.get("do_verify") or arguments.get("verifier") is not None:
+            return func(*args, **kwargs)
+        with Verifier() as verifier:
+            arguments["verifier"] = verifier
+            return func(*bound.args, **bound.kwargs)
+
+    return wrapper
+
+
 # FIXME: combine into an options parameter
+@with_verifier
 def main(
     in_base: str,
     out_base: Optional[str],
@@ -294,23 +501,64 @@ def main(
     do_fragments=False,
     start_offset: int = 0,
     stop_offset: int = -1,
+    cache_dir: Optional[str] = None,
+    profiler=NULL_PROFILER,
+    linemap_format: str = "comment",
+    verifier: Optional[Verifier] = None,
+    result_cache: Optional[ResultCache] = None,
 ) -> Tuple[int, int, int, int]:
     """
     in_base	base directory for input files
     out_base	base directory for output files (ignored when
     files	list of filenames to be uncompyled (relative to in_base)
     outfile	write output to this filename (overwrites out_base)
+    cache_dir	directory for caching decompilation results, or None
+    profiler	uncompyle6.profiler.Profiler to record phase times in
+    linemap_format	"comment" or "json"; see decompile()
+    verifier	uncompyle6.verifier.Verifier to check files with when
+    		do_verify is given; if None, one is made for this call
+    result_cache	uncompyle6.result_cache.ResultCache to use rather
+    		than making one for cache_dir in this call
+
+    Files are checked in the background while the next ones are
+    decompiled. The results are reported as they come in, and main()
+    waits for all of them before returning.
 
     For redirecting output to
     - <filename>		outfile=<filename> (out_base is ignored)
     - files below out_base	out_base=...
     - stdout			out_base=None, outfile=None
     """
+    if result_cache is None and cache_dir:
+        result_cache = ResultCache(cache_dir)
     tot_files = okay_files = failed_files = 0
     verify_failed_files = 0 if do_verify else 0
     current_outfile = outfile
     linemap_stream = None
 
+    # Futures for the checks that haven't been reported yet.
+    checks = []
+
+    def report_checks(wait: bool):
+        """Report the checks that have finished, or all of them if
+        `wait` is True."""
+        nonlocal verify_failed_files
+        for future in list(checks):
+            if not (wait or future.done()):
+                continue
+            checks.remove(future)
+            result = future.result()
+            if result.output:
+                print(result.output)
+            if not result.valid:
+                verify_failed_files += 1
+                if result.errors:
+                    print(result.errors)
+                check_type = CHECK_DESCRIPTIONS[result.check]
+                sys.stderr.write(
+                    f"\n# {check_type} failed on file {result.filename}\n"
+                )
+
     for source_path in source_files:
         compiled_files.append(compile_file(source_path))
 
@@ -326,6 +574,8 @@ def main(
 
         if do_linemaps:
             linemap_stream = infile + ".pymap"
+            if linemap_format == "json":
+                linemap_stream += ".json"
             pass
 
         # print (infile, file=sys.stderr)
@@ -366,6 +616,10 @@ def main(
                 do_fragments,
                 start_offset,
                 stop_offset,
+                cache_dir,
+                profiler,
+                linemap_format,
+                result_cache,
             )
             if do_fragments:
                 for deparsed_object in deparsed_objects:
@@ -386,49 +640,23 @@ def main(
                     pass
 
             if do_verify:
-                for deparsed_object in deparsed_objects:
-                    deparsed_object.f.close()
-                    if PYTHON_VERSION_TRIPLE[:2] != deparsed_object.version[:2]:
-                        sys.stdout.write(
-                            f"\n# skipping running {deparsed_object.f.name}; it is "
-                            f"{version_tuple_to_str(deparsed_object.version, end=2)}, "
-                            "and we are "
-                            f"{version_tuple_to_str(PYTHON_VERSION_TRIPLE, end=2)}\n"
-                        )
-                    else:
-                        check_type = "syntax check"
-                        if do_verify == "run":
-                            check_type = "run"
-                            if PYTHON_VERSION_TRIPLE >= (3, 7):
-                                result = subprocess.run(
-                                    [sys.executable, deparsed_object.f.name],
-                                    capture_output=True,
-                                )
-                                valid = result.returncode == 0
-                                output = result.stdout.decode()
-                                if output:
-                                    print(output)
-                                pass
-                            else:
-                                result = subprocess.run(
-                                    [sys.executable, deparsed_object.f.name],
-                                )
-                                valid = result.returncode == 0
-                                pass
-                            if not valid:
-                                print(result.stderr.decode())
-
+                with profiler.phase("verify"):
+                    for deparsed_object in deparsed_objects:
+                        deparsed_object.f.close()
+                        if PYTHON_VERSION_TRIPLE[:2] != deparsed_object.version[:2]:
+                            sys.stdout.write(
+                                f"\n# skipping running {deparsed_object.f.name}; it is "
+                                f"{version_tuple_to_str(deparsed_object.version, end=2)}, "
+                                "and we are "
+                                f"{version_tuple_to_str(PYTHON_VERSION_TRIPLE, end=2)}\n"
+                            )
                         else:
-                            valid = syntax_check(deparsed_object.f.name)
-
-                        if not valid:
-                            verify_failed_files += 1
-                            sys.stderr.write(
-                                f"\n# {check_type} failed on file {deparsed_object.f.name}\n"
+                            checks.append(
+                                verifier.submit(
+                                    deparsed_object.f.name, do_verify, infile
+                                )
                             )
-
-                    # sys.stderr.write(f"Ran {deparsed_object.f.name}\n")
-                pass
+                    report_checks(wait=False)
             tot_files += 1
         except (
             ValueError,
@@ -506,6 +734,9 @@ def main(
                 sys.stdout.flush()
             except Exception:
                 pass
+    if checks:
+        with profiler.phase("verify"):
+            report_checks(wait=True)
     if current_outfile:
         sys.stdout.write("\n")
         try:
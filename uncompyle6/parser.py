@@ -19,11 +19,15 @@
 Common uncompyle6 parser routines.
 """
 
+import importlib
 import sys
+from collections import OrderedDict
 
 from spark_parser import DEFAULT_DEBUG as PARSER_DEFAULT_DEBUG, GenericASTBuilder
 from xdis import iscode
 
+from uncompyle6.parsers.grammar_cache import new_parser
+from uncompyle6.profiler import NULL_PROFILER, count_chart_items, grammar_rule_count
 from uncompyle6.show import maybe_show_asm
 
 
@@ -44,6 +48,33 @@ def nop_func(self, args):
     return None
 
 
+# Parser attributes that make up the grammar and that customization
+# changes. These are what snapshot_grammar() saves.
+GRAMMAR_ATTRIBUTES = (
+    "added_rules",
+    "check_reduce",
+    "customized",
+    "list_like_nt",
+    "new_rules",
+    "optional_nt",
+    "rule2func",
+    "rule2name",
+)
+
+# Parser attributes that make up the Earley state machine that spark builds
+# from the grammar.
+STATE_MACHINE_ATTRIBUTES = ("nullable", "newrules", "new2old", "edges", "cores", "states")
+
+# The maximum number of state machines we save per parser. Each takes a
+# megabyte or so, and most code objects that a parser sees use one of
+# the first few grammars it built, so saving more does not save time.
+MAX_SAVED_STATE_MACHINES = 4
+
+# The maximum number of nested code objects for which we save the
+# grammar of the enclosing code object.
+MAX_SAVED_NESTED_GRAMMARS = 100
+
+
 class PythonParser(GenericASTBuilder):
     def __init__(self, syntax_tree_class, start, debug):
         super(PythonParser, self).__init__(syntax_tree_class, start, debug)
@@ -113,6 +144,21 @@ class PythonParser(GenericASTBuilder):
         self.insts = []
         self.version = tuple()
 
+        # Earley state machines for grammars we have parsed with,
+        # keyed by grammar. See parse().
+        self.state_machines = OrderedDict()
+
+        # Grammar snapshots to use for nested code objects, keyed by the
+        # id() of the nested code object's co_code. See parse() below.
+        self.nested_grammars = OrderedDict()
+
+        # Trees built for reduction checks while parsing one token
+        # stream. See reduce_ast().
+        self.reduce_asts = {}
+        self.reduce_trees = {}
+        self.shared_nodes = set()
+        self.reduce_end = None
+
     def ast_first_offset(self, ast):
         if hasattr(ast, "offset"):
             return ast.offset
@@ -155,6 +201,188 @@ class PythonParser(GenericASTBuilder):
         self.add_unique_rules(rules, customize)
         return
 
+    def snapshot_grammar(self) -> dict:
+        """Return a copy of the grammar as it currently stands. The
+        grammar can be rolled back to this point using restore_grammar().
+        """
+        snapshot = {
+            name: self.__dict__[name].copy()
+            for name in GRAMMAR_ATTRIBUTES
+            if name in self.__dict__
+        }
+        snapshot["rules"] = {lhs: list(rules) for lhs, rules in self.rules.items()}
+        return snapshot
+
+    def restore_grammar(self, snapshot: dict):
+        """Roll back the grammar to what it was when `snapshot` was
+        taken via snapshot_grammar(). This undoes rule customization.
+        """
+        for name in GRAMMAR_ATTRIBUTES:
+            if name in snapshot:
+                setattr(self, name, snapshot[name].copy())
+            elif name in self.__dict__:
+                delattr(self, name)
+        self.rules = {lhs: list(rules) for lhs, rules in snapshot["rules"].items()}
+        self.ruleschanged = True
+
+    def reset_grammar(self):
+        """Roll back the grammar to the base grammar for this parser
+        and forget the grammars saved for nested code objects.
+        """
+        self.restore_grammar(self.base_grammar)
+        self.nested_grammars.clear()
+
+    def restore_enclosing_grammar(self, code) -> bool:
+        """If we have parsed the code object that encloses `code`, roll back
+        the grammar to what it was after customizing for that code object
+        and return True. Otherwise leave the grammar alone and return False.
+        """
+        co_code = getattr(code, "co_code", None)
+        saved = self.nested_grammars.get(id(co_code))
+        if saved is None or saved[0] is not co_code:
+            return False
+        self.nested_grammars.move_to_end(id(co_code))
+        self.restore_grammar(saved[1])
+        return True
+
+    def save_enclosing_grammar(self, code):
+        """Save the current grammar to be used later in parsing the code
+        objects nested inside `code`.
+        """
+        nested_co_codes = [
+            c.co_code for c in getattr(code, "co_consts", ()) if iscode(c)
+        ]
+        if not nested_co_codes:
+            return
+        snapshot = self.snapshot_grammar()
+        for co_code in nested_co_codes:
+            # We save co_code to keep its id() from getting reused.
+            self.nested_grammars[id(co_code)] = (co_code, snapshot)
+            self.nested_grammars.move_to_end(id(co_code))
+        while len(self.nested_grammars) > MAX_SAVED_NESTED_GRAMMARS:
+            self.nested_grammars.popitem(last=False)
+
+    def grammar_key(self) -> tuple:
+        """Return a hashable value that identifies the current grammar.
+        The order that rules were added is included, since that can
+        affect how ambiguities are resolved.
+        """
+        return tuple((lhs, tuple(rules)) for lhs, rules in self.rules.items())
+
+    def parse(self, tokens, debug=None):
+        """Parse `tokens`. When the grammar has changed since the last
+        parse, we look for a state machine saved from an earlier parse
+        that used the same grammar, since building the Earley states is
+        a large part of the parsing time.
+        """
+        key = None
+        if self.ruleschanged:
+            key = self.grammar_key()
+            state_machine = self.state_machines.get(key)
+            if state_machine is not None:
+                self.state_machines.move_to_end(key)
+                for name, value in zip(STATE_MACHINE_ATTRIBUTES, state_machine):
+                    setattr(self, name, value)
+                self.ruleschanged = False
+                key = None
+        self.reduce_asts.clear()
+        self.reduce_trees.clear()
+        self.shared_nodes.clear()
+        try:
+            return super(PythonParser, self).parse(tokens, debug)
+        finally:
+            self.reduce_asts.clear()
+            self.reduce_trees.clear()
+            self.shared_nodes.clear()
+            # The states are filled in lazily as we parse. Because
+            # they depend only on the grammar, it is okay to save them
+            # in any stage of completion.
+            if key is not None and not self.ruleschanged:
+                self.state_machines[key] = tuple(
+                    getattr(self, name) for name in STATE_MACHINE_ATTRIBUTES
+                )
+                if len(self.state_machines) > MAX_SAVED_STATE_MACHINES:
+                    self.state_machines.popitem(last=False)
+
+    def reduce_ast(self, rule, tokens, item, k, sets):
+        """Return the children of a reduction by `rule` from token
+        `item[1]` up to `k`, for reduce_is_invalid() to check.
+
+        The same reduction is often checked again from another parse
+        state, and checks of an enclosing statement rebuild the trees of
+        the statements inside it, such as the else part of an if/elif
+        chain. So while parsing a token stream, we keep the children we
+        build for each (rule, first, last) and, in buildTree(), each
+        subtree that ends before token `k`. The parse of a subtree
+        that ends before `k` can't change anymore.
+        """
+        key = (rule, item[1], k)
+        ast = self.reduce_asts.get(key)
+        if ast is None:
+            self.reduce_end = k
+            try:
+                ast = super(PythonParser, self).reduce_ast(rule, tokens, item, k, sets)
+            finally:
+                self.reduce_end = None
+            self.reduce_asts[key] = ast
+        return ast
+
+    def buildTree(self, nt, item, tokens, k):
+        """Like GenericParser.buildTree() but, when building trees for
+        reduce_ast(), look up and save subtrees in self.reduce_trees.
+        Nodes saved there are shared, so nonterminal() copies rather than
+        changes them.
+        """
+        end = self.reduce_end
+        if end is None:
+            return super(PythonParser, self).buildTree(nt, item, tokens, k)
+        trees = self.reduce_trees
+        node = trees.get((nt, item, k)) if k < end else None
+        if node is not None:
+            return node
+
+        # Stack elements: (nonterminal, item, token index, children built so
+        # far in reverse order, rule, key in trees).
+        stack = [(nt, item, k, [], None, (nt, item, k))]
+        while stack:
+            nt, item, k, attr, rule, tree_key = stack.pop()
+            if rule is None:
+                choices = [r for r in self.states[item[0]].complete if r[0] == nt]
+                rule = choices[0] if len(choices) == 1 else self.ambiguity(choices)
+            rhs = rule[1]
+            for i in range(len(rhs) - 1 - len(attr), -1, -1):
+                sym = rhs[i]
+                if sym not in self.newrules:
+                    if sym != self._BOF:
+                        attr.append(tokens[k - 1])
+                        item, k = self.predecessor((item, k), None)
+                    else:
+                        attr.append(None)
+                    continue
+                if sym.startswith(self._NULLABLE):
+                    attr.append(self.deriveEpsilon(sym))
+                    continue
+                key = (item, k)
+                why = self.causal(key)
+                if why:
+                    item, k = self.predecessor(key, why)
+                    child_key = (sym, why[0], why[1])
+                    node = trees.get(child_key) if why[1] < end else None
+                    if node is not None:
+                        attr.append(node)
+                        continue
+                    stack.append((nt, item, k, attr, rule, tree_key))
+                    stack.append((sym, why[0], why[1], [], None, child_key))
+                    break
+            else:
+                node = self.rule2func[self.new2old[rule]](attr[::-1])
+                if tree_key[2] < end:
+                    trees[tree_key] = node
+                    self.shared_nodes.add(id(node))
+                if stack:
+                    stack[-1][3].append(node)
+        return node
+
     def cleanup(self):
         """
         Remove recursive references to allow garbage
@@ -263,6 +491,9 @@ class PythonParser(GenericASTBuilder):
             if len(rv) == 0 and nt not in self.keep_epsilon:
                 rv = args[1]
             else:
+                if id(rv) in self.shared_nodes:
+                    # rv is also in a tree saved by buildTree().
+                    rv = self.AST(rv.kind, rv)
                 rv.append(args[1])
         elif n == 1 and args[0] in self.singleton:
             rv = GenericASTBuilder.nonterminal(self, nt, args[0])
@@ -650,218 +881,160 @@ class PythonParser(GenericASTBuilder):
         """
 
 
-def parse(p, tokens, customize, code):
-    p.customize_grammar_rules(tokens, customize)
-    ast = p.parse(tokens)
+def parse(p, tokens, customize, code, profiler=NULL_PROFILER):
+    # A nested code object, like a comprehension, can depend on grammar
+    # rules added for the code object that encloses it. It does not depend
+    # on rules added for its earlier siblings though. So we roll the
+    # grammar back to the one used for the enclosing code object. This
+    # keeps the grammar from growing over a module, which slows parsing.
+    p.restore_enclosing_grammar(code)
+    with profiler.phase("customize_grammar_rules", code) as record:
+        p.customize_grammar_rules(tokens, customize)
+        if profiler.enabled:
+            record["rules"] = grammar_rule_count(p)
+    p.save_enclosing_grammar(code)
+    with profiler.phase("parse", code) as record:
+        record["tokens"] = len(tokens)
+        if profiler.enabled:
+            with count_chart_items(p, record):
+                ast = p.parse(tokens)
+        else:
+            ast = p.parse(tokens)
     #  p.cleanup()
     return ast
 
 
-def get_python_parser(
-    version, debug_parser=PARSER_DEFAULT_DEBUG, compile_mode="exec", is_pypy=False
-):
-    """Returns parser object for Python version 2 or 3, 3.2, 3.5on,
-    etc., depending on the parameters passed.  *compile_mode* is either
-    'exec', 'eval', or 'single'. See
-    https://docs.python.org/3.6/library/functions.html#compile for an
-    explanation of the different modes.
-    """
-
-    # If version is a string, turn that into the corresponding float.
+# Bytecode versions that have a parser module of their own,
+# uncompyle6/parsers/parse<major><minor>.py, with classes
+# Python<major><minor>Parser and Python<major><minor>ParserSingle. Other
+# Python 2 versions use parse2, and other Python 3 versions parse3.
+PARSER_MODULE_VERSIONS = frozenset(
+    [
+        (1, 0),
+        (1, 1),
+        (1, 2),
+        (1, 3),
+        (1, 4),
+        (1, 5),
+        (1, 6),
+        (2, 1),
+        (2, 2),
+        (2, 3),
+        (2, 4),
+        (2, 5),
+        (2, 6),
+        (2, 7),
+        (3, 0),
+        (3, 1),
+        (3, 2),
+        (3, 3),
+        (3, 4),
+        (3, 5),
+        (3, 6),
+        (3, 7),
+        (3, 8),
+    ]
+)
+
+# Parser classes that get_parser_class() has imported, keyed by
+# (version, compile_mode != "exec").
+parser_classes = {}
+
+# Parsers that are not in use, keyed by (version, compile_mode, is_pypy).
+# See checkout_parser() and checkin_parser().
+parser_pool = {}
+
+# The maximum number of unused parsers we keep per pool key.
+MAX_POOLED_PARSERS = 4
+
+
+def parser_version(version) -> tuple:
+    """Return `version`, which may be a string like "3.8", as
+    the (major, minor) tuple that we use to select a parser."""
     if isinstance(version, str):
         version = tuple([int(v) for v in version.split(".")[:2]])
+    return version[:2]
 
-    version = version[:2]
-
-    p = None
-
-    # FIXME: there has to be a better way...
-    # We could do this as a table lookup, but that would force us
-    # in import all of the parsers all of the time. Perhaps there is
-    # a lazy way of doing the import?
-
-    if version < (3, 0):
-        if version < (2, 2):
-            if version == (1, 0):
-                import uncompyle6.parsers.parse10 as parse10
-
-                if compile_mode == "exec":
-                    p = parse10.Python10Parser(debug_parser)
-                else:
-                    p = parse10.Python10ParserSingle(debug_parser)
-            elif version == (1, 1):
-                import uncompyle6.parsers.parse11 as parse11
-
-                if compile_mode == "exec":
-                    p = parse11.Python11Parser(debug_parser)
-                else:
-                    p = parse11.Python11ParserSingle(debug_parser)
-            if version == (1, 2):
-                import uncompyle6.parsers.parse12 as parse12
-
-                if compile_mode == "exec":
-                    p = parse12.Python12Parser(debug_parser)
-                else:
-                    p = parse12.Python12ParserSingle(debug_parser)
-            if version == (1, 3):
-                import uncompyle6.parsers.parse13 as parse13
-
-                if compile_mode == "exec":
-                    p = parse13.Python13Parser(debug_parser)
-                else:
-                    p = parse13.Python13ParserSingle(debug_parser)
-            elif version == (1, 4):
-                import uncompyle6.parsers.parse14 as parse14
-
-                if compile_mode == "exec":
-                    p = parse14.Python14Parser(debug_parser)
-                else:
-                    p = parse14.Python14ParserSingle(debug_parser)
-            elif version == (1, 5):
-                import uncompyle6.parsers.parse15 as parse15
-
-                if compile_mode == "exec":
-                    p = parse15.Python15Parser(debug_parser)
-                else:
-                    p = parse15.Python15ParserSingle(debug_parser)
-            elif version == (1, 6):
-                import uncompyle6.parsers.parse16 as parse16
-
-                if compile_mode == "exec":
-                    p = parse16.Python16Parser(debug_parser)
-                else:
-                    p = parse16.Python16ParserSingle(debug_parser)
-            elif version == (2, 1):
-                import uncompyle6.parsers.parse21 as parse21
-
-                if compile_mode == "exec":
-                    p = parse21.Python21Parser(debug_parser)
-                else:
-                    p = parse21.Python21ParserSingle(debug_parser)
-        elif version == (2, 2):
-            import uncompyle6.parsers.parse22 as parse22
-
-            if compile_mode == "exec":
-                p = parse22.Python22Parser(debug_parser)
-            else:
-                p = parse22.Python22ParserSingle(debug_parser)
-        elif version == (2, 3):
-            import uncompyle6.parsers.parse23 as parse23
 
-            if compile_mode == "exec":
-                p = parse23.Python23Parser(debug_parser)
-            else:
-                p = parse23.Python23ParserSingle(debug_parser)
-        elif version == (2, 4):
-            import uncompyle6.parsers.parse24 as parse24
-
-            if compile_mode == "exec":
-                p = parse24.Python24Parser(debug_parser)
-            else:
-                p = parse24.Python24ParserSingle(debug_parser)
-        elif version == (2, 5):
-            import uncompyle6.parsers.parse25 as parse25
-
-            if compile_mode == "exec":
-                p = parse25.Python25Parser(debug_parser)
-            else:
-                p = parse25.Python25ParserSingle(debug_parser)
-        elif version == (2, 6):
-            import uncompyle6.parsers.parse26 as parse26
-
-            if compile_mode == "exec":
-                p = parse26.Python26Parser(debug_parser)
-            else:
-                p = parse26.Python26ParserSingle(debug_parser)
-        elif version == (2, 7):
-            import uncompyle6.parsers.parse27 as parse27
-
-            if compile_mode == "exec":
-                p = parse27.Python27Parser(debug_parser)
-            else:
-                p = parse27.Python27ParserSingle(debug_parser)
-        else:
-            import uncompyle6.parsers.parse2 as parse2
-
-            if compile_mode == "exec":
-                p = parse2.Python2Parser(debug_parser)
-            else:
-                p = parse2.Python2ParserSingle(debug_parser)
-                pass
-            pass
-        pass
+def checkout_parser(
+    version, debug_parser=PARSER_DEFAULT_DEBUG, compile_mode="exec", is_pypy=False
+):
+    """Like get_python_parser(), but reuse a parser that has been
+    returned to the parser pool via checkin_parser() if there is one.
+    A reused parser keeps the Earley state machines that it has built
+    so far, which saves time parsing later code objects.
+    """
+    key = (parser_version(version), compile_mode, is_pypy)
+    parsers = parser_pool.get(key)
+    if parsers:
+        p = parsers.pop()
+        p.debug = debug_parser
+        p.reset_grammar()
     else:
-        import uncompyle6.parsers.parse3 as parse3
-
-        if version == (3, 0):
-            import uncompyle6.parsers.parse30 as parse30
-
-            if compile_mode == "exec":
-                p = parse30.Python30Parser(debug_parser)
-            else:
-                p = parse30.Python30ParserSingle(debug_parser)
-        elif version == (3, 1):
-            import uncompyle6.parsers.parse31 as parse31
-
-            if compile_mode == "exec":
-                p = parse31.Python31Parser(debug_parser)
-            else:
-                p = parse31.Python31ParserSingle(debug_parser)
-        elif version == (3, 2):
-            import uncompyle6.parsers.parse32 as parse32
-
-            if compile_mode == "exec":
-                p = parse32.Python32Parser(debug_parser)
-            else:
-                p = parse32.Python32ParserSingle(debug_parser)
-        elif version == (3, 3):
-            import uncompyle6.parsers.parse33 as parse33
+        p = get_python_parser(version, debug_parser, compile_mode, is_pypy)
+    p.pool_key = key
+    return p
 
-            if compile_mode == "exec":
-                p = parse33.Python33Parser(debug_parser)
-            else:
-                p = parse33.Python33ParserSingle(debug_parser)
-        elif version == (3, 4):
-            import uncompyle6.parsers.parse34 as parse34
 
-            if compile_mode == "exec":
-                p = parse34.Python34Parser(debug_parser)
-            else:
-                p = parse34.Python34ParserSingle(debug_parser)
-        elif version == (3, 5):
-            import uncompyle6.parsers.parse35 as parse35
+def checkin_parser(p):
+    """Return a parser obtained from checkout_parser() to the parser
+    pool. The caller should not use `p` afterwards.
+    """
+    # Drop references to the last parse to save memory.
+    p.insts = []
+    p.tokens = p.links = None
+    parsers = parser_pool.setdefault(p.pool_key, [])
+    if len(parsers) < MAX_POOLED_PARSERS:
+        parsers.append(p)
+
+
+def clear_parser_pool():
+    """Drop the parsers in the parser pool, along with the state
+    machines they have saved, to free the memory they use."""
+    parser_pool.clear()
+
+
+def get_parser_class(version: tuple, compile_mode: str = "exec"):
+    """Return the parser class for bytecode `version`, a (major, minor)
+    tuple, and `compile_mode`. A parser module is imported the first
+    time that a version that uses it is asked for, so we load only the
+    parsers that we need. PyPy bytecode uses the same parsers as
+    CPython.
+    """
+    single = compile_mode != "exec"
+    parser_class = parser_classes.get((version, single))
+    if parser_class is None:
+        if version in PARSER_MODULE_VERSIONS:
+            v_str = "%d%d" % version
+        elif version < (3, 0):
+            v_str = "2"
+        else:
+            v_str = "3"
+        module = importlib.import_module("uncompyle6.parsers.parse" + v_str)
+        class_name = "Python%sParser%s" % (v_str, "Single" if single else "")
+        parser_class = getattr(module, class_name)
+        parser_classes[version, single] = parser_class
+    return parser_class
 
-            if compile_mode == "exec":
-                p = parse35.Python35Parser(debug_parser)
-            else:
-                p = parse35.Python35ParserSingle(debug_parser)
-        elif version == (3, 6):
-            import uncompyle6.parsers.parse36 as parse36
 
-            if compile_mode == "exec":
-                p = parse36.Python36Parser(debug_parser)
-            else:
-                p = parse36.Python36ParserSingle(debug_parser)
-        elif version == (3, 7):
-            import uncompyle6.parsers.parse37 as parse37
+def get_python_parser(
+    version, debug_parser=PARSER_DEFAULT_DEBUG, compile_mode="exec", is_pypy=False
+):
+    """Returns parser object for Python version 2 or 3, 3.2, 3.5on,
+    etc., depending on the parameters passed.  *compile_mode* is either
+    'exec', 'eval', or 'single'. See
+    https://docs.python.org/3.6/library/functions.html#compile for an
+    explanation of the different modes.
+    """
 
-            if compile_mode == "exec":
-                p = parse37.Python37Parser(debug_parser)
-            else:
-                p = parse37.Python37ParserSingle(debug_parser)
-        elif version == (3, 8):
-            import uncompyle6.parsers.parse38 as parse38
+    version = parser_version(version)
+    parser_class = get_parser_class(version, compile_mode)
 
-            if compile_mode == "exec":
-                p = parse38.Python38Parser(debug_parser)
-            else:
-                p = parse38.Python38ParserSingle(debug_parser)
-        else:
-            if compile_mode == "exec":
-                p = parse3.Python3Parser(debug_parser)
-            else:
-                p = parse3.Python3ParserSingle(debug_parser)
+    # The base grammar for a parser class never changes, so we get
+    # that from a cache rather than building it up again.
+    p = new_parser(parser_class, debug_parser)
     p.version = version
+    p.base_grammar = p.snapshot_grammar()
     # p.dump_grammar() # debug
     return p
 
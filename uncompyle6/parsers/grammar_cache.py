@@ -0,0 +1,232 @@
+#  Copyright (c) 2026 by Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Cache of the base (uncustomized) grammar of each parser class.
+
+Creating a parser collects the rules from every ``p_*`` docstring in
+the class hierarchy and runs them through spark's rule preprocessing.
+That work is the same every time for a given parser class, so we do it
+once, pickle the resulting grammar tables, and afterwards create new
+parsers by unpickling those tables.
+
+The pickled grammar is kept in memory for the life of the process and
+also on disk so that it survives across processes. The on-disk file
+name includes a digest of the uncompyle6 and spark-parser versions and
+of the stat information of the source files that define the parser
+class, so changing a grammar file causes its cache entry to be
+rebuilt.
+
+The on-disk cache directory is taken from the environment variable
+``UNCOMPYLE6_GRAMMAR_CACHE``. If that is not set, ``uncompyle6/grammars``
+under ``$XDG_CACHE_HOME`` (or ``~/.cache``) is used. Setting the
+variable to the empty string disables the on-disk cache.
+"""
+
+import hashlib
+import inspect
+import os
+import os.path as osp
+import pickle
+import sys
+import tempfile
+
+from spark_parser import __version__ as SPARK_PARSER_VERSION
+
+from uncompyle6.version import __version__ as UNCOMPYLE6_VERSION
+
+# Parser instance attributes that are not part of the grammar proper,
+# and that we set on each new parser.
+UNCACHED_ATTRIBUTES = frozenset(("debug", "rule2func"))
+
+# Map from a parser class to its pickled grammar.
+_grammar_pickles = {}
+
+
+def grammar_cache_dir():
+    """Return the directory used for the on-disk grammar cache, or
+    None if the on-disk cache has been disabled.
+    """
+    cache_dir = os.environ.get("UNCOMPYLE6_GRAMMAR_CACHE")
+    if cache_dir is None:
+        cache_home = os.environ.get("XDG_CACHE_HOME") or osp.join(
+            osp.expanduser("~"), ".cache"
+        )
+        cache_dir = osp.join(cache_home, "uncompyle6", "grammars")
+    return cache_dir or None
+
+
+def grammar_digest(parser_class) -> str:
+    """Return a digest identifying the grammar of `parser_class`. It
+    changes whenever the uncompyle6 or spark-parser versions change, or
+    when a source file defining a class in the method resolution order of
+    `parser_class` is modified.
+    """
+    h = hashlib.sha1()
+    h.update(
+        (
+            f"{UNCOMPYLE6_VERSION} {SPARK_PARSER_VERSION} "
+            f"{sys.version_info[:2]} {pickle.HIGHEST_PROTOCOL}"
+        ).encode("utf-8")
+    )
+    for klass in parser_class.__mro__:
+        h.update(f"{klass.__module__}.{klass.__qualname__}".encode("utf-8"))
+        try:
+            source_path = inspect.getsourcefile(klass)
+        except TypeError:
+            # builtin classes like "object"
+            continue
+        if source_path is None:
+            continue
+        try:
+            st = os.stat(source_path)
+        except OSError:
+            continue
+        h.update(f"{source_path} {st.st_mtime_ns} {st.st_size}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def grammar_cache_prefix(parser_class) -> str:
+    return f"{parser_class.__module__}.{parser_class.__qualname__}-"
+
+
+def grammar_cache_path(parser_class, cache_dir: str) -> str:
+    return osp.join(
+        cache_dir,
+        "%s%s.pickle" % (grammar_cache_prefix(parser_class), grammar_digest(parser_class)),
+    )
+
+
+def grammar_state(parser) -> dict:
+    """Return the attributes of `parser` that make up its grammar."""
+    return {
+        k: v for k, v in parser.__dict__.items() if k not in UNCACHED_ATTRIBUTES
+    }
+
+
+def rebind_rules(parser):
+    """Recreate the rule-to-function map of `parser` from its rules.
+
+    These functions are closures over the parser object, so they can't
+    be pickled. However, every rule except the augmented start rule
+    reduces through GenericASTBuilder.preprocess(), so we can recreate
+    them by running that again.
+    """
+    rule2func = {}
+    start = parser._START
+    for lhs, rules in parser.rules.items():
+        for rule in rules:
+            if lhs == start:
+                rule2func[rule] = lambda args: args[1]
+            else:
+                rule2func[rule] = parser.preprocess(rule, None)[1]
+    parser.rule2func = rule2func
+
+
+def write_grammar_pickle(parser_class, grammar_pickle: bytes, cache_dir: str):
+    """Save `grammar_pickle` to the on-disk cache, removing stale cache
+    entries for `parser_class`. Failures are silently ignored: the cache
+    is an optimization only.
+
+    Other processes may be writing the same entry, so only finished
+    entries are removed, never another writer's temporary file.
+    """
+    path = grammar_cache_path(parser_class, cache_dir)
+    prefix = grammar_cache_prefix(parser_class)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            if (
+                name.startswith(prefix)
+                and name.endswith(".pickle")
+                and osp.join(cache_dir, name) != path
+            ):
+                os.remove(osp.join(cache_dir, name))
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=prefix, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(grammar_pickle)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Don't leave our temporary file behind, say if the disk
+            # is full.
+            os.remove(tmp_path)
+            raise
+    except OSError:
+        pass
+
+
+def read_grammar_pickle(parser_class, cache_dir: str):
+    """Return the pickled grammar for `parser_class` from the on-disk
+    cache, or None if it isn't there.
+    """
+    try:
+        with open(grammar_cache_path(parser_class, cache_dir), "rb") as fp:
+            return fp.read()
+    except OSError:
+        return None
+
+
+def grammar_pickle_for(parser_class, debug_parser):
+    """Return the pickled base grammar for `parser_class`, computing it
+    and saving it to the caches if necessary. None is returned if the
+    grammar can't be pickled.
+    """
+    grammar_pickle = _grammar_pickles.get(parser_class)
+    if grammar_pickle is not None:
+        return grammar_pickle
+
+    cache_dir = grammar_cache_dir()
+    if cache_dir:
+        grammar_pickle = read_grammar_pickle(parser_class, cache_dir)
+        if grammar_pickle is not None:
+            try:
+                pickle.loads(grammar_pickle)
+            except Exception:
+                # A corrupt or incompatible cache entry; rebuild it.
+                grammar_pickle = None
+
+    if grammar_pickle is None:
+        parser = parser_class(debug_parser)
+        try:
+            grammar_pickle = pickle.dumps(
+                grammar_state(parser), pickle.HIGHEST_PROTOCOL
+            )
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return None
+        if cache_dir:
+            write_grammar_pickle(parser_class, grammar_pickle, cache_dir)
+
+    _grammar_pickles[parser_class] = grammar_pickle
+    return grammar_pickle
+
+
+def new_parser(parser_class, debug_parser):
+    """Return a new parser object of class `parser_class` using
+    the cached base grammar when possible.
+    """
+    if "SPARK_PARSER_COVERAGE" in os.environ:
+        # Grammar coverage is recorded as rules are added, so we
+        # have to build the grammar from scratch.
+        return parser_class(debug_parser)
+
+    grammar_pickle = grammar_pickle_for(parser_class, debug_parser)
+    if grammar_pickle is None:
+        return parser_class(debug_parser)
+
+    parser = parser_class.__new__(parser_class)
+    parser.__dict__.update(pickle.loads(grammar_pickle))
+    parser.debug = debug_parser
+    rebind_rules(parser)
+    return parser
@@ -19,53 +19,64 @@ class SyntaxTree(spark_AST):
         return self.__repr1__("", None)
 
     def __repr1__(self, indent, sibNum=None):
-        rv = str(self.kind)
-        if sibNum is not None:
-            rv = "%2d. %s" % (sibNum, rv)
-        enumerate_children = False
-        if len(self) > 1:
-            rv += " (%d)" % (len(self))
-            enumerate_children = True
-        if self.transformed_by is not None:
-            if self.transformed_by is True:
-                rv += " (transformed)"
-            else:
-                rv += " (transformed by %s)" % self.transformed_by
-        rv = indent + rv
-        indent += "    "
-        i = 0
-        for node in self:
-            if hasattr(node, "__repr1__"):
-                if enumerate_children:
-                    child = node.__repr1__(indent, i)
+        # Subtrees are shown using a stack rather than by recursion, so
+        # that trees of any depth can be shown. An entry on the stack is
+        # either a line of text or a node to show.
+        lines = []
+        stack = [(self, indent, sibNum)]
+        while stack:
+            entry = stack.pop()
+            if isinstance(entry, str):
+                lines.append(entry)
+                continue
+            node, indent, sibNum = entry
+            if not isinstance(node, SyntaxTree):
+                lines.append(node.__repr1__(indent, sibNum))
+                continue
+            rv = str(node.kind)
+            if sibNum is not None:
+                rv = "%2d. %s" % (sibNum, rv)
+            enumerate_children = False
+            if len(node) > 1:
+                rv += " (%d)" % (len(node))
+                enumerate_children = True
+            if node.transformed_by is not None:
+                if node.transformed_by is True:
+                    rv += " (transformed)"
                 else:
-                    child = node.__repr1__(indent, None)
-            else:
-                inst = node.format(line_prefix="")
+                    rv += " (transformed by %s)" % node.transformed_by
+            lines.append(indent + rv)
+            indent += "    "
+            kids = []
+            for i, kid in enumerate(node):
+                if hasattr(kid, "__repr1__"):
+                    kids.append((kid, indent, i if enumerate_children else None))
+                    continue
+                inst = kid.format(line_prefix="")
                 if inst.startswith("\n"):
                     # Nuke leading \n
                     inst = inst[1:]
                 if enumerate_children:
-                    child = indent + "%2d. %s" % (i, inst)
+                    kids.append(indent + "%2d. %s" % (i, inst))
                 else:
-                    child = indent + inst
-                pass
-            rv += "\n" + child
-            i += 1
-        return rv
+                    kids.append(indent + inst)
+            stack.extend(reversed(kids))
+        return "\n".join(lines)
 
     def first_child(self):
-        if len(self) > 0:
-            child = self[0]
+        node = self
+        while len(node) > 0:
+            child = node[0]
             if not isinstance(child, SyntaxTree):
                 return child
-            return child.first_child()
-        return self
+            node = child
+        return node
 
     def last_child(self):
-        if len(self) > 0:
-            child = self[-1]
+        node = self
+        while len(node) > 0:
+            child = node[-1]
             if not isinstance(child, SyntaxTree):
                 return child
-            return child.last_child()
-        return self
+            node = child
+        return node
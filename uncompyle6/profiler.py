@@ -0,0 +1,216 @@
+#  Copyright (c) 2026 by Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Per-phase timing and memory profile of decompilation.
+
+A Profiler is handed to uncompyle6.main.decompile() and friends, and is
+passed down from there to the scanner, the parser and the source walker.
+These time each phase of decompilation for each code object:
+
+  load                     reading and unmarshaling a bytecode file
+  ingest                   scanning a code object into tokens
+  customize_grammar_rules  adding grammar rules for the tokens
+  parse                    the Earley parse of the tokens
+  transform                TreeTransform.transform()
+  gen_source               writing source text from the tree
+  verify                   checking the decompiled source
+
+Phases for nested code objects, such as functions and comprehensions,
+happen inside the "gen_source" phase of the code object enclosing them.
+
+Each phase gives a record: a dictionary with the file name, the code
+object's name and first line number, the phase name, the start time
+and wall time in seconds, the wall time not spent in nested phases,
+and, where they apply, the number of tokens, the number of grammar
+rules and the number of items in the Earley parse chart. If memory
+tracing is turned on, the net change in memory allocated by Python
+over the phase, as seen by tracemalloc, is recorded too.
+
+The records can be written as JSON Lines, one record per line, or as a
+Chrome trace which can be viewed in chrome://tracing or Perfetto.
+
+Profiling is off unless a Profiler is given. The default, NULL_PROFILER,
+records nothing.
+"""
+
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Optional, TextIO
+
+
+def code_fields(code) -> dict:
+    """Return the record fields that identify the code object `code`.
+    `code` can also be an uncompyle6.scanner.Code object."""
+    if code is None:
+        return {"code": None, "line": None}
+    return {"code": code.co_name, "line": code.co_firstlineno}
+
+
+class _NullPhase:
+    """The context manager returned by NullProfiler.phase()."""
+
+    def __enter__(self) -> dict:
+        return {}
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullProfiler:
+    """A profiler that records nothing. Callers that need to do extra work
+    to fill in a record should test `enabled` first."""
+
+    enabled = False
+
+    def start_file(self, path: Optional[str]):
+        pass
+
+    def phase(self, name: str, code=None):
+        return _NullPhase()
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler:
+    """Collects a record for each phase of decompilation. See the module
+    docstring for what a record holds.
+
+    If `trace_memory` is True, memory allocation is traced with
+    tracemalloc. This slows decompilation down a lot, so the times
+    taken are then less meaningful."""
+
+    enabled = True
+
+    def __init__(self, trace_memory: bool = False):
+        self.records = []
+        self.file = None
+        self.start_time = time.perf_counter()
+        self.started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        self.trace_memory = trace_memory
+        # For each phase in progress, the time spent in phases nested
+        # inside it.
+        self.nested_times = []
+
+    def close(self):
+        """Stop memory tracing if we started it."""
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def start_file(self, path: Optional[str]):
+        """Note that the phases that follow are for bytecode file `path`."""
+        self.file = path
+
+    @contextmanager
+    def phase(self, name: str, code=None):
+        """Time the phase `name` of decompiling `code`, which is None for
+        phases that apply to a whole file. The record for the phase is
+        given to the body of the `with` statement, so that it can add
+        counts to it. The record is kept even when the body raises an
+        exception."""
+        record = {"file": self.file, **code_fields(code), "phase": name}
+        if self.trace_memory:
+            start_memory = tracemalloc.get_traced_memory()[0]
+        self.nested_times.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            nested_time = self.nested_times.pop()
+            if self.nested_times:
+                self.nested_times[-1] += elapsed
+            record["start"] = start - self.start_time
+            record["time"] = elapsed
+            record["self_time"] = elapsed - nested_time
+            if self.trace_memory:
+                record["allocated"] = (
+                    tracemalloc.get_traced_memory()[0] - start_memory
+                )
+            self.records.append(record)
+
+    def write_jsonl(self, out: TextIO):
+        """Write the records to `out` as JSON Lines."""
+        for record in self.records:
+            out.write(json.dumps(record) + "\n")
+
+    def write_chrome_trace(self, out: TextIO):
+        """Write the records to `out` in the Chrome trace event format.
+        Each phase is a "complete" event, so nested phases show up
+        nested."""
+        pid = os.getpid()
+        events = []
+        for record in self.records:
+            if record["code"] is None:
+                name = record["phase"]
+            else:
+                name = f"{record['phase']} {record['code']}:{record['line']}"
+            events.append(
+                {
+                    "name": name,
+                    "cat": record["phase"],
+                    "ph": "X",
+                    "ts": record["start"] * 1e6,
+                    "dur": record["time"] * 1e6,
+                    "pid": pid,
+                    "tid": 0,
+                    "args": record,
+                }
+            )
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, out)
+
+    def save(self, path: str):
+        """Write the records to the file `path`: as a Chrome trace if
+        `path` ends in ".json", and as JSON Lines otherwise."""
+        with open(path, "w", encoding="utf-8") as out:
+            if path.endswith(".json"):
+                self.write_chrome_trace(out)
+            else:
+                self.write_jsonl(out)
+
+
+def grammar_rule_count(parser) -> int:
+    """Return the number of rules in `parser`'s grammar."""
+    return sum(len(rules) for rules in parser.rules.values())
+
+
+@contextmanager
+def count_chart_items(parser, record: dict):
+    """Set record["chart_items"] to the number of items in the Earley
+    chart that `parser` builds inside the `with` statement.
+
+    GenericParser.parse() keeps the chart in a local variable, so we
+    catch it as it is passed to makeSet()."""
+    charts = []
+    make_set = parser.makeSet
+
+    def watch_make_set(tokens, sets, i):
+        if not charts:
+            charts.append(sets)
+        return make_set(tokens, sets, i)
+
+    parser.makeSet = watch_make_set
+    try:
+        yield
+    finally:
+        del parser.makeSet
+        if charts:
+            record["chart_items"] = sum(len(items) for items in charts[0])
@@ -0,0 +1,175 @@
+#  Copyright (c) 2026 by Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+On-disk cache of decompilation results.
+
+The cache is content addressed: an entry is found by a digest of the
+code object being decompiled together with the bytecode magic number,
+the uncompyle6 version and the decompile options. So the same bytecode
+decompiled again, even from another file or in another build, is taken
+from the cache.
+
+An entry holds the decompiled source text, minus the header comments
+which mention the file name and time stamp, the line-number map if one
+was computed, and whether decompilation succeeded. For a failure, it
+also holds the error message and which exception was raised, so that a
+cache hit raises the same kind of exception.
+
+Each entry is a JSON file in the cache directory. When the directory
+grows beyond its size limit, the least-recently used entries are
+removed.
+"""
+
+import hashlib
+import json
+import os
+import os.path as osp
+import tempfile
+from typing import Optional
+
+from uncompyle6.code_fns import code_digest
+from uncompyle6.parser import ParserError
+from uncompyle6.version import __version__
+
+# Default limit on the total size of the cache, in bytes.
+DEFAULT_MAX_CACHE_SIZE = 256 * 1024 * 1024
+
+OKAY_STATUS = "okay"
+FAILED_STATUS = "failed"
+
+
+class CachedDeparse:
+    """Stands in for the SourceWalker object returned by decompile()
+    when the result came from the cache."""
+
+    def __init__(self, out, version, text, source_linemap):
+        self.f = out
+        self.version = version
+        self.text = text
+        self.source_linemap = source_linemap
+
+
+class CachedParserError(ParserError):
+    """Stands in for the ParserError raised by decompile() when the
+    failure came from the cache. Only its message was saved."""
+
+    def __init__(self, message: str):
+        super().__init__(None, -1)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class ResultCache:
+    """A size-bounded, least-recently-used cache of decompilation
+    results stored in directory `cache_dir`."""
+
+    def __init__(self, cache_dir: str, max_size: int = DEFAULT_MAX_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        # Our idea of the total size of the cache. Other processes may
+        # be adding to the cache too, so we recompute it when it looks
+        # like it's time to evict entries.
+        self.size = None
+
+    def key(self, co, magic_int, is_pypy: bool, compile_mode: str) -> str:
+        """Return the cache key for decompiling `co`."""
+        h = hashlib.sha1()
+        h.update(
+            f"{__version__} {magic_int} {is_pypy} {compile_mode} ".encode("utf-8")
+        )
+        h.update(code_digest(co).encode("ascii"))
+        return h.hexdigest()
+
+    def path(self, key: str) -> str:
+        return osp.join(self.cache_dir, key + ".json")
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the entry saved under `key`, or None if there isn't
+        one."""
+        path = self.path(key)
+        try:
+            with open(path, encoding="utf-8") as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        try:
+            # Record the use for least-recently-used eviction.
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(
+        self,
+        key: str,
+        status: str,
+        source: str,
+        linemap: Optional[list] = None,
+        message: str = "",
+        error: Optional[str] = None,
+    ):
+        """Save a decompilation result under `key`. For a failure,
+        `error` is the name of the exception class raised, and `message`
+        its message. Failures to save are ignored: the cache is an
+        optimization only."""
+        entry = {
+            "status": status,
+            "source": source,
+            "linemap": linemap,
+            "message": message,
+            "error": error,
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                json.dump(entry, fp)
+                entry_size = fp.tell()
+            os.replace(tmp_path, self.path(key))
+            if self.size is not None:
+                self.size += entry_size
+            if self.size is None or self.size > self.max_size:
+                self.evict()
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove least-recently-used entries until the cache fits in
+        self.max_size bytes."""
+        entries = []
+        total_size = 0
+        with os.scandir(self.cache_dir) as it:
+            for dir_entry in it:
+                if not dir_entry.name.endswith(".json"):
+                    continue
+                try:
+                    st = dir_entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, dir_entry.path))
+                total_size += st.st_size
+        if total_size > self.max_size:
+            entries.sort()
+            for _, size, path in entries:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total_size -= size
+                if total_size <= self.max_size:
+                    break
+        self.size = total_size
@@ -0,0 +1,226 @@
+#  Copyright (c) 2026 by Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Worker interpreter that runs Python programs for uncompyle6.verifier.
+
+This is run as a script, not imported: uncompyle6.verifier starts it
+with the same Python interpreter that it is running under. It reads one
+JSON request per line on stdin, of the form
+
+    {"path": <program to run>, "timeout": <seconds or null>,
+     "max_memory": <bytes or null>}
+
+runs the program as "python <path>" would, and writes one JSON reply
+per line on stdout:
+
+    {"returncode": <exit status>, "stdout": <output>, "stderr": <errors>}
+
+A negative exit status is the number of the signal that ended the
+program. Where os.fork() is available, each program runs in a child
+process forked from this one, so that the cost of starting the
+interpreter is paid only once. The child has no standard input, and
+is given a CPU-time limit and an alarm of `timeout` seconds, and an
+address-space limit of `max_memory` bytes. Since a program can ignore
+the alarm, we also kill the child if it is still running a little
+after `timeout` seconds. Elsewhere each program runs in a new
+interpreter, with only the time limit.
+
+These limits keep a program from running forever or using up the
+memory of the machine, and nothing else: the program runs with our
+privileges, and can read and write whatever we can.
+
+Only the standard library is used here, and the package is not
+imported, so that the programs we run see an interpreter that is as
+close to a fresh one as we can make it.
+"""
+
+import sys
+
+# We are run as a script, so the first entry on the path is the
+# uncompyle6 package directory. Remove it so that its modules don't
+# hide those of the standard library or of the programs we run.
+del sys.path[0]
+
+import json  # noqa: E402
+import os  # noqa: E402
+import runpy  # noqa: E402
+import signal  # noqa: E402
+import subprocess  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+import traceback  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+
+def exit_status(code) -> int:
+    """Return the exit status for SystemExit code `code`, as the
+    interpreter would."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xFF
+    print(code, file=sys.stderr)
+    return 1
+
+
+# Seconds past its timeout that we give a program whose alarm has gone
+# off before we kill it, so that it can report where it was.
+KILL_GRACE = 1
+
+# The longest we sleep between checks on whether a program has ended.
+MAX_POLL_INTERVAL = 0.05
+
+
+def limit_memory(max_memory):
+    """Limit the address space of this process to `max_memory` bytes,
+    as uncompyle6.batch.limit_memory() does; we can't import that
+    here."""
+    if not max_memory or resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        max_memory = min(max_memory, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (max_memory, hard))
+
+
+def run_child(path: str, timeout, max_memory):
+    """Run program `path` in this, a freshly forked, process and exit
+    with its exit status."""
+    import atexit
+    import threading
+
+    status = 1
+    try:
+        limit_memory(max_memory)
+        if timeout:
+            seconds = max(1, int(timeout + 0.5))
+            if resource is not None:
+                resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 1))
+            signal.alarm(seconds)
+        sys.stdin = open(os.devnull)
+        sys.argv = [path]
+        sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+        try:
+            runpy.run_path(path, run_name="__main__")
+            status = 0
+        except SystemExit as e:
+            status = exit_status(e.code)
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        # os._exit() skips what the interpreter does when a program
+        # ends, so we do it here: wait for the threads that aren't
+        # daemons, and then call the atexit functions.
+        try:
+            threading._shutdown()
+        except BaseException:
+            traceback.print_exc()
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(status)
+
+
+def run_forked(path: str, timeout, max_memory) -> dict:
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(out.fileno(), 1)
+            os.dup2(err.fileno(), 2)
+            run_child(path, timeout, max_memory)
+        wait_status, timed_out = wait_child(pid, timeout)
+        if os.WIFSIGNALED(wait_status):
+            returncode = -os.WTERMSIG(wait_status)
+        else:
+            returncode = os.WEXITSTATUS(wait_status)
+        out.seek(0)
+        err.seek(0)
+        errors = err.read().decode("utf-8", "replace")
+        if timed_out:
+            errors += f"timed out after {timeout} seconds\n"
+        return {
+            "returncode": returncode,
+            "stdout": out.read().decode("utf-8", "replace"),
+            "stderr": errors,
+        }
+
+
+def wait_child(pid: int, timeout):
+    """Wait for child process `pid` to end, killing it if it runs for
+    more than `timeout` seconds, plus a grace period. Return its wait
+    status and whether it was killed."""
+    if not timeout:
+        return os.waitpid(pid, 0)[1], False
+    deadline = time.monotonic() + timeout + KILL_GRACE
+    interval = 0.001
+    while True:
+        done, wait_status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return wait_status, False
+        now = time.monotonic()
+        if now >= deadline:
+            os.kill(pid, signal.SIGKILL)
+            return os.waitpid(pid, 0)[1], True
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+
+def run_spawned(path: str, timeout, max_memory) -> dict:
+    try:
+        result = subprocess.run(
+            [sys.executable, path],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired as e:
+        return {
+            "returncode": -1,
+            "stdout": (e.stdout or b"").decode("utf-8", "replace"),
+            "stderr": f"timed out after {timeout} seconds\n",
+        }
+    return {
+        "returncode": result.returncode,
+        "stdout": result.stdout.decode("utf-8", "replace"),
+        "stderr": result.stderr.decode("utf-8", "replace"),
+    }
+
+
+def main():
+    run = run_forked if hasattr(os, "fork") else run_spawned
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            reply = run(
+                request["path"], request.get("timeout"), request.get("max_memory")
+            )
+        except OSError as e:
+            reply = {"returncode": -1, "stdout": "", "stderr": f"{e}\n"}
+        sys.stdout.write(json.dumps(reply) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -21,10 +21,12 @@ scanner/ingestion module. From here we call various version-specific
 scanners, e.g. for Python 2.7 or 3.4.
 """
 
+import heapq
 import importlib
 from abc import ABC
 from array import array
-from collections import namedtuple
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
 from types import ModuleType
 from typing import Optional, Union
 
@@ -40,6 +42,7 @@ from xdis import (
 from xdis.op_imports import get_opcode_module
 from xdis.version_info import IS_PYPY, PythonImplementation, version_tuple_to_str
 
+from uncompyle6.profiler import NULL_PROFILER
 from uncompyle6.scanners.tok import Token
 
 # The byte code versions we support.
@@ -91,6 +94,87 @@ def long(num):
 
 CONST_COLLECTIONS = ("CONST_LIST", "CONST_SET", "CONST_DICT", "CONST_MAP")
 
+# The most tokens that the token cache holds.
+MAX_CACHED_TOKENS = 500000
+
+# What the token cache keeps for a code object: the tokens and
+# customizations that ingest() returned, and the instructions that the
+# scanner was left with, which the parser looks at.
+TokenCacheEntry = namedtuple(
+    "TokenCacheEntry", "co tokens customize insts offset2inst_index"
+)
+
+
+class TokenCache:
+    """
+    Tokens that Scanner.ingest() has returned, so that a code object
+    which is ingested more than once while decompiling, as fragment
+    deparsing does, is scanned only once. A caller that does this sets
+    a TokenCache as the scanner's token_cache for as long as it needs
+    it; see Scanner.cached_ingest().
+
+    Entries are keyed on the identity of the code object, the scanner
+    class and version, the Token class, and the class name passed to
+    ingest(). An entry holds on to its code object, so the id() can't
+    be reused while it is in the cache. The cache holds at most
+    `max_tokens` tokens, and drops the least recently used entries to
+    make room.
+
+    Callers change the tokens they are given, so we keep copies and
+    hand out copies.
+    """
+
+    def __init__(self, max_tokens: int = MAX_CACHED_TOKENS):
+        self.max_tokens = max_tokens
+        self.entries = OrderedDict()
+        self.token_count = 0
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.token_count = 0
+
+    def ingest(self, scanner, co, classname=None, code_objects={}, show_asm=None):
+        if show_asm or scanner.show_asm:
+            # The assembly listing is written as ingest() goes.
+            return scanner.ingest(co, classname, code_objects, show_asm)
+
+        key = (
+            scanner.__class__,
+            scanner.version,
+            scanner.is_pypy,
+            scanner.Token,
+            id(co),
+            classname,
+        )
+        entry = self.entries.get(key)
+        if entry is not None and entry.co is co:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            scanner.insts = entry.insts
+            scanner.offset2inst_index = entry.offset2inst_index
+            return [t.copy() for t in entry.tokens], dict(entry.customize)
+
+        self.misses += 1
+        tokens, customize = scanner.ingest(co, classname, code_objects, show_asm)
+        if entry is not None:
+            del self.entries[key]
+            self.token_count -= len(entry.tokens)
+        if len(tokens) <= self.max_tokens:
+            self.entries[key] = TokenCacheEntry(
+                co,
+                [t.copy() for t in tokens],
+                dict(customize),
+                getattr(scanner, "insts", None),
+                getattr(scanner, "offset2inst_index", None),
+            )
+            self.token_count += len(tokens)
+            while self.token_count > self.max_tokens:
+                _, evicted = self.entries.popitem(last=False)
+                self.token_count -= len(evicted.tokens)
+        return tokens, customize
+
 
 class Code:
     """
@@ -108,7 +192,173 @@ class Code:
         for i in dir(co):
             if i.startswith("co_"):
                 setattr(self, i, getattr(co, i))
-        self._tokens, self._customize = scanner.ingest(co, classname, show_asm=show_asm)
+        with scanner.profiler.phase("ingest", co) as record:
+            self._tokens, self._customize = scanner.cached_ingest(
+                co, classname, show_asm=show_asm
+            )
+            record["tokens"] = len(self._tokens)
+
+
+class StructIndex(list):
+    """
+    The list of control-flow structures found in a code object. Each
+    structure is a dict with "type", "start" and "end" keys, and the
+    first structure covers the whole code object.
+
+    As well as being a list, this keeps track of which structures
+    surround an offset. So innermost() is fast provided that the
+    offsets it is given do not decrease, which is how the scanners'
+    control-flow detection visits instructions.
+    """
+
+    def __init__(self, root: dict):
+        super().__init__([root])
+        # The offset last passed to innermost().
+        self.offset = -1
+        # (start, index) heap of structures starting after self.offset.
+        self.pending = []
+        # Indices of structures that start at or before self.offset and
+        # had not ended as of self.offset, in increasing order.
+        self.active = [0]
+
+    def append(self, struct: dict):
+        index = len(self)
+        super().append(struct)
+        if struct["start"] <= self.offset:
+            # index is larger than anything in self.active.
+            self.active.append(index)
+        else:
+            heapq.heappush(self.pending, (struct["start"], index))
+
+    def innermost(self, offset: int) -> dict:
+        """
+        Return the inner-most structure surrounding `offset`. We go
+        through the structures in the order they were added, taking a
+        structure when it surrounds `offset` and is nested inside the
+        structure taken before it.
+        """
+        if offset < self.offset:
+            # Not the expected order; look at all the structures.
+            candidates = self
+        else:
+            self.offset = offset
+            pending = self.pending
+            active = self.active
+            if pending and pending[0][0] <= offset:
+                while pending and pending[0][0] <= offset:
+                    active.append(heapq.heappop(pending)[1])
+                active.sort()
+            self.active = [i for i in active if offset < self[i]["end"]]
+            candidates = [self[i] for i in self.active]
+
+        parent = self[0]
+        start = parent["start"]
+        end = parent["end"]
+        for struct in candidates:
+            current_start = struct["start"]
+            current_end = struct["end"]
+            if (current_start <= offset < current_end) and (
+                current_start >= start and current_end <= end
+            ):
+                start = current_start
+                end = current_end
+                parent = struct
+        return parent
+
+
+LineTuple = namedtuple("LineTuple", ["l_no", "next"])
+
+
+class OffsetTable:
+    """
+    Base class for the read-only tables the scanners index by bytecode
+    offset, like self.lines, self.prev_op and self.next_stmt.
+
+    These used to be lists with an entry for every byte of co_code.
+    Subclasses store instead a sorted array of offsets where the value
+    changes and find an entry by bisection.
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        for offset in range(self.length):
+            yield self[offset]
+
+    def check_offset(self, offset: int) -> int:
+        if offset < 0:
+            offset += self.length
+        if not 0 <= offset < self.length:
+            raise IndexError("%s index out of range" % self.__class__.__name__)
+        return offset
+
+
+class LineTable(OffsetTable):
+    """
+    Line number of the op at an offset, and the offset of the first
+    op on the following line, as a LineTuple.
+
+    `line_ends` has, for each line, the offset of the following line
+    which is also the end of this one. `line_numbers` has the line
+    numbers.
+    """
+
+    def __init__(self, line_ends: array, line_numbers: list):
+        super().__init__(line_ends[-1] if line_ends else 0)
+        self.line_ends = line_ends
+        self.line_numbers = line_numbers
+
+    def __getitem__(self, offset: int) -> LineTuple:
+        i = bisect_right(self.line_ends, self.check_offset(offset))
+        return LineTuple(self.line_numbers[i], self.line_ends[i])
+
+
+class PrevOpTable(OffsetTable):
+    """
+    Offset of the op before an offset. `op_offsets` has the offsets
+    of all ops in order.
+
+    Entries can be changed, as remove_extended_args() does; the few
+    changed entries are kept in a dictionary.
+    """
+
+    def __init__(self, op_offsets: array, length: int):
+        super().__init__(length)
+        self.op_offsets = op_offsets
+        self.changed = {}
+
+    def __getitem__(self, offset: int) -> int:
+        offset = self.check_offset(offset)
+        if offset in self.changed:
+            return self.changed[offset]
+        if offset == 0:
+            return 0
+        return self.op_offsets[bisect_left(self.op_offsets, offset) - 1]
+
+    def __setitem__(self, offset: int, prev_offset: int):
+        self.changed[self.check_offset(offset)] = prev_offset
+
+
+class NextStmtTable(OffsetTable):
+    """
+    Offset of the start of the statement after an offset, or the
+    `length` of the code if there is none. `stmt_offsets` has the
+    offsets of all statements in order.
+    """
+
+    def __init__(self, stmt_offsets: array, length: int):
+        super().__init__(length)
+        self.stmt_offsets = stmt_offsets
+
+    def __getitem__(self, offset: int) -> int:
+        i = bisect_right(self.stmt_offsets, self.check_offset(offset))
+        if i == len(self.stmt_offsets):
+            return self.length
+        return self.stmt_offsets[i]
 
 
 class Scanner(ABC):
@@ -117,6 +367,12 @@ class Scanner(ABC):
         self.show_asm = show_asm
         self.is_pypy = is_pypy
 
+        # Set by code_deparse() when decompilation is being profiled.
+        self.profiler = NULL_PROFILER
+
+        # The TokenCache that cached_ingest() uses, if any.
+        self.token_cache = None
+
         # Temporary initialization.
         self.opc = ModuleType("uninitialized")
 
@@ -134,6 +390,16 @@ class Scanner(ABC):
         # FIXME: This weird Python2 behavior is not Python3
         self.resetTokenClass()
 
+    def cached_ingest(self, co, classname=None, code_objects={}, show_asm=None):
+        """
+        Like ingest(), but if there is a token_cache and `co` has been
+        ingested into it before, return the tokens from there rather
+        than scanning it again.
+        """
+        if self.token_cache is None:
+            return self.ingest(co, classname, code_objects, show_asm)
+        return self.token_cache.ingest(self, co, classname, code_objects, show_asm)
+
     def bound_collection_from_tokens(self, tokens, t, i, collection_type):
         count = t.attr
         assert isinstance(count, int)
@@ -230,9 +496,111 @@ class Scanner(ABC):
         self.offset2inst_index = {}
         for i, inst in enumerate(self.insts):
             self.offset2inst_index[inst.offset] = i
+        self.build_opcode_index()
 
         return bytecode
 
+    def build_opcode_index(self):
+        """
+        Index where each opcode appears in self.code, so that
+        first_instr(), last_instr(), all_instr() and inst_matches() can
+        find instructions by bisection rather than by going through the
+        bytecode.
+
+        self.op_offsets has the offsets of all ops in order, and
+        self.opcode_offsets maps an opcode to the offsets where it
+        appears. Indexes that depend on self.insts are built when first
+        needed; see clear_instruction_index().
+        """
+        code = self.code
+        self.op_offsets = array("I")
+        self.opcode_offsets = {}
+        for offset in self.op_range(0, len(code)):
+            self.op_offsets.append(offset)
+            offsets = self.opcode_offsets.get(code[offset])
+            if offsets is None:
+                offsets = self.opcode_offsets[code[offset]] = array("I")
+            offsets.append(offset)
+        self.clear_instruction_index()
+
+    def clear_instruction_index(self):
+        """
+        Forget the indexes built from self.insts. This must be called
+        after changing self.insts.
+        """
+        # Map from a jump target to the offsets of the jumps to it, or
+        # False if we can't compute jump targets for all jumps.
+        self.jump_sources = None
+        # Map from an opcode to the positions in self.insts where it appears.
+        self.inst_opcode_positions = None
+        self.inst_offsets = None
+
+    def get_jump_sources(self):
+        if self.jump_sources is None:
+            jump_sources = {}
+            try:
+                for op in self.opc.JREL_OPS | self.opc.JABS_OPS:
+                    for offset in self.opcode_offsets.get(op, ()):
+                        jump_sources.setdefault(self.get_target(offset), []).append(
+                            offset
+                        )
+            except (AssertionError, IndexError, KeyError):
+                # Odd bytecode; look at each instruction when asked.
+                jump_sources = False
+            else:
+                for offsets in jump_sources.values():
+                    offsets.sort()
+            self.jump_sources = jump_sources
+        return self.jump_sources
+
+    def indexed_op_offsets(self, start: int, end: int, instr) -> Optional[list]:
+        """
+        Return the offsets of the ops in `instr` from `start` up to but
+        not including `end`, in increasing order, the same as going
+        through self.op_range(start, end) would give. If `start` isn't
+        the offset of an op, return None.
+        """
+        if start >= end:
+            return []
+        op_offsets = self.op_offsets
+        i = bisect_left(op_offsets, start)
+        if i == len(op_offsets) or op_offsets[i] != start:
+            return None
+        result = []
+        opcodes = {op for op in instr if isinstance(op, int)}
+        for op in opcodes:
+            offsets = self.opcode_offsets.get(op)
+            if offsets:
+                result.extend(
+                    offsets[bisect_left(offsets, start) : bisect_left(offsets, end)]
+                )
+        if len(opcodes) > 1:
+            result.sort()
+        return result
+
+    def indexed_jump_sources(
+        self, start: int, end: int, instr, target: int
+    ) -> Optional[list]:
+        """
+        Return the offsets of the ops in `instr` from `start` up to but
+        not including `end` that jump to `target`, in increasing order.
+        `start` should be the offset of an op. Return None if we can't
+        use the jump index for this.
+        """
+        jump_ops = self.opc.JREL_OPS | self.opc.JABS_OPS
+        if not all(isinstance(op, int) and op in jump_ops for op in instr):
+            return None
+        jump_sources = self.get_jump_sources()
+        if jump_sources is False:
+            return None
+        sources = jump_sources.get(target, ())
+        code = self.code
+        return [
+            offset
+            for offset in sources[bisect_left(sources, start) : bisect_left(sources, end)]
+            if code[offset] in instr
+        ]
+
     def build_lines_data(self, code_obj):
         """
         Generate various line-related helper data.
@@ -245,44 +613,47 @@ class Scanner(ABC):
         if not self.linestarts:
             return []
 
-        # 'List-map' which shows line number of current op and offset of
-        # first op on following line, given offset of op as index
-        lines = []
-        LineTuple = namedtuple("LineTuple", ["l_no", "next"])
+        # Table which shows line number of current op and offset of
+        # first op on following line, given offset of op as index.
+        # We store one entry per line rather than one per offset.
+        line_ends = array("I")
+        line_numbers = []
 
-        # Iterate through available linestarts, and fill
-        # the data for all code offsets encountered until
-        # last linestart offset
+        # Iterate through available linestarts, and record the line
+        # number for all code offsets encountered until last linestart
+        # offset
         _, prev_line_no = linestarts[0]
         offset = 0
         for start_offset, line_no in linestarts[1:]:
-            while offset < start_offset:
-                lines.append(LineTuple(prev_line_no, start_offset))
-                offset += 1
+            if offset < start_offset:
+                line_ends.append(start_offset)
+                line_numbers.append(prev_line_no)
+                offset = start_offset
             prev_line_no = line_no
 
         # Fill remaining offsets with reference to last line number
         # and code length as start offset of following non-existing line
         codelen = len(self.code)
-        while offset < codelen:
-            lines.append(LineTuple(prev_line_no, codelen))
-            offset += 1
-        return lines
+        if offset < codelen:
+            line_ends.append(codelen)
+            line_numbers.append(prev_line_no)
+        return LineTable(line_ends, line_numbers)
 
     def build_prev_op(self):
         """
-        Compose 'list-map' which allows to jump to previous
+        Compose table which allows to jump to previous
         op, given offset of current op as index.
         """
         code = self.code
         codelen = len(code)
+        op_offsets = array("I")
+        length = 1
+        for offset in self.op_range(0, codelen):
+            op_offsets.append(offset)
+            length = offset + instruction_size(code[offset], self.opc) + 1
         # 2.x uses prev 3.x uses prev_op. Sigh
         # Until we get this sorted out.
-        self.prev = self.prev_op = [0]
-        for offset in self.op_range(0, codelen):
-            op = code[offset]
-            for _ in range(instruction_size(op, self.opc)):
-                self.prev_op.append(offset)
+        self.prev = self.prev_op = PrevOpTable(op_offsets, length)
 
     def is_jump_forward(self, offset: int) -> bool:
         """
@@ -313,8 +684,16 @@ class Scanner(ABC):
         # We check that assumption though by looking at
         # self.code's opcode.
         if offset not in self.offset2inst_index:
-            offset -= instruction_size(self.opc.EXTENDED_ARG, self.opc)
-            assert self.code[offset] == self.opc.EXTENDED_ARG
+            extended_arg_size = instruction_size(self.opc.EXTENDED_ARG, self.opc)
+            if self.code[offset] == self.opc.EXTENDED_ARG:
+                # With more than one EXTENDED_ARG, the instruction is
+                # found at the last EXTENDED_ARG.
+                while offset not in self.offset2inst_index:
+                    assert self.code[offset] == self.opc.EXTENDED_ARG
+                    offset += extended_arg_size
+            else:
+                offset -= extended_arg_size
+                assert self.code[offset] == self.opc.EXTENDED_ARG
         return self.insts[self.offset2inst_index[offset]]
 
     def get_target(self, offset: int, extended_arg: int = 0) -> int:
@@ -354,9 +733,17 @@ class Scanner(ABC):
         if not isinstance(instr, list):
             instr = [instr]
 
+        offsets = self.indexed_op_offsets(start, end, instr)
+        if offsets is None:
+            offsets = self.op_range(start, end)
+        elif target is not None and exact:
+            sources = self.indexed_jump_sources(start, end, instr, target)
+            if sources is not None:
+                return sources[0] if sources else None
+
         result_offset = None
         current_distance = len(code)
-        for offset in self.op_range(start, end):
+        for offset in offsets:
             op = code[offset]
             if op in instr:
                 if target is None:
@@ -394,11 +781,24 @@ class Scanner(ABC):
         if not isinstance(instr, list):
             instr = [instr]
 
+        offsets = self.indexed_op_offsets(start, end, instr)
+        if offsets is None:
+            offsets = self.op_range(start, end)
+        elif self.opc.EXTENDED_ARG in instr:
+            # We skip over EXTENDED_ARG below.
+            offsets = [o for o in offsets if code[o] != self.opc.EXTENDED_ARG]
+        elif target is None:
+            return offsets[-1] if offsets else None
+        elif exact:
+            sources = self.indexed_jump_sources(start, end, instr, target)
+            if sources is not None:
+                return sources[-1] if sources else None
+
         result_offset = None
         current_distance = self.insts[-1].offset - self.insts[0].offset
         extended_arg = 0
         # FIXME: use self.insts rather than code[]
-        for offset in self.op_range(start, end):
+        for offset in offsets:
             op = code[offset]
 
             if op == self.opc.EXTENDED_ARG:
@@ -442,8 +842,34 @@ class Scanner(ABC):
             instr = [instr]
 
         first = self.offset2inst_index[start]
+        if self.inst_opcode_positions is None:
+            self.inst_offsets = array("I", (inst.offset for inst in self.insts))
+            self.inst_opcode_positions = {}
+            for i, inst in enumerate(self.insts):
+                self.inst_opcode_positions.setdefault(inst.opcode, []).append(i)
+
+        # We look at instructions up to and including the first one
+        # at or after `end`.
+        last = min(
+            max(first, bisect_left(self.inst_offsets, end)), len(self.insts) - 1
+        )
+        opcodes = {op for op in instr if isinstance(op, int)}
+        positions = []
+        for op in opcodes:
+            op_positions = self.inst_opcode_positions.get(op)
+            if op_positions:
+                positions.extend(
+                    op_positions[
+                        bisect_left(op_positions, first) : bisect_left(
+                            op_positions, last + 1
+                        )
+                    ]
+                )
+        if len(opcodes) > 1:
+            positions.sort()
+
         result = []
-        for inst in self.insts[first:]:
+        for inst in (self.insts[i] for i in positions):
             if inst.opcode in instr:
                 if target is None:
                     result.append(inst.offset)
@@ -456,8 +882,6 @@ class Scanner(ABC):
                         pass
                     pass
                 pass
-            if inst.offset >= end:
-                break
             pass
 
         # FIXME: put in a test
@@ -489,9 +913,22 @@ class Scanner(ABC):
         except:
             instr = [instr]
 
+        offsets = self.indexed_op_offsets(start, end, instr)
+        if offsets is None:
+            offsets = self.op_range(start, end)
+        elif self.opc.EXTENDED_ARG in instr:
+            # We skip over EXTENDED_ARG below.
+            offsets = [o for o in offsets if code[o] != self.opc.EXTENDED_ARG]
+        elif target is None:
+            return offsets
+        elif not include_beyond_target:
+            sources = self.indexed_jump_sources(start, end, instr, target)
+            if sources is not None:
+                return sources
+
         result = []
         extended_arg = 0
-        for offset in self.op_range(start, end):
+        for offset in offsets:
             op = code[offset]
 
             if op == self.opc.EXTENDED_ARG:
@@ -607,10 +1044,21 @@ class Scanner(ABC):
         return self.Token
 
 
+# Scanner classes that get_scanner() has looked up, keyed by (version,
+# is_pypy).
+scanner_classes = {}
+
+
 def get_scanner(version: Union[str, tuple], is_pypy=False, show_asm=None) -> Scanner:
     """
-    Import the right scanner module for ``version`` and return the Scanner class
-    in that module.
+    Return a new scanner for bytecode ``version``.
+
+    The scanner module for a version is imported the first time that
+    version is asked for, and its scanner class is remembered. Each call
+    makes a scanner of its own, since ingest() leaves state such as
+    the instructions on the scanner, which the parser and source walker
+    then read; sharing a scanner would let two decompilations, in
+    different threads say, overwrite each other's state.
     """
     # If version is a string, turn that into the corresponding float.
     if isinstance(version, str):
@@ -623,44 +1071,23 @@ def get_scanner(version: Union[str, tuple], is_pypy=False, show_asm=None) -> Sca
             )
         version = CANONIC2VERSION[canonic_version]
 
-    # Pick up appropriate scanner
-    if version[:2] in PYTHON_VERSIONS:
-        v_str = version_tuple_to_str(version, start=0, end=2, delimiter="")
-        try:
-            import importlib
-
-            if is_pypy:
-                scan = importlib.import_module("uncompyle6.scanners.pypy%s" % v_str)
-            else:
-                scan = importlib.import_module("uncompyle6.scanners.scanner%s" % v_str)
-            if False:
-                print(scan)  # Avoid unused scan
-        except ImportError:
-            if is_pypy:
-                exec(
-                    "import uncompyle6.scanners.pypy%s as scan" % v_str,
-                    locals(),
-                    globals(),
-                )
-            else:
-                exec(
-                    "import uncompyle6.scanners.scanner%s as scan" % v_str,
-                    locals(),
-                    globals(),
-                )
-        if is_pypy:
-            scanner = eval(
-                "scan.ScannerPyPy%s(show_asm=show_asm)" % v_str, locals(), globals()
-            )
-        else:
-            scanner = eval(
-                "scan.Scanner%s(show_asm=show_asm)" % v_str, locals(), globals()
-            )
-    else:
+    if version[:2] not in PYTHON_VERSIONS:
         raise RuntimeError(
             f"Unsupported Python version, {version_tuple_to_str(version)}, for decompilation"
         )
-    return scanner
+
+    key = (version[:2], is_pypy)
+    scanner_class = scanner_classes.get(key)
+    if scanner_class is None:
+        v_str = version_tuple_to_str(version, start=0, end=2, delimiter="")
+        if is_pypy:
+            scan = importlib.import_module("uncompyle6.scanners.pypy%s" % v_str)
+            scanner_class = getattr(scan, "ScannerPyPy%s" % v_str)
+        else:
+            scan = importlib.import_module("uncompyle6.scanners.scanner%s" % v_str)
+            scanner_class = getattr(scan, "Scanner%s" % v_str)
+        scanner_classes[key] = scanner_class
+    return scanner_class(show_asm=show_asm)
 
 
 if __name__ == "__main__":
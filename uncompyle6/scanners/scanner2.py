@@ -35,13 +35,14 @@ Finally we save token information.
 
 from __future__ import print_function
 
+from array import array
 from copy import copy
 from sys import intern
 
 from xdis import code2num, instruction_size, iscode, op_has_argument
 from xdis.bytecode import _get_const_info, get_optype
 
-from uncompyle6.scanner import Scanner, Token
+from uncompyle6.scanner import NextStmtTable, Scanner, StructIndex, Token
 
 
 class Scanner2(Scanner):
@@ -295,8 +296,10 @@ class Scanner2(Scanner):
                             come_from_name,
                             jump_offset,
                             repr(jump_offset),
-                            offset="%s_%d" % (offset, jump_idx),
+                            offset=offset,
+                            sub_offset=jump_idx,
                             has_arg=True,
+                            opc=self.opc,
                         )
                     )
                     jump_idx += 1
@@ -545,9 +548,7 @@ class Scanner2(Scanner):
         else:
             stmt_list = prelim
         last_stmt = -1
-        self.next_stmt = []
-        slist = self.next_stmt = []
-        i = 0
+        stmt_offsets = array("I")
         for s in stmt_list:
             if code[s] == self.opc.JUMP_ABSOLUTE and s not in pass_stmts:
                 target = self.get_target(s)
@@ -593,9 +594,8 @@ class Scanner2(Scanner):
                     stmts.remove(s)
                     continue
             last_stmt = s
-            slist += [s] * (s - i)
-            i = s
-        slist += [end] * (end - len(slist))
+            stmt_offsets.append(s)
+        self.next_stmt = NextStmtTable(stmt_offsets, end)
 
     def next_except_jump(self, start):
         """
@@ -651,22 +651,11 @@ class Scanner2(Scanner):
 
         code = self.code
 
-        # Detect parent structure
-        parent = self.structs[0]
+        next_line_byte = self.structs[0]["end"]
+
+        # Detect parent structure, picking the inner-most one for our offset
+        parent = self.structs.innermost(offset)
         start = parent["start"]
-        end = parent["end"]
-        next_line_byte = end
-
-        # Pick inner-most parent for our offset
-        for struct in self.structs:
-            current_start = struct["start"]
-            current_end = struct["end"]
-            if (current_start <= offset < current_end) and (
-                current_start >= start and current_end <= end
-            ):
-                start = current_start
-                end = current_end
-                parent = struct
 
         if op == self.opc.SETUP_LOOP:
             # We categorize loop types: 'for', 'while', 'while 1' with
@@ -1298,7 +1287,7 @@ class Scanner2(Scanner):
         """
         code = self.code
         n = len(code)
-        self.structs = [{"type": "root", "start": 0, "end": n - 1}]
+        self.structs = StructIndex({"type": "root", "start": 0, "end": n - 1})
         # All loop entry points
         self.loops = []
 
@@ -1359,7 +1348,7 @@ class Scanner2(Scanner):
                             source = self.setup_loops[label]
                         else:
                             source = offset
-                        targets[label] = targets.get(label, []) + [source]
+                        targets.setdefault(label, []).append(source)
                     elif not (
                         code[label] == self.opc.POP_TOP
                         and code[self.prev[label]] == self.opc.RETURN_VALUE
@@ -1392,7 +1381,7 @@ class Scanner2(Scanner):
                                     or self.code[source] != self.opc.SETUP_LOOP
                                     or self.code[label] != self.opc.JUMP_FORWARD
                                 ):
-                                    targets[label] = targets.get(label, []) + [source]
+                                    targets.setdefault(label, []).append(source)
                                 pass
                             pass
                         pass
@@ -1403,7 +1392,7 @@ class Scanner2(Scanner):
                 and self.version[:2] == (2, 7)
             ):
                 label = self.fixed_jumps[offset]
-                targets[label] = targets.get(label, []) + [offset]
+                targets.setdefault(label, []).append(offset)
                 pass
 
             extended_arg = 0
@@ -158,8 +158,10 @@ class Scanner26(scan.Scanner2):
                                 "COME_FROM",
                                 jump_offset,
                                 repr(jump_offset),
-                                offset="%s_%d" % (offset, jump_idx),
+                                offset=offset,
+                                sub_offset=jump_idx,
                                 has_arg=True,
+                                opc=self.opc,
                             )
                         )
                         jump_idx += 1
@@ -36,6 +36,7 @@ Finally we save token information.
 from __future__ import print_function
 
 import sys
+from array import array
 from typing import Optional, Tuple
 
 import xdis
@@ -46,7 +47,12 @@ from xdis.bytecode import _get_const_info
 from xdis.opcodes import opcode_33 as op3
 from xdis.opcodes.opcode_3x.opcode_3x import parse_fn_counts_30_35
 
-from uncompyle6.scanner import CONST_COLLECTIONS, Scanner
+from uncompyle6.scanner import (
+    CONST_COLLECTIONS,
+    NextStmtTable,
+    Scanner,
+    StructIndex,
+)
 from uncompyle6.scanners.tok import Token
 from uncompyle6.util import get_code_name
 
@@ -583,7 +589,8 @@ class Scanner3(Scanner):
                             come_from_name,
                             jump_offset,
                             repr(jump_offset),
-                            offset="%s_%s" % (inst.offset, jump_idx),
+                            offset=inst.offset,
+                            sub_offset=jump_idx,
                             has_arg=True,
                             opc=self.opc,
                         )
@@ -820,7 +827,7 @@ class Scanner3(Scanner):
         """
         code = self.code
         n = len(code)
-        self.structs = [{"type": "root", "start": 0, "end": n - 1}]
+        self.structs = StructIndex({"type": "root", "start": 0, "end": n - 1})
 
         # All loop entry points
         self.loops = []
@@ -868,10 +875,10 @@ class Scanner3(Scanner):
                                 label = oparg
 
                 if label is not None and label != -1:
-                    targets[label] = targets.get(label, []) + [offset]
+                    targets.setdefault(label, []).append(offset)
             elif op == self.opc.END_FINALLY and offset in self.fixed_jumps:
                 label = self.fixed_jumps[offset]
-                targets[label] = targets.get(label, []) + [offset]
+                targets.setdefault(label, []).append(offset)
                 pass
 
             pass  # for loop
@@ -919,11 +926,11 @@ class Scanner3(Scanner):
             stmt_offset_list.sort()
         else:
             stmt_offset_list = prelim
-        # 'List-map' which contains offset of start of
-        # next statement, when op offset is passed as index
-        self.next_stmt = slist = []
+        # Offsets of the statements we keep, from which we build the
+        # table of the offset of start of next statement, when op
+        # offset is passed as index
+        stmt_offsets = array("I")
         last_stmt_offset = -1
-        i = 0
         # Go through all statement offsets
         for stmt_offset in stmt_offset_list:
             # Process absolute jumps, but do not remove 'pass' statements
@@ -966,13 +973,9 @@ class Scanner3(Scanner):
                 if code[j] == self.opc.FOR_ITER:
                     stmts.remove(stmt_offset)
                     continue
-            # Add to list another list with offset of current statement,
-            # equal to length of previous statement
-            slist += [stmt_offset] * (stmt_offset - i)
+            stmt_offsets.append(stmt_offset)
             last_stmt_offset = stmt_offset
-            i = stmt_offset
-        # Finish filling the list for last statement
-        slist += [codelen] * (codelen - len(slist))
+        self.next_stmt = NextStmtTable(stmt_offsets, codelen)
 
     def detect_control_flow(self, offset, targets, inst_index):
         """
@@ -984,22 +987,11 @@ class Scanner3(Scanner):
         inst = self.insts[inst_index]
         op = inst.opcode
 
-        # Detect parent structure
-        parent = self.structs[0]
+        # Detect parent structure, picking the inner-most one for our offset
+        parent = self.structs.innermost(offset)
         start = parent["start"]
         end = parent["end"]
 
-        # Pick inner-most parent for our offset
-        for struct in self.structs:
-            current_start = struct["start"]
-            current_end = struct["end"]
-            if (current_start <= offset < current_end) and (
-                current_start >= start and current_end <= end
-            ):
-                start = current_start
-                end = current_end
-                parent = struct
-
         if self.version < (3, 8) and op == self.opc.SETUP_LOOP:
             # We categorize loop types: 'for', 'while', 'while 1' with
             # possibly suffixes '-loop' and '-else'
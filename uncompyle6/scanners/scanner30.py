@@ -36,22 +36,11 @@ class Scanner30(Scanner3):
         code = self.code
         op = self.insts[inst_index].opcode
 
-        # Detect parent structure
-        parent = self.structs[0]
+        # Detect parent structure, picking the inner-most one for our offset
+        parent = self.structs.innermost(offset)
         start = parent["start"]
         end = parent["end"]
 
-        # Pick innermost parent for our offset
-        for struct in self.structs:
-            current_start = struct["start"]
-            current_end = struct["end"]
-            if (current_start <= offset < current_end) and (
-                current_start >= start and current_end <= end
-            ):
-                start = current_start
-                end = current_end
-                parent = struct
-
         if op == self.opc.SETUP_LOOP:
             # We categorize loop types: 'for', 'while', 'while 1' with
             # possibly suffixes '-loop' and '-else'
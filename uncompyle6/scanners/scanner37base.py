@@ -30,6 +30,7 @@ Finally we save token information.
 """
 
 import sys
+from array import array
 from typing import Any, Dict, List, Set, Tuple
 
 import xdis
@@ -39,7 +40,7 @@ from xdis.bytecode import _get_const_info
 # Get all the opcodes into globals
 from xdis.opcodes import opcode_37 as op3
 
-from uncompyle6.scanner import Scanner, Token
+from uncompyle6.scanner import NextStmtTable, Scanner, StructIndex, Token
 
 globals().update(op3.opmap)
 
@@ -310,6 +311,7 @@ class Scanner37Base(Scanner):
                         tos_str=None,
                         start_offset=None,
                     )
+        self.clear_instruction_index()
 
         # Get jump targets
         # Format: {target offset: [jump offsets]}
@@ -351,7 +353,8 @@ class Scanner37Base(Scanner):
                             opname=come_from_name,
                             attr=jump_offset,
                             pattr=repr(jump_offset),
-                            offset="%s_%s" % (inst.offset, jump_idx),
+                            offset=inst.offset,
+                            sub_offset=jump_idx,
                             has_arg=True,
                             opc=self.opc,
                             has_extended_arg=False,
@@ -603,7 +606,7 @@ class Scanner37Base(Scanner):
         """
         code = self.code
         n = len(code)
-        self.structs = [{"type": "root", "start": 0, "end": n - 1}]
+        self.structs = StructIndex({"type": "root", "start": 0, "end": n - 1})
 
         # All loop entry points
         self.loops: List[int] = []
@@ -648,10 +651,10 @@ class Scanner37Base(Scanner):
                                 label = oparg
 
                 if label is not None and label != -1:
-                    targets[label] = targets.get(label, []) + [offset]
+                    targets.setdefault(label, []).append(offset)
             elif op == self.opc.END_FINALLY and offset in self.fixed_jumps:
                 label = self.fixed_jumps[offset]
-                targets[label] = targets.get(label, []) + [offset]
+                targets.setdefault(label, []).append(offset)
                 pass
 
             pass  # for loop
@@ -699,11 +702,11 @@ class Scanner37Base(Scanner):
             stmt_offset_list.sort()
         else:
             stmt_offset_list = prelim
-        # 'List-map' which contains offset of start of
-        # next statement, when op offset is passed as index
-        self.next_stmt = slist = []
+        # Offsets of the statements we keep, from which we build the
+        # table of the offset of start of next statement, when op
+        # offset is passed as index
+        stmt_offsets = array("I")
         last_stmt_offset = -1
-        i = 0
         # Go through all statement offsets
         for stmt_offset in stmt_offset_list:
             # Process absolute jumps, but do not remove 'pass' statements
@@ -746,13 +749,9 @@ class Scanner37Base(Scanner):
                 if code[j] == self.opc.FOR_ITER:
                     stmts.remove(stmt_offset)
                     continue
-            # Add to list another list with offset of current statement,
-            # equal to length of previous statement
-            slist += [stmt_offset] * (stmt_offset - i)
+            stmt_offsets.append(stmt_offset)
             last_stmt_offset = stmt_offset
-            i = stmt_offset
-        # Finish filling the list for last statement
-        slist += [codelen] * (codelen - len(slist))
+        self.next_stmt = NextStmtTable(stmt_offsets, codelen)
 
     def detect_control_flow(
         self, offset: int, targets: Dict[Any, Any], inst_index: int
@@ -766,22 +765,11 @@ class Scanner37Base(Scanner):
         inst = self.insts[inst_index]
         op = inst.opcode
 
-        # Detect parent structure
-        parent: Dict[str, Any] = self.structs[0]
+        # Detect parent structure, picking the inner-most one for our offset
+        parent: Dict[str, Any] = self.structs.innermost(offset)
         start: int = parent["start"]
         end: int = parent["end"]
 
-        # Pick inner-most parent for our offset
-        for struct in self.structs:
-            current_start = struct["start"]
-            current_end = struct["end"]
-            if (current_start <= offset < current_end) and (
-                current_start >= start and current_end <= end
-            ):
-                start = current_start
-                end = current_end
-                parent = struct
-
         if self.version < (3, 8) and op == self.opc.SETUP_LOOP:
             # We categorize loop types: 'for', 'while', 'while 1' with
             # possibly suffixes '-loop' and '-else'
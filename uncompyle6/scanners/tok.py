@@ -44,14 +44,51 @@ def off2int(offset, prefer_last=True):
             return offset_1
 
 
+# The opcode module for the running Python, used for tokens that were not
+# given one. It is looked up once and shared by all such tokens.
+_std_opc = None
+
+
+def std_opc():
+    global _std_opc
+    if _std_opc is None:
+        from xdis.std import _std_api
+
+        _std_opc = _std_api.opc
+    return _std_opc
+
+
 class Token:
     """
     Class representing a byte-code instruction.
 
     A byte-code token is equivalent to Python 3's dis.instruction or
     the contents of one line as output by dis.dis().
+
+    There is one of these for every instruction of every code object,
+    so attributes are kept in slots. The offset is stored as an int
+    together with an optional sub-offset, rather than as a string like
+    "10_12" for an instruction with an extended arg or "10_1" for the
+    second COME_FROM at offset 10; the "offset" property still gives
+    the string form for these.
     """
 
+    # "__dict__" is there so that the semantic walkers can still add
+    # attributes like "parent" or "start" to a token in a parse tree.
+    __slots__ = (
+        "kind",
+        "has_arg",
+        "attr",
+        "pattr",
+        "optype",
+        "int_offset",
+        "sub_offset",
+        "linestart",
+        "opc",
+        "op",
+        "__dict__",
+    )
+
     # FIXME: match Python 3.4's terms:
     #    linestart = starts_line
     #    attr = argval
@@ -68,16 +105,20 @@ class Token:
         opc=None,
         has_extended_arg=False,
         optype=None,
+        sub_offset: Union[int, str, None] = None,
     ):
         self.kind = intern(opname)
         self.has_arg = has_arg
         self.attr: Optional[int] = attr
+        if type(pattr) is str and optype in ("name", "local", "free"):
+            pattr = intern(pattr)
         self.pattr = pattr
         self.optype = optype
-        if has_extended_arg:
-            self.offset = "%d_%d" % (offset, offset + 2)
-        else:
+        if isinstance(offset, str):
             self.offset = offset
+        else:
+            self.int_offset = offset
+            self.sub_offset = offset + 2 if has_extended_arg else sub_offset
 
         self.linestart = linestart
         if has_arg is False:
@@ -86,7 +127,7 @@ class Token:
 
         if opc is None:
             try:
-                from xdis.std import _std_api
+                opc = std_opc()
             except KeyError as e:
                 print(f"I don't know about Python version {e} yet.")
                 try:
@@ -100,14 +141,66 @@ class Token:
                         print(f"xdis might need to be informed about version {e}")
                 return
 
-            self.opc = _std_api.opc
-        else:
-            self.opc = opc
+        self.opc = opc
         if op is None:
             self.op = self.opc.opmap.get(self.kind, None)
         else:
             self.op = op
 
+    @property
+    def offset(self) -> Union[int, str]:
+        if self.sub_offset is None:
+            return self.int_offset
+        return "%d_%s" % (self.int_offset, self.sub_offset)
+
+    @offset.setter
+    def offset(self, offset: Union[int, str]):
+        if isinstance(offset, str):
+            # Split an offset like "10_12" into its parts.
+            int_offset, _, sub_offset = offset.partition("_")
+            self.int_offset = int(int_offset)
+            if not sub_offset:
+                self.sub_offset = None
+            elif sub_offset.isdigit():
+                self.sub_offset = int(sub_offset)
+            else:
+                self.sub_offset = sub_offset
+        else:
+            self.int_offset = offset
+            self.sub_offset = None
+
+    def attributes(self) -> dict:
+        """
+        Return the token's attributes as a dictionary, which is what
+        __dict__ would be if Token didn't use slots. The template
+        engines evaluate expressions like "pattr" in this.
+        """
+        d = {
+            name: getattr(self, name)
+            for name in Token.__slots__
+            if name != "__dict__" and hasattr(self, name)
+        }
+        d["offset"] = self.offset
+        d.update(self.__dict__)
+        return d
+
+    def copy(self) -> "Token":
+        """
+        Return a copy of the token, which can be changed without
+        changing this one. This is quicker than copy.copy().
+        """
+        token = object.__new__(self.__class__)
+        for name in Token.__slots__:
+            if name == "__dict__":
+                token.__dict__.update(self.__dict__)
+            else:
+                try:
+                    setattr(token, name, getattr(self, name))
+                except AttributeError:
+                    # Never set; see the std_opc() error in __init__().
+                    pass
+        return token
+
     def __eq__(self, o):
         """'==' on kind and "pattr" attributes.
         It is okay if offsets and linestarts are different"""
@@ -209,7 +302,18 @@ class Token:
         raise IndexError
 
     def off2int(self, prefer_last=True):
-        return off2int(self.offset, prefer_last)
+        """
+        Like off2int(self.offset, prefer_last), but without formatting
+        and parsing an offset string.
+        """
+        sub_offset = self.sub_offset
+        if sub_offset is None:
+            return self.int_offset
+        if not isinstance(sub_offset, int):
+            return off2int(self.offset, prefer_last)
+        if prefer_last and self.int_offset + 2 == sub_offset:
+            return sub_offset
+        return self.int_offset
 
 
 NoneToken = Token("LOAD_CONST", offset=-1, attr=None, pattr=None)
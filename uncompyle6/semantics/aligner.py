@@ -28,7 +28,7 @@ from uncompyle6.semantics.pysource import (
     TREE_DEFAULT_DEBUG,
     SourceWalker,
     SourceWalkerError,
-    find_globals_and_nonlocals
+    find_tree_globals
 )
 from uncompyle6.show import maybe_show_asm
 
@@ -72,19 +72,12 @@ class AligningWalker(SourceWalker, object):
             return
 
         out = "".join((str(j) for j in data))
-        n = 0
-        for i in out:
-            if i == "\n":
-                n += 1
-                if n == len(out):
-                    self.pending_newlines = max(self.pending_newlines, n)
-                    return
-            elif n:
-                self.pending_newlines = max(self.pending_newlines, n)
-                out = out[n:]
-                break
-            else:
-                break
+        text = out.lstrip("\n")
+        n = len(out) - len(text)
+        if n > self.pending_newlines:
+            self.pending_newlines = n
+        if not text:
+            return
 
         if self.pending_newlines > 0:
             diff = max(
@@ -93,16 +86,9 @@ class AligningWalker(SourceWalker, object):
             )
             self.f.write("\n" * diff)
             self.current_line_number += diff
-            self.pending_newlines = 0
 
-        for i in out[::-1]:
-            if i == "\n":
-                self.pending_newlines += 1
-            else:
-                break
-
-        if self.pending_newlines:
-            out = out[: -self.pending_newlines]
+        out = text.rstrip("\n")
+        self.pending_newlines = len(text) - len(out)
         self.f.write(out)
 
     def default(self, node):
@@ -180,9 +166,7 @@ def code_deparse_align(
 
     del tokens  # save memory
 
-    (deparsed.mod_globs, _) = find_globals_and_nonlocals(
-        deparsed.ast, set(), set(), co, version
-    )
+    _, deparsed.mod_globs, _ = find_tree_globals(deparsed.ast, co, version)
 
     # convert leading '__doc__ = "..." into doc string
     try:
@@ -12,25 +12,39 @@ before reduction and don't reduce when there is a problem.
 def checker(ast, in_loop, errors):
     if ast is None:
         return
-    in_loop = (
-        in_loop
-        or ast.kind.startswith("for")
-        or ast.kind.startswith("while")
-        or ast.kind.startswith("async_for")
-    )
-    if ast.kind in ("aug_assign1", "aug_assign2") and ast[0][0] == "and":
-        text = str(ast)
-        error_text = (
-            "\n# improper augmented assignment (e.g. +=, *=, ...):\n#\t"
-            + "\n# ".join(text.split("\n"))
-            + "\n"
+    # Subtrees are checked using a stack rather than by recursion, so
+    # that trees of any depth can be checked. Each entry is an iterator
+    # over the children of a node still to be checked, and whether the
+    # node is inside a loop.
+    stack = []
+    node = ast
+    while node is not None:
+        in_loop = (
+            in_loop
+            or node.kind.startswith("for")
+            or node.kind.startswith("while")
+            or node.kind.startswith("async_for")
         )
-        errors.append(error_text)
-
-    for node in ast:
-        if not in_loop and node.kind in ("continue", "break"):
+        if node.kind in ("aug_assign1", "aug_assign2") and node[0][0] == "and":
             text = str(node)
-            error_text = "\n# not in loop:\n#\t" + "\n# ".join(text.split("\n"))
+            error_text = (
+                "\n# improper augmented assignment (e.g. +=, *=, ...):\n#\t"
+                + "\n# ".join(text.split("\n"))
+                + "\n"
+            )
             errors.append(error_text)
-        if hasattr(node, "__repr1__"):
-            checker(node, in_loop, errors)
+
+        stack.append((iter(node), in_loop))
+        node = None
+        while stack and node is None:
+            kids, in_loop = stack[-1]
+            for kid in kids:
+                if not in_loop and kid.kind in ("continue", "break"):
+                    text = str(kid)
+                    error_text = "\n# not in loop:\n#\t" + "\n# ".join(text.split("\n"))
+                    errors.append(error_text)
+                if hasattr(kid, "__repr1__"):
+                    node = kid
+                    break
+            else:
+                stack.pop()
@@ -14,6 +14,7 @@
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """Constants and initial table values used in pysource.py and fragments.py"""
 
+import functools
 import re
 import sys
 
@@ -588,3 +589,44 @@ escape = re.compile(
         """,
     re.VERBOSE,
 )
+
+# The most compiled format templates that compile_template() keeps.
+# This is well above the number of templates in the tables, but some
+# templates, such as those for call_ex_kw in customize36, are built from
+# the text being decompiled, so we can't keep all of them.
+MAX_COMPILED_TEMPLATES = 4096
+
+
+@functools.lru_cache(maxsize=MAX_COMPILED_TEMPLATES)
+def compile_template(fmt: str) -> tuple:
+    """Return format template `fmt` split into the steps that a
+    template engine carries out, so that the template is only scanned
+    with the `escape` regular expression once.
+
+    The result is a pair (steps, tail). Each step is a tuple
+    (prefix, type, child, expr, code): `prefix` is the literal text to
+    write first, `type` is the escape letter, or "{" for %{...},
+    and `child` is the child index given in %[n]X, or None. For %{...},
+    `expr` is the text between the braces, and `code` is `expr` compiled
+    for eval(). `tail` is the literal text after the last escape.
+    """
+    steps = []
+    i = 0
+    for m in escape.finditer(fmt):
+        i = m.end()
+        child = m.group("child")
+        expr = m.group("expr")
+        if expr and expr[0] != "%":
+            code = compile(expr, "<template>", "eval")
+        else:
+            code = expr
+        steps.append(
+            (
+                m.group("prefix"),
+                m.group("type") or "{",
+                None if child is None else int(child),
+                expr,
+                code,
+            )
+        )
+    return tuple(steps), fmt[i:]
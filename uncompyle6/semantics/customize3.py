@@ -314,7 +314,7 @@ def customize_for_version3(self, version: tuple):
         # function_def_annotate we the name has been filled in.
         # But when derived from funcdefdeco it hasn't Would like a better
         # way to distinguish.
-        if self.f.getvalue()[-4:] == "def ":
+        if self.f.endswith("def "):
             self.write(get_code_name(code_node.attr))
 
         # FIXME: handle and pass full annotate args
@@ -90,7 +90,7 @@ def customize_for_version35(self, version: tuple):
         # then the first * has already been printed.
         # Until I have a better way to check for CALL_FUNCTION_VAR,
         # will assume that if the text ends in *.
-        last_was_star = self.f.getvalue().endswith("*")
+        last_was_star = self.f.endswith("*")
 
         if lastnodetype.startswith("BUILD_LIST"):
             self.write("[")
@@ -268,7 +268,7 @@ def customize_for_version35(self, version: tuple):
         # then the first * has already been printed.
         # Until I have a better way to check for CALL_FUNCTION_VAR,
         # will assume that if the text ends in *.
-        last_was_star = self.f.getvalue().endswith("*")
+        last_was_star = self.f.endswith("*")
 
         if lastnodetype.startswith("BUILD_LIST"):
             self.write("[")
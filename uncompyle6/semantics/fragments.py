@@ -65,7 +65,8 @@ The node position 0 will be associated with "import".
 
 import re
 from bisect import bisect_right
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
+from io import StringIO
 from typing import Optional
 
 from spark_parser import DEFAULT_DEBUG as PARSER_DEFAULT_DEBUG
@@ -73,25 +74,25 @@ from spark_parser.ast import GenericASTTraversalPruningException
 from xdis import iscode
 from xdis.version_info import IS_PYPY, PYTHON_VERSION_TRIPLE
 
+from uncompyle6.code_fns import code_digest
 from uncompyle6.parser import ParserError as ParserError, parse
 from uncompyle6.parsers.treenode import SyntaxTree
-from uncompyle6.scanner import Code, Token, get_scanner
-from uncompyle6.semantics.check_ast import checker
+from uncompyle6.scanner import Code, Token, TokenCache, get_scanner
 from uncompyle6.semantics.consts import (
     INDENT_PER_LEVEL,
     NONE,
     PASS,
     PRECEDENCE,
     TABLE_DIRECT,
-    escape,
+    compile_template,
 )
 from uncompyle6.semantics.helper import find_code_node
+from uncompyle6.semantics.output import OutputBuffer
 from uncompyle6.semantics.pysource import (
     DEFAULT_DEBUG_OPTS,
     TREE_DEFAULT_DEBUG,
     SourceWalker,
-    StringIO,
-    find_globals_and_nonlocals,
+    find_tree_globals,
 )
 from uncompyle6.show import maybe_show_asm, maybe_show_tree
 
@@ -101,6 +102,44 @@ ExtractInfo = namedtuple(
     "lineNo lineStartOffset markerLine selectedLine selectedText nonterminal",
 )
 
+
+class TextFrame:
+    """
+    The text of one traversal. Node positions recorded during a
+    traversal are relative to the start of its text; they are made
+    absolute once, by FragmentsWalker.resolve_positions(), after all of
+    the text has been generated.
+
+    `base` is where the text starts in the text of the enclosing
+    traversal `parent`. It is 0 unless the text was placed with
+    FragmentsWalker.node_append(). A frame without a parent, such as the
+    one for the source of a code object, starts at position 0.
+    """
+
+    __slots__ = ("parent", "base", "start")
+
+    def __init__(self, parent: Optional["TextFrame"] = None):
+        self.parent = parent
+        self.base = 0
+        # The absolute start, once it has been computed.
+        self.start = None
+
+    def absolute_start(self) -> int:
+        if self.start is None:
+            # Find the nearest frame whose start is known, and work back
+            # down from there.
+            frames = []
+            frame = self
+            while frame is not None and frame.start is None:
+                frames.append(frame)
+                frame = frame.parent
+            start = 0 if frame is None else frame.start
+            for frame in reversed(frames):
+                start += frame.base
+                frame.start = start
+        return self.start
+
+
 TABLE_DIRECT_FRAGMENT = {
     "break": ("%|%rbreak\n",),
     "continue  ": ("%|%rcontinue\n",),
@@ -186,6 +225,13 @@ class FragmentsWalker(SourceWalker, object):
         self.hide_internal = False
         self.offsets = {}
         self.last_finish = -1
+
+        # The frame of the traversal under way, and of the last one to
+        # finish.
+        self.frame = None
+        self.last_frame = None
+        # Nodes whose positions are relative to a frame.
+        self.positioned = []
         self.is_pypy = is_pypy
 
         # FIXME: is there a better way?
@@ -233,25 +279,39 @@ class FragmentsWalker(SourceWalker, object):
 
         node.start = start
         node.finish = finish
+        node.frame = self.frame
+        if self.frame is not None:
+            self.positioned.append(node)
         self.last_finish = finish
 
-    def preorder(self, node=None):
-        start = len(self.f.getvalue())
-        super(SourceWalker, self).preorder(node)
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+    def resolve_positions(self):
+        """Turn the frame-relative node positions recorded by
+        set_pos_info() into positions in the final text."""
+        for node in self.positioned:
+            frame = node.frame
+            if frame is not None:
+                start = frame.absolute_start()
+                node.start += start
+                node.finish += start
+                node.frame = None
+        self.positioned = []
 
-        return
+    def preorder_start(self, node):
+        return self.f.tell()
+
+    def preorder_finish(self, node, start):
+        self.set_pos_info(node, start, self.f.tell())
 
     def table_r_node(self, node):
         """General pattern where the last node should should
         get the text span attributes of the entire tree"""
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         try:
             self.default(node)
         except GenericASTTraversalPruningException:
             if not hasattr(node[-1], "parent"):
                 node[-1].parent = node
-            final = len(self.f.getvalue())
+            final = self.f.tell()
             self.set_pos_info(node, start, final)
             self.set_pos_info(node[-1], start, final)
             raise GenericASTTraversalPruningException
@@ -261,7 +321,7 @@ class FragmentsWalker(SourceWalker, object):
     n_classdefco1 = n_classdefco2 = except_cond1 = except_cond2 = table_r_node
 
     def n_pass(self, node):
-        start = len(self.f.getvalue()) + len(self.indent)
+        start = self.f.tell() + len(self.indent)
         self.set_pos_info(node, start, start + len("pass"))
         self.default(node)
 
@@ -272,7 +332,7 @@ class FragmentsWalker(SourceWalker, object):
         # to:
         #  'try_except':  ( '%|try%b:\n%+%c%-%c\n\n', 0, 1, 3 ),
 
-        start = len(self.f.getvalue()) + len(self.indent)
+        start = self.f.tell() + len(self.indent)
         self.set_pos_info(node[0], start, start + len("try:"))
         self.default(node)
 
@@ -280,77 +340,77 @@ class FragmentsWalker(SourceWalker, object):
 
     def n_raise_stmt0(self, node):
         assert node[0] == "RAISE_VARARGS_0"
-        start = len(self.f.getvalue()) + len(self.indent)
+        start = self.f.tell() + len(self.indent)
         try:
             self.default(node)
         except GenericASTTraversalPruningException:
-            self.set_pos_info(node[0], start, len(self.f.getvalue()))
+            self.set_pos_info(node[0], start, self.f.tell())
             self.prune()
 
     def n_raise_stmt1(self, node):
         assert node[1] == "RAISE_VARARGS_1"
-        start = len(self.f.getvalue()) + len(self.indent)
+        start = self.f.tell() + len(self.indent)
         try:
             self.default(node)
         except GenericASTTraversalPruningException:
-            self.set_pos_info(node[1], start, len(self.f.getvalue()))
+            self.set_pos_info(node[1], start, self.f.tell())
             self.prune()
 
     def n_raise_stmt2(self, node):
         assert node[2] == "RAISE_VARARGS_2"
-        start = len(self.f.getvalue()) + len(self.indent)
+        start = self.f.tell() + len(self.indent)
         try:
             self.default(node)
         except GenericASTTraversalPruningException:
-            self.set_pos_info(node[2], start, len(self.f.getvalue()))
+            self.set_pos_info(node[2], start, self.f.tell())
             self.prune()
 
     # FIXME: Isolate: only in Python 2.x.
     def n_raise_stmt3(self, node):
         assert node[3] == "RAISE_VARARGS_3"
-        start = len(self.f.getvalue()) + len(self.indent)
+        start = self.f.tell() + len(self.indent)
         try:
             self.default(node)
         except GenericASTTraversalPruningException:
-            self.set_pos_info(node[3], start, len(self.f.getvalue()))
+            self.set_pos_info(node[3], start, self.f.tell())
             self.prune()
 
     def n_return(self, node):
-        start = len(self.f.getvalue()) + len(self.indent)
+        start = self.f.tell() + len(self.indent)
         if self.params["is_lambda"]:
             self.preorder(node[0])
             if hasattr(node[-1], "offset"):
-                self.set_pos_info(node[-1], start, len(self.f.getvalue()))
+                self.set_pos_info(node[-1], start, self.f.tell())
             self.prune()
         else:
-            start = len(self.f.getvalue()) + len(self.indent)
+            start = self.f.tell() + len(self.indent)
             self.write(self.indent, "return")
             if self.return_none or node != SyntaxTree(
                 "return", [SyntaxTree("return_expr", [NONE]), Token("RETURN_VALUE")]
             ):
                 self.write(" ")
-                self.last_finish = len(self.f.getvalue())
+                self.last_finish = self.f.tell()
                 self.preorder(node[0])
                 if hasattr(node[-1], "offset"):
-                    self.set_pos_info(node[-1], start, len(self.f.getvalue()))
+                    self.set_pos_info(node[-1], start, self.f.tell())
                     pass
                 pass
             else:
                 for n in node:
-                    self.set_pos_info_recurse(n, start, len(self.f.getvalue()))
+                    self.set_pos_info_recurse(n, start, self.f.tell())
                     pass
                 pass
-            self.set_pos_info(node, start, len(self.f.getvalue()))
+            self.set_pos_info(node, start, self.f.tell())
             self.println()
             self.prune()  # stop recursing
 
     def n_return_if_stmt(self, node):
-        start = len(self.f.getvalue()) + len(self.indent)
+        start = self.f.tell() + len(self.indent)
         if self.params["is_lambda"]:
             node[0].parent = node
             self.preorder(node[0])
         else:
-            start = len(self.f.getvalue()) + len(self.indent)
+            start = self.f.tell() + len(self.indent)
             self.write(self.indent, "return")
             if self.return_none or node != SyntaxTree(
                 "return", [SyntaxTree("return_expr", [NONE]), Token("RETURN_END_IF")]
@@ -358,54 +418,54 @@ class FragmentsWalker(SourceWalker, object):
                 self.write(" ")
                 self.preorder(node[0])
                 if hasattr(node[-1], "offset"):
-                    self.set_pos_info(node[-1], start, len(self.f.getvalue()))
+                    self.set_pos_info(node[-1], start, self.f.tell())
             self.println()
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         self.prune()  # stop recursing
 
     def n_yield(self, node):
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         try:
             super(FragmentsWalker, self).n_yield(node)
         except GenericASTTraversalPruningException:
             pass
         if node != SyntaxTree("yield", [NONE, Token("YIELD_VALUE")]):
             node[0].parent = node
-        self.set_pos_info(node[-1], start, len(self.f.getvalue()))
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node[-1], start, self.f.tell())
+        self.set_pos_info(node, start, self.f.tell())
         self.prune()  # stop recursing
 
     # In Python 3.3+ only
     def n_yield_from(self, node):
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         try:
             super(FragmentsWalker, self).n_yield(node)
         except GenericASTTraversalPruningException:
             pass
         self.preorder(node[0])
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         self.prune()  # stop recursing
 
     def n_buildslice3(self, node):
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         try:
             super(FragmentsWalker, self).n_buildslice3(node)
         except GenericASTTraversalPruningException:
             pass
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         self.prune()  # stop recursing
 
     def n_buildslice2(self, node):
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         try:
             super(FragmentsWalker, self).n_buildslice2(node)
         except GenericASTTraversalPruningException:
             pass
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         self.prune()  # stop recursing
 
     def n_expr(self, node):
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         p = self.prec
         if node[0].kind.startswith("bin_op"):
             n = node[0][-1][0]
@@ -414,53 +474,53 @@ class FragmentsWalker(SourceWalker, object):
         self.prec = PRECEDENCE.get(n.kind, -2)
         if n == "LOAD_CONST" and repr(n.pattr)[0] == "-":
             n.parent = node
-            self.set_pos_info(n, start, len(self.f.getvalue()))
+            self.set_pos_info(n, start, self.f.tell())
             self.prec = 6
         if p < self.prec:
             self.write("(")
             node[0].parent = node
-            self.last_finish = len(self.f.getvalue())
+            self.last_finish = self.f.tell()
             self.preorder(node[0])
-            finish = len(self.f.getvalue())
+            finish = self.f.tell()
             if hasattr(node[0], "offset"):
-                self.set_pos_info(node[0], start, len(self.f.getvalue()))
+                self.set_pos_info(node[0], start, self.f.tell())
             self.write(")")
             self.last_finish = finish + 1
         else:
             node[0].parent = node
-            start = len(self.f.getvalue())
+            start = self.f.tell()
             self.preorder(node[0])
             if hasattr(node[0], "offset"):
-                self.set_pos_info(node[0], start, len(self.f.getvalue()))
+                self.set_pos_info(node[0], start, self.f.tell())
         self.prec = p
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         self.prune()
 
     def n_return_expr(self, node):
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         super(FragmentsWalker, self).n_return_expr(node)
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
 
     def n_bin_op(self, node):
         """bin_op (formerly "binary_expr") is the Python AST BinOp"""
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         for n in node:
             n.parent = node
-        self.last_finish = len(self.f.getvalue())
+        self.last_finish = self.f.tell()
         try:
             super(FragmentsWalker, self).n_bin_op(node)
         except GenericASTTraversalPruningException:
             pass
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         self.prune()
 
     def n_LOAD_CONST(self, node):
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         try:
             super(FragmentsWalker, self).n_LOAD_CONST(node)
         except GenericASTTraversalPruningException:
             pass
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         self.prune()
 
     n_LOAD_STR = n_LOAD_CONST
@@ -470,13 +530,13 @@ class FragmentsWalker(SourceWalker, object):
         exec_stmt ::= expr exprlist DUP_TOP EXEC_STMT
         exec_stmt ::= expr exprlist EXEC_STMT
         """
-        start = len(self.f.getvalue()) + len(self.indent)
+        start = self.f.tell() + len(self.indent)
         try:
             super(FragmentsWalker, self).n_exec_stmt(node)
         except GenericASTTraversalPruningException:
             pass
-        self.set_pos_info(node, start, len(self.f.getvalue()))
-        self.set_pos_info(node[-1], start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
+        self.set_pos_info(node[-1], start, self.f.tell())
         self.prune()  # stop recursing
 
     def n_ifelsestmtr(self, node):
@@ -498,7 +558,7 @@ class FragmentsWalker(SourceWalker, object):
             self.default(node)
             return
 
-        start = len(self.f.getvalue()) + len(self.indent)
+        start = self.f.tell() + len(self.indent)
         self.write(self.indent, "if ")
         self.preorder(node[0])
         self.println(":")
@@ -536,7 +596,7 @@ class FragmentsWalker(SourceWalker, object):
             self.indent_more()
         node[2][1].parent = node
         self.preorder(node[2][1])
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         self.indent_less()
         self.prune()
 
@@ -549,7 +609,7 @@ class FragmentsWalker(SourceWalker, object):
                 self.default(node)
                 return
 
-        start = len(self.f.getvalue() + self.indent)
+        start = self.f.tell() + len(self.indent)
         self.write(self.indent, "elif ")
         node[0].parent = node
         self.preorder(node[0])
@@ -568,11 +628,11 @@ class FragmentsWalker(SourceWalker, object):
         node[2][1].parent = node
         self.preorder(node[2][1])
         self.indent_less()
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         self.prune()
 
     def n_alias(self, node):
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         iname = node[0].pattr
 
         store_import_node = node[-1][-1]
@@ -580,32 +640,32 @@ class FragmentsWalker(SourceWalker, object):
 
         sname = store_import_node.pattr
         self.write(iname)
-        finish = len(self.f.getvalue())
+        finish = self.f.tell()
         if iname == sname or iname.startswith(sname + "."):
             self.set_pos_info_recurse(node, start, finish)
         else:
             self.write(" as ")
-            sname_start = len(self.f.getvalue())
+            sname_start = self.f.tell()
             self.write(sname)
-            finish = len(self.f.getvalue())
+            finish = self.f.tell()
             for n in node[-1]:
                 self.set_pos_info_recurse(n, sname_start, finish)
             self.set_pos_info(node, start, finish)
         self.prune()  # stop recursing
 
     def n_mkfunc(self, node):
-        start = len(self.f.getvalue())
+        start = self.f.tell()
 
         code_node = find_code_node(node, -2)
         func_name = code_node.attr.co_name
         self.write(func_name)
-        self.set_pos_info(code_node, start, len(self.f.getvalue()))
+        self.set_pos_info(code_node, start, self.f.tell())
 
         self.indent_more()
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         self.make_function(node, is_lambda=False, code_node=code_node)
 
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
 
         if len(self.param_stack) > 1:
             self.write("\n\n")
@@ -686,16 +746,16 @@ class FragmentsWalker(SourceWalker, object):
         else:
             iter_var_index = iter_index - 1
         self.write(" for ")
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         store = ast[iter_var_index]
         self.preorder(store)
-        self.set_pos_info(ast[iter_index - 1], start, len(self.f.getvalue()))
+        self.set_pos_info(ast[iter_index - 1], start, self.f.tell())
         self.write(" in ")
-        start = len(self.f.getvalue())
+        start = self.f.tell()
 
         node[-3].parent = node
         self.preorder(node[-3])
-        self.set_pos_info(node[-3], start, len(self.f.getvalue()))
+        self.set_pos_info(node[-3], start, self.f.tell())
 
         if node[2] == "expr":
             iter_expr = node[2]
@@ -704,10 +764,10 @@ class FragmentsWalker(SourceWalker, object):
         assert iter_expr == "expr"
         iter_expr.parent = node
         self.preorder(iter_expr)
-        self.set_pos_info(iter_expr, start, len(self.f.getvalue()))
-        start = len(self.f.getvalue())
+        self.set_pos_info(iter_expr, start, self.f.tell())
+        start = self.f.tell()
         self.preorder(ast[iter_index])
-        self.set_pos_info(ast[iter_index], start, len(self.f.getvalue()))
+        self.set_pos_info(ast[iter_index], start, self.f.tell())
         self.prec = p
 
     def comprehension_walk3(self, node, iter_index, code_index=-5):
@@ -795,23 +855,23 @@ class FragmentsWalker(SourceWalker, object):
         # for the dummy argument.
 
         self.preorder(n[0])
-        gen_start = len(self.f.getvalue()) + 1
+        gen_start = self.f.tell() + 1
         self.write(" for ")
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         if comp_store:
             self.preorder(comp_store)
         else:
             self.preorder(store)
 
-        self.set_pos_info(store, start, len(self.f.getvalue()))
+        self.set_pos_info(store, start, self.f.tell())
 
         # FIXME this is all merely approximate
         # from trepan.api import debug; debug()
         self.write(" in ")
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         node[-3].parent = node
         self.preorder(node[-3])
-        fin = len(self.f.getvalue())
+        fin = self.f.tell()
         self.set_pos_info(node[-3], start, fin, old_name)
 
         if ast == "list_comp":
@@ -834,7 +894,7 @@ class FragmentsWalker(SourceWalker, object):
         self.prec = p
         self.name = old_name
         if node[-1].kind.startswith("CALL_FUNCTION"):
-            self.set_pos_info(node[-1], gen_start, len(self.f.getvalue()))
+            self.set_pos_info(node[-1], gen_start, self.f.tell())
 
     def listcomprehension_walk2(self, node):
         """List comprehensions the way they are done in Python 2 (and
@@ -882,35 +942,35 @@ class FragmentsWalker(SourceWalker, object):
 
         self.preorder(n[0])
         self.write(" for ")
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         self.preorder(store)
-        self.set_pos_info(store, start, len(self.f.getvalue()))
+        self.set_pos_info(store, start, self.f.tell())
         self.write(" in ")
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         node[-3].parent = node
         self.preorder(collection)
-        self.set_pos_info(collection, start, len(self.f.getvalue()))
+        self.set_pos_info(collection, start, self.f.tell())
         if list_if:
-            start = len(self.f.getvalue())
+            start = self.f.tell()
             self.preorder(list_if)
-            self.set_pos_info(list_if, start, len(self.f.getvalue()))
+            self.set_pos_info(list_if, start, self.f.tell())
 
         self.prec = p
 
     def n_generator_exp(self, node):
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         self.write("(")
         code_index = -6 if self.version >= (3, 3) else -5
         self.comprehension_walk(node, iter_index=4, code_index=code_index)
         self.write(")")
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         self.prune()
 
     def n_set_comp(self, node):
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         self.write("{")
         if node[0] in ["LOAD_SETCOMP", "LOAD_DICTCOMP"]:
-            start = len(self.f.getvalue())
+            start = self.f.tell()
             self.set_pos_info(node[0], start - 1, start)
             self.comprehension_walk3(node, 1, 0)
         elif node[0].kind == "load_closure":
@@ -918,27 +978,27 @@ class FragmentsWalker(SourceWalker, object):
         else:
             self.comprehension_walk(node, iter_index=4)
         self.write("}")
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         self.prune()
 
     # FIXME: Not sure if below is general. Also, add dict_comp_func.
     # 'set_comp_func': ("%|lambda %c: {%c for %c in %c%c}\n", 1, 3, 3, 1, 4)
     def n_set_comp_func(self, node):
-        setcomp_start = len(self.f.getvalue())
+        setcomp_start = self.f.tell()
         self.write(self.indent, "lambda ")
         param_node = node[1]
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         self.preorder(param_node)
-        self.set_pos_info(node[0], start, len(self.f.getvalue()))
+        self.set_pos_info(node[0], start, self.f.tell())
         self.write(": {")
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         assert node[0].kind.startswith("BUILD_SET")
         self.set_pos_info(node[0], start - 1, start)
         store = node[3]
         assert store == "store"
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         self.preorder(store)
-        fin = len(self.f.getvalue())
+        fin = self.f.tell()
         self.set_pos_info(store, start, fin)
         for_iter_node = node[2]
         assert for_iter_node.kind == "FOR_ITER"
@@ -947,11 +1007,11 @@ class FragmentsWalker(SourceWalker, object):
         self.preorder(store)
         self.write(" in ")
         self.preorder(param_node)
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         self.preorder(node[4])
-        self.set_pos_info(node[4], start, len(self.f.getvalue()))
+        self.set_pos_info(node[4], start, self.f.tell())
         self.write("}")
-        fin = len(self.f.getvalue())
+        fin = self.f.tell()
         self.set_pos_info(node, setcomp_start, fin)
         if node[-2] == "RETURN_VALUE":
             self.set_pos_info(node[-2], setcomp_start, fin)
@@ -964,7 +1024,7 @@ class FragmentsWalker(SourceWalker, object):
             self.listcomprehension_walk2(node)
         else:
             if node[0] == "LOAD_LISTCOMP":
-                start = len(self.f.getvalue())
+                start = self.f.tell()
                 self.set_pos_info(node[0], start - 1, start)
             self.comprehension_walk_newer(node, 1, 0)
         self.write("]")
@@ -1019,17 +1079,17 @@ class FragmentsWalker(SourceWalker, object):
 
         self.preorder(n[0])
         self.write(" for ")
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         self.preorder(store)
-        self.set_pos_info(store, start, len(self.f.getvalue()))
+        self.set_pos_info(store, start, self.f.tell())
         self.write(" in ")
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         self.preorder(collection)
-        self.set_pos_info(collection, start, len(self.f.getvalue()))
+        self.set_pos_info(collection, start, self.f.tell())
         if list_if:
-            start = len(self.f.getvalue())
+            start = self.f.tell()
             self.preorder(list_if)
-            self.set_pos_info(list_if, start, len(self.f.getvalue()))
+            self.set_pos_info(list_if, start, self.f.tell())
         self.prec = p
 
     def n_classdef(self, node):
@@ -1045,7 +1105,7 @@ class FragmentsWalker(SourceWalker, object):
                 buildclass = node[0]
 
             if buildclass[0] == "LOAD_BUILD_CLASS":
-                start = len(self.f.getvalue())
+                start = self.f.tell()
                 self.set_pos_info(buildclass[0], start, start + len("class") + 2)
 
             assert "mkfunc" == buildclass[1]
@@ -1101,7 +1161,7 @@ class FragmentsWalker(SourceWalker, object):
             self.write("\n\n")
 
         self.currentclass = str(currentclass)
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         self.write(self.indent, "class ", self.currentclass)
 
         if self.version >= (3, 1):
@@ -1116,7 +1176,7 @@ class FragmentsWalker(SourceWalker, object):
         self.indent_less()
 
         self.currentclass = cclass
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
         if len(self.param_stack) > 1:
             self.write("\n\n")
         else:
@@ -1147,7 +1207,12 @@ class FragmentsWalker(SourceWalker, object):
             self.println(self.indent, "pass")
         else:
             self.customize(customize)
+            # The source of a code object is not placed in the text of
+            # the code that contains it.
+            frame = self.frame
+            self.frame = None
             self.text = self.traverse(ast, is_lambda=is_lambda)
+            self.frame = frame
         self.name = old_name
         self.return_none = rn
 
@@ -1163,6 +1228,7 @@ class FragmentsWalker(SourceWalker, object):
         # FIXME: DRY with pysource.py
 
         # assert isinstance(tokens[0], Token)
+        self.ensure_parser()
 
         if is_lambda:
             for t in tokens:
@@ -1177,7 +1243,7 @@ class FragmentsWalker(SourceWalker, object):
                 p_insts = self.p.insts
                 self.p.insts = self.scanner.insts
                 self.p.offset2inst_index = self.scanner.offset2inst_index
-                ast = parse(self.p, tokens, customize, code)
+                ast = parse(self.p, tokens, customize, code, self.profiler)
                 self.customize(customize)
                 self.p.insts = p_insts
 
@@ -1219,15 +1285,14 @@ class FragmentsWalker(SourceWalker, object):
             self.p.insts = self.scanner.insts
             self.p.offset2inst_index = self.scanner.offset2inst_index
             self.p.opc = self.scanner.opc
-            ast = parse(self.p, tokens, customize, code)
+            ast = parse(self.p, tokens, customize, code, self.profiler)
             self.p.insts = p_insts
         except (ParserError, AssertionError) as e:
             raise ParserError(e, tokens, {})
 
-        checker(ast, False, self.ast_errors)
-
         self.customize(customize)
         transform_tree = self.treeTransform.transform(ast, code)
+        self.ast_errors.extend(transform_tree.info.errors)
 
         maybe_show_tree(self, ast)
 
@@ -1264,23 +1329,6 @@ class FragmentsWalker(SourceWalker, object):
 
         return
 
-    # FIXME: revise to do *once* over the entire tree.
-    # So here we should just mark that the subtree
-    # needs offset adjustment.
-    def fixup_offsets(self, new_start, node):
-        """Adjust all offsets under node"""
-        if hasattr(node, "start"):
-            node.start += new_start
-            node.finish += new_start
-        for n in node:
-            if hasattr(n, "offset"):
-                if hasattr(n, "start"):
-                    n.start += new_start
-                    n.finish += new_start
-            else:
-                self.fixup_offsets(new_start, n)
-        return
-
     def set_pos_info_recurse(self, node, start, finish, parent=None):
         """Set positions under node"""
         self.set_pos_info(node, start, finish)
@@ -1297,11 +1345,15 @@ class FragmentsWalker(SourceWalker, object):
         return
 
     def node_append(self, before_str, node_text, node):
+        """Write `node_text`, the text that the last call to traverse()
+        gave for `node`, after `before_str`."""
         self.write(before_str)
-        self.last_finish = len(self.f.getvalue())
-        self.fixup_offsets(self.last_finish, node)
+        self.last_finish = self.f.tell()
+        # Positions under `node` are relative to the text's frame, so
+        # placing the frame places them all.
+        self.last_frame.base = self.last_finish
         self.write(node_text)
-        self.last_finish = len(self.f.getvalue())
+        self.last_finish = self.f.tell()
 
     # FIXME: duplicated from pysource, since we don't find self.params
     def traverse(self, node, indent=None, is_lambda=False):
@@ -1310,18 +1362,27 @@ class FragmentsWalker(SourceWalker, object):
         self.param_stack.append(self.params)
         if indent is None:
             indent = self.indent
+        f = self.f
+        if not isinstance(f, OutputBuffer):
+            f = OutputBuffer()
         p = self.pending_newlines
         self.pending_newlines = 0
+        f.mark()
+        frame = self.frame
+        self.frame = TextFrame(frame)
         self.params = {
             "_globals": {},
-            "f": StringIO(),
+            "f": f,
             "indent": indent,
             "is_lambda": is_lambda,
         }
-        self.preorder(node)
-        self.f.write("\n" * self.pending_newlines)
-
-        text = self.f.getvalue()
+        try:
+            self.preorder(node)
+            f.write("\n" * self.pending_newlines)
+        finally:
+            text = f.take()
+            self.last_frame = self.frame
+            self.frame = frame
         self.last_finish = len(text)
 
         self.params = self.param_stack.pop()
@@ -1458,7 +1519,7 @@ class FragmentsWalker(SourceWalker, object):
         if not (node == "build_list"):
             return
 
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         self.write("(")
         line_separator = ", "
         sep = ""
@@ -1469,12 +1530,12 @@ class FragmentsWalker(SourceWalker, object):
             sep = line_separator
 
         self.write(")")
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
 
     def print_super_classes3(self, node):
         # FIXME: wrap superclasses onto a node
         # as a custom rule
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         n = len(node) - 1
         j = 0
         if node.kind != "expr":
@@ -1558,7 +1619,7 @@ class FragmentsWalker(SourceWalker, object):
             pass
 
         self.write(")")
-        self.set_pos_info(node, start, len(self.f.getvalue()))
+        self.set_pos_info(node, start, self.f.tell())
 
     def n_dict(self, node):
         """
@@ -1571,7 +1632,7 @@ class FragmentsWalker(SourceWalker, object):
         self.indent_more(INDENT_PER_LEVEL)
         line_seperator = ",\n" + self.indent
         sep = INDENT_PER_LEVEL[:-1]
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         if node[0] != "dict_entry":
             self.write("{")
         self.set_pos_info(node[0], start, start + 1)
@@ -1611,7 +1672,7 @@ class FragmentsWalker(SourceWalker, object):
                 while i < len(ll):
                     ll[i].parent = kv_node
                     ll[i + 1].parent = kv_node
-                    key_start = len(self.f.getvalue()) + len(sep)
+                    key_start = self.f.tell() + len(sep)
                     name = self.traverse(ll[i + 1], indent="")
                     key_finish = key_start + len(name)
                     val_start = key_finish + 2
@@ -1718,7 +1779,7 @@ class FragmentsWalker(SourceWalker, object):
 
                 pass
         self.write("}")
-        finish = len(self.f.getvalue())
+        finish = self.f.tell()
         self.set_pos_info(node, start, finish)
         self.indent_less(INDENT_PER_LEVEL)
         self.prec = p
@@ -1732,7 +1793,7 @@ class FragmentsWalker(SourceWalker, object):
         self.prec = PRECEDENCE["yield"] - 1
         n = node.pop()
         lastnode = n.kind
-        start = len(self.f.getvalue())
+        start = self.f.tell()
         if lastnode.startswith("BUILD_LIST"):
             self.write("[")
             endchar = "]"
@@ -1781,7 +1842,7 @@ class FragmentsWalker(SourceWalker, object):
         if len(node) == 1 and lastnode.startswith("BUILD_TUPLE"):
             self.write(",")
         self.write(endchar)
-        finish = len(self.f.getvalue())
+        finish = self.f.tell()
         n.parent = node.parent
         self.set_pos_info(n, start, finish)
         self.set_pos_info(node, start, finish)
@@ -1803,35 +1864,31 @@ class FragmentsWalker(SourceWalker, object):
         # print(entry[0])
         # print('======')
 
-        startnode_start = len(self.f.getvalue())
+        startnode_start = self.f.tell()
         start = startnode_start
 
-        fmt = entry[0]
+        steps, tail = compile_template(entry[0])
         arg = 1
-        i = 0
 
         lastC = -1
         recurse_node = False
 
-        m = escape.search(fmt)
-        while m:
-            i = m.end()
-            self.write(m.group("prefix"))
+        for prefix, typ, child, expr, code in steps:
+            self.write(prefix)
 
-            typ = m.group("type") or "{"
             node = startnode
             try:
-                if m.group("child"):
-                    node = node[int(m.group("child"))]
+                if child is not None:
+                    node = node[child]
                     node.parent = startnode
             except Exception:
                 print(node.__dict__)
                 raise
 
             if typ == "%":
-                start = len(self.f.getvalue())
+                start = self.f.tell()
                 self.write("%")
-                self.set_pos_info(node, start, len(self.f.getvalue()))
+                self.set_pos_info(node, start, self.f.tell())
 
             elif typ == "+":
                 self.indent_more()
@@ -1846,11 +1903,11 @@ class FragmentsWalker(SourceWalker, object):
                 if lastC == 1:
                     self.write(",")
             elif typ == "b":
-                finish = len(self.f.getvalue())
+                finish = self.f.tell()
                 self.set_pos_info(node[entry[arg]], start, finish)
                 arg += 1
             elif typ == "c":
-                start = len(self.f.getvalue())
+                start = self.f.tell()
 
                 index = entry[arg]
                 if isinstance(index, tuple):
@@ -1885,7 +1942,7 @@ class FragmentsWalker(SourceWalker, object):
                 )
                 self.preorder(node[index])
 
-                finish = len(self.f.getvalue())
+                finish = self.f.tell()
                 self.set_pos_info(node, start, finish)
                 arg += 1
             elif typ == "p":
@@ -1914,22 +1971,22 @@ class FragmentsWalker(SourceWalker, object):
                     (index, self.prec) = entry[arg]
 
                 node[index].parent = node
-                start = len(self.f.getvalue())
+                start = self.f.tell()
                 self.preorder(node[index])
-                self.set_pos_info(node, start, len(self.f.getvalue()))
+                self.set_pos_info(node, start, self.f.tell())
                 self.prec = p
                 arg += 1
             elif typ == "C":
                 low, high, sep = entry[arg]
                 lastC = remaining = len(node[low:high])
-                start = len(self.f.getvalue())
+                start = self.f.tell()
                 for subnode in node[low:high]:
                     self.preorder(subnode)
                     remaining -= 1
                     if remaining > 0:
                         self.write(sep)
 
-                self.set_pos_info(node, start, len(self.f.getvalue()))
+                self.set_pos_info(node, start, self.f.tell())
                 arg += 1
             elif typ == "D":
                 low, high, sep = entry[arg]
@@ -1966,8 +2023,9 @@ class FragmentsWalker(SourceWalker, object):
                 arg += 1
 
             elif typ == "{":
-                d = node.__dict__
-                expr = m.group("expr")
+                d = (
+                    node.attributes() if isinstance(node, Token) else node.__dict__
+                )
 
                 # Line mapping stuff
                 if (
@@ -1978,17 +2036,16 @@ class FragmentsWalker(SourceWalker, object):
                     self.source_linemap[self.current_line_number] = node.linestart
                 # Additional fragment-position stuff
                 try:
-                    start = len(self.f.getvalue())
-                    self.write(eval(expr, d, d))
-                    self.set_pos_info(node, start, len(self.f.getvalue()))
+                    start = self.f.tell()
+                    self.write(eval(code, d, d))
+                    self.set_pos_info(node, start, self.f.tell())
                 except Exception:
                     print(node)
                     raise
-            m = escape.search(fmt, i)
             pass
 
-        self.write(fmt[i:])
-        fin = len(self.f.getvalue())
+        self.write(tail)
+        fin = self.f.tell()
         if recurse_node:
             self.set_pos_info_recurse(startnode, startnode_start, fin)
         else:
@@ -2086,11 +2143,15 @@ def code_deparse(
 
     # store final output stream for case of error
     scanner = get_scanner(version, is_pypy=is_pypy, show_asm=debug_opts["asm"])
+    # Code objects are ingested more than once while we deparse.
+    scanner.token_cache = TokenCache()
 
     show_asm = debug_opts.get("asm", None)
-    tokens, customize = scanner.ingest(co, code_objects=code_objects, show_asm=show_asm)
+    tokens, customize = scanner.cached_ingest(
+        co, code_objects=code_objects, show_asm=show_asm
+    )
 
-    tokens, customize = scanner.ingest(co)
+    tokens, customize = scanner.cached_ingest(co)
 
     if start_offset > 0:
         for i, t in enumerate(tokens):
@@ -2129,52 +2190,59 @@ def code_deparse(
         linestarts=linestarts,
     )
 
-    is_top_level_module = co.co_name == "<module>"
-    deparsed.ast = deparsed.build_ast(
-        tokens, customize, co, is_top_level_module=is_top_level_module
-    )
+    try:
+        is_top_level_module = co.co_name == "<module>"
+        deparsed.ast = deparsed.build_ast(
+            tokens, customize, co, is_top_level_module=is_top_level_module
+        )
 
-    assert deparsed.ast == "stmts", "Should have parsed grammar start"
+        assert deparsed.ast == "stmts", "Should have parsed grammar start"
 
-    # save memory
-    del tokens
+        # save memory
+        del tokens
 
-    # convert leading '__doc__ = "..." into doc string
-    assert deparsed.ast == "stmts"
+        # convert leading '__doc__ = "..." into doc string
+        assert deparsed.ast == "stmts"
 
-    (deparsed.mod_globs, _) = find_globals_and_nonlocals(
-        deparsed.ast, set(), set(), co, version
-    )
+        _, deparsed.mod_globs, _ = find_tree_globals(deparsed.ast, co, version)
 
-    # Just when you think we've forgotten about what we
-    # were supposed to do: Generate source from the Syntax tree!
-    deparsed.gen_source(deparsed.ast, co.co_name, customize)
+        # Just when you think we've forgotten about what we
+        # were supposed to do: Generate source from the Syntax tree!
+        deparsed.gen_source(deparsed.ast, co.co_name, customize)
 
-    deparsed.set_pos_info(deparsed.ast, 0, len(deparsed.text))
-    deparsed.fixup_parents(deparsed.ast, None)
+        deparsed.set_pos_info(deparsed.ast, 0, len(deparsed.text))
+        deparsed.resolve_positions()
+        deparsed.fixup_parents(deparsed.ast, None)
 
-    for g in sorted(deparsed.mod_globs):
-        deparsed.write("# global %s ## Warning: Unused global\n" % g)
+        for g in sorted(deparsed.mod_globs):
+            deparsed.write("# global %s ## Warning: Unused global\n" % g)
 
-    if deparsed.ast_errors:
-        deparsed.write("# NOTE: have decompilation errors.\n")
-        deparsed.write("# Use -t option to show full context.")
-        for err in deparsed.ast_errors:
-            deparsed.write(err)
-        deparsed.ERROR = True
+        if deparsed.ast_errors:
+            deparsed.write("# NOTE: have decompilation errors.\n")
+            deparsed.write("# Use -t option to show full context.")
+            for err in deparsed.ast_errors:
+                deparsed.write(err)
+            deparsed.ERROR = True
 
-    if deparsed.ERROR:
-        raise deparsed.ERROR
+        if deparsed.ERROR:
+            raise deparsed.ERROR
 
-    # To keep the API consistent with previous releases, convert
-    # deparse.offset values into NodeInfo items
-    for tup, node in deparsed.offsets.items():
-        deparsed.offsets[tup] = NodeInfo(
-            node=node, start=node.start, finish=node.finish
-        )
+        # To keep the API consistent with previous releases, convert
+        # deparse.offset values into NodeInfo items
+        for tup, node in deparsed.offsets.items():
+            deparsed.offsets[tup] = NodeInfo(
+                node=node, start=node.start, finish=node.finish
+            )
 
-    deparsed.scanner = scanner
-    return deparsed
+        deparsed.scanner = scanner
+        return deparsed
+    except BaseException:
+        # The walker is lost to the caller, so its parser can go back
+        # to the pool. Callers done with a walker we return check it in.
+        deparsed.checkin_parser()
+        raise
+    finally:
+        scanner.token_cache = None
 
 
 def find_gt(a, x):
@@ -2185,6 +2253,42 @@ def find_gt(a, x):
     raise ValueError
 
 
+class OffsetIndex:
+    """
+    A bisectable index of the instruction offsets that a fragment-deparsed
+    object `deparsed` has nodes for, built for each code-object name the
+    first time it is asked about.
+    """
+
+    def __init__(self, deparsed):
+        self.deparsed = deparsed
+        self.offset_lists = {}
+
+    def offset_list(self, name: str) -> list:
+        offset_list = self.offset_lists.get(name)
+        if offset_list is None:
+            offset_list = sorted(
+                offset
+                for code_name, offset in self.deparsed.offsets
+                if code_name == name and isinstance(offset, int)
+            )
+            self.offset_lists[name] = offset_list
+        return offset_list
+
+    def find(self, name: str, offset: int) -> Optional[NodeInfo]:
+        """Return the NodeInfo for `offset` in code object `name`, or, if
+        `offset` has no node, for the closest offset after it. Return None
+        if there is neither."""
+        node_info = self.deparsed.offsets.get((name, offset))
+        if node_info is not None:
+            return node_info
+        try:
+            found_offset = find_gt(self.offset_list(name), offset)
+        except ValueError:
+            return None
+        return self.deparsed.offsets[name, found_offset]
+
+
 def code_deparse_around_offset(
     name,
     offset,
@@ -2211,15 +2315,129 @@ def code_deparse_around_offset(
         # This is the easy case
         return deparsed
 
-    valid_offsets = [t for t in deparsed.offsets if isinstance(t[1], int)]
-    offset_list = sorted([t[1] for t in valid_offsets if t[0] == name])
-
     # FIXME: should check for branching?
-    found_offset = find_gt(offset_list, offset)
-    deparsed.offsets[name, offset] = deparsed.offsets[name, found_offset]
+    node_info = OffsetIndex(deparsed).find(name, offset)
+    if node_info is None:
+        raise ValueError
+    deparsed.offsets[name, offset] = node_info
     return deparsed
 
 
+# Code objects which are deparsed as part of the code that creates them,
+# rather than on their own.
+INLINE_CODE_NAMES = frozenset(
+    ("<lambda>", "<genexpr>", "<listcomp>", "<setcomp>", "<dictcomp>")
+)
+
+# The maximum number of code objects for which fragment_map() keeps
+# fragment maps.
+MAX_SAVED_FRAGMENT_MAPS = 50
+
+# Fragment maps that fragment_map() has made, keyed by code digest,
+# Python version and is_pypy, in least-recently-used order.
+fragment_maps = OrderedDict()
+
+
+class FragmentMap:
+    """
+    The fragment-deparsed source of code object `code`, which is
+    `deparsed`, with an index to look up the fragment for an offset.
+    """
+
+    def __init__(self, code, deparsed):
+        self.code = code
+        self.deparsed = deparsed
+        self.index = OffsetIndex(deparsed)
+
+    @property
+    def text(self) -> str:
+        return self.deparsed.text
+
+    def find(self, offset: int, name: Optional[str] = None) -> Optional[NodeInfo]:
+        """Return the NodeInfo for `offset` in the code object named
+        `name`, by default self.code, or for the closest offset after it.
+        Return None if there is neither."""
+        if name is None:
+            name = self.code.co_name
+        return self.index.find(name, offset)
+
+    def extract(
+        self, offset: int, name: Optional[str] = None
+    ) -> Optional[ExtractInfo]:
+        """Like find(), but return the text information for the node, as
+        FragmentsWalker.extract_node_info() gives it."""
+        node_info = self.find(offset, name)
+        if node_info is None:
+            return None
+        return self.deparsed.extract_node_info(node_info)
+
+
+def find_code_path(co, name: str) -> Optional[list]:
+    """Return the list of code objects from `co` down to the first code
+    object named `name` nested in it, or None if there isn't one."""
+    if co.co_name == name:
+        return [co]
+    for const in co.co_consts:
+        if iscode(const):
+            path = find_code_path(const, name)
+            if path is not None:
+                return [co] + path
+    return None
+
+
+def fragment_map(
+    co,
+    name: Optional[str] = None,
+    version: Optional[tuple] = None,
+    is_pypy: Optional[bool] = None,
+) -> FragmentMap:
+    """
+    Return a FragmentMap for the code object named `name` inside code
+    object `co`, or for `co` itself if `name` is None.
+
+    Only that code object is deparsed, not all of `co`. The exception is
+    a lambda, generator expression or comprehension, whose source is part
+    of the code that creates it; there the closest enclosing code object
+    that has source of its own is deparsed, and its FragmentMap is
+    returned. Use FragmentMap.find() with `name` to look up offsets in it.
+
+    For example, for the frame of a traceback:
+
+        fragment_map(frame.f_code).extract(frame.f_lasti)
+
+    Recently used maps are kept, keyed by the digest of the code object,
+    so asking again about the same code is cheap.
+    """
+    assert iscode(co)
+
+    if version is None:
+        version = PYTHON_VERSION_TRIPLE
+    if is_pypy is None:
+        is_pypy = IS_PYPY
+
+    if name is not None:
+        path = find_code_path(co, name)
+        if path is None:
+            raise ValueError(f"no code object named {name} in {co.co_name}")
+        while len(path) > 1 and path[-1].co_name in INLINE_CODE_NAMES:
+            path.pop()
+        co = path[-1]
+
+    key = (code_digest(co), version, is_pypy)
+    fmap = fragment_maps.get(key)
+    if fmap is not None:
+        fragment_maps.move_to_end(key)
+        return fmap
+
+    deparsed = code_deparse(co, StringIO(), version, is_pypy)
+    deparsed.checkin_parser()
+    fmap = FragmentMap(co, deparsed)
+    fragment_maps[key] = fmap
+    while len(fragment_maps) > MAX_SAVED_FRAGMENT_MAPS:
+        fragment_maps.popitem(last=False)
+    return fmap
+
+
 # Deprecated. Here still for compatibility
 def deparse_code_around_offset(
     name,
@@ -2363,7 +2581,7 @@ def deparsed_find(tup, deparsed, code):
 #     # deparse_test(get_code_for_fn(gcd))
 #     deparse_test(get_code_for_fn(get_dups))
 #     # deparse_test(get_code_for_fn(test))
-#     # deparse_test(get_code_for_fn(FragmentsWalker.fixup_offsets))
+#     # deparse_test(get_code_for_fn(FragmentsWalker.fixup_parents))
 #     # deparse_test(get_code_for_fn(FragmentsWalker.n_list))
 #     print("=" * 30)
 #     # deparse_test_around(408, 'n_list', get_code_for_fn(FragmentsWalker.n_build_list))
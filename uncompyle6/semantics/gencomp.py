@@ -21,7 +21,6 @@ from typing import Optional
 
 from xdis import co_flags_is_async, iscode
 
-from uncompyle6.parser import get_python_parser
 from uncompyle6.scanner import Code
 from uncompyle6.scanners.tok import Token
 from uncompyle6.semantics.consts import PRECEDENCE
@@ -147,13 +146,11 @@ class ComprehensionMixin:
         # encounter comprehensions of other kinds, and lambdas
         if is_lambda_mode(self.compile_mode):
             p_save = self.p
-            self.p = get_python_parser(
-                self.version,
-                compile_mode="exec",
-                is_pypy=self.is_pypy,
-            )
-            tree = self.build_ast(code._tokens, code._customize, code)
-            self.p = p_save
+            self.p = self.mode_parser("exec")
+            try:
+                tree = self.build_ast(code._tokens, code._customize, code)
+            finally:
+                self.p = p_save
         else:
             tree = self.build_ast(code._tokens, code._customize, code)
         self.customize(code._customize)
@@ -568,15 +565,13 @@ class ComprehensionMixin:
         # encounter comprehensions of other kinds, and lambdas
         if self.compile_mode in ("listcomp",):  # add other comprehensions to this list
             p_save = self.p
-            self.p = get_python_parser(
-                self.version,
-                compile_mode="exec",
-                is_pypy=self.is_pypy,
-            )
-            tree = self.build_ast(
-                code._tokens, code._customize, code, is_lambda=self.is_lambda
-            )
-            self.p = p_save
+            self.p = self.mode_parser("exec")
+            try:
+                tree = self.build_ast(
+                    code._tokens, code._customize, code, is_lambda=self.is_lambda
+                )
+            finally:
+                self.p = p_save
         else:
             tree = self.build_ast(
                 code._tokens, code._customize, code, is_lambda=self.is_lambda
@@ -15,7 +15,7 @@
 import sys
 
 from xdis import iscode
-from uncompyle6.parsers.treenode import SyntaxTree
+from uncompyle6.semantics.traversal import tree_tokens
 
 minint = -sys.maxsize-1
 maxint = sys.maxsize
@@ -47,10 +47,8 @@ def escape_string(s, quotes=('"', "'", '"""', "'''")):
 # above global ops
 def find_all_globals(node, globs):
     """Search Syntax Tree node to find variable names that are global."""
-    for n in node:
-        if isinstance(n, SyntaxTree):
-            globs = find_all_globals(n, globs)
-        elif n.kind in read_write_global_ops:
+    for n in tree_tokens(node):
+        if n.kind in read_write_global_ops:
             globs.add(n.pattr)
     return globs
 
@@ -81,11 +79,8 @@ def find_code_node(node, start):
 def find_globals_and_nonlocals(node, globs, nonlocals, code, version):
     """search a node of parse tree to find variable names that need a
     either 'global' or 'nonlocal' statements added."""
-    for n in node:
-        if isinstance(n, SyntaxTree):
-            globs, nonlocals = find_globals_and_nonlocals(n, globs, nonlocals,
-                                                          code, version)
-        elif n.kind in read_global_ops:
+    for n in tree_tokens(node):
+        if n.kind in read_global_ops:
             globs.add(n.pattr)
         elif (version >= (3, 0)
               and n.kind in nonglobal_ops
@@ -95,13 +90,20 @@ def find_globals_and_nonlocals(node, globs, nonlocals, code, version):
             nonlocals.add(n.pattr)
     return globs, nonlocals
 
+def find_tree_globals(tree, code, version) -> tuple:
+    """Return the sets of names that find_all_globals() and
+    find_globals_and_nonlocals() find in `tree`. For a tree that
+    TreeTransform has transformed, these were found while transforming
+    it, so we don't search the tree again."""
+    info = getattr(tree, "info", None)
+    if info is not None:
+        return set(info.all_globals), set(info.globals), set(info.nonlocals)
+    globs, nonlocals = find_globals_and_nonlocals(tree, set(), set(), code, version)
+    return find_all_globals(tree, set()), globs, nonlocals
+
 def find_none(node):
-    for n in node:
-        if isinstance(n, SyntaxTree):
-            if n not in ('return_stmt', 'return_if_stmt'):
-                if find_none(n):
-                    return True
-        elif n.kind == 'LOAD_CONST' and n.pattr is None:
+    for n in tree_tokens(node, skip=('return_stmt', 'return_if_stmt')):
+        if n.kind == 'LOAD_CONST' and n.pattr is None:
             return True
     return False
 
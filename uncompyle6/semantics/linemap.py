@@ -13,31 +13,75 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
+from bisect import bisect_right
+from typing import Optional
+
 from uncompyle6.semantics.fragments import (
     FragmentsWalker,
     code_deparse as fragments_code_deparse,
 )
+from uncompyle6.semantics.output import OutputBuffer
 from uncompyle6.semantics.pysource import SourceWalker, code_deparse
 
+# The version of the layout of the data that linemap_data() returns.
+LINEMAP_FORMAT_VERSION = 1
+
 
 # FIXME: does this handle nested code, and lambda properly
 class LineMapWalker(SourceWalker):
+    """
+    A SourceWalker that also records which line of the original source
+    each line of the decompiled source comes from.
+
+    source_linemap maps decompiled line numbers to original line numbers
+    for the whole of the source. code_linemaps has a map like that for
+    each code object, with only the lines that belong to the code object
+    itself and not to the code objects nested inside it. It is keyed by
+    the code object's (co_name, co_firstlineno).
+    """
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.source_linemap = {}
-        self.current_line_number = 1
-
-    def write(self, *data):
-        """Augment write routine to keep track of current line."""
-        for line in data:
-            # print(f"XXX write: '{line}'")
-            for i in str(line):
-                if i == "\n":
-                    self.current_line_number += 1
-                    pass
-                pass
-            pass
-        return super().write(*data)
+        self.code_linemaps = {}
+        # The maps in code_linemaps of the code objects whose source we
+        # are generating, innermost last.
+        self.linemap_stack = []
+
+    @property
+    def current_line_number(self) -> int:
+        """The line number in the decompiled source of the text we are
+        about to write."""
+        if isinstance(self.f, OutputBuffer):
+            return self.f.line_number() + self.pending_newlines
+        return 1
+
+    def add_line(self, source_line_number: int):
+        """Record that the current line comes from line
+        `source_line_number` of the original source."""
+        line_number = self.current_line_number
+        self.source_linemap[line_number] = source_line_number
+        if self.linemap_stack:
+            self.linemap_stack[-1][line_number] = source_line_number
+
+    def build_ast(self, tokens, customize, code, *args, **kwargs):
+        """Augment build_ast to note which code object a tree is for."""
+        tree = super().build_ast(tokens, customize, code, *args, **kwargs)
+        # Empty code gives a tree that is shared.
+        if len(tree) > 0:
+            tree.code_key = (code.co_name, getattr(code, "co_firstlineno", 0))
+        return tree
+
+    def gen_source(self, ast, name, customize, *args, **kwargs):
+        """Augment gen_source to collect the lines of each code object in
+        a map of their own."""
+        key = getattr(ast, "code_key", (name, 0))
+        self.linemap_stack.append(self.code_linemaps.setdefault(key, {}))
+        try:
+            return super().gen_source(ast, name, customize, *args, **kwargs)
+        finally:
+            self.linemap_stack.pop()
 
     # Note n_expr needs treatment too
 
@@ -45,13 +89,13 @@ class LineMapWalker(SourceWalker):
         """Augment default-write routine to record line number changes."""
         if hasattr(node, "linestart"):
             if node.linestart:
-                self.source_linemap[self.current_line_number] = node.linestart
+                self.add_line(node.linestart)
         return super().default(node)
 
     def n_LOAD_CONST(self, node):
         if hasattr(node, "linestart"):
             if node.linestart:
-                self.source_linemap[self.current_line_number] = node.linestart
+                self.add_line(node.linestart)
         return super().n_LOAD_CONST(node)
 
 
@@ -77,6 +121,86 @@ def code_deparse_with_map(*args, **kwargs):
     return code_deparse(*args, **kwargs)
 
 
+def linemap_data(deparsed, line_offset: int = 0) -> dict:
+    """
+    Return the line-number maps that LineMapWalker `deparsed` collected,
+    in a form that can be saved as JSON. Decompiled line numbers have
+    `line_offset` added to them, for the lines that come before the
+    decompiled source in the output file.
+
+    The result has the whole-source map under "lines", and the map for
+    each code object in the list under "code", ordered by the line the
+    code object starts on in the original source. Each map is a list of
+    [decompiled line, original line] pairs sorted by decompiled line.
+    """
+
+    def pairs(linemap: dict) -> list:
+        return [
+            [line_number + line_offset, linemap[line_number]]
+            for line_number in sorted(linemap)
+        ]
+
+    code = [
+        {"name": name, "firstlineno": firstlineno, "lines": pairs(linemap)}
+        for (name, firstlineno), linemap in sorted(
+            deparsed.code_linemaps.items(), key=lambda item: item[0][::-1]
+        )
+    ]
+    return {
+        "version": LINEMAP_FORMAT_VERSION,
+        "lines": pairs(deparsed.source_linemap),
+        "code": code,
+    }
+
+
+class LineMaps:
+    """
+    Line-number maps, as linemap_data() returns them, indexed for
+    looking up the decompiled lines for a line of the original source.
+    """
+
+    def __init__(self, data: dict):
+        if data.get("version") != LINEMAP_FORMAT_VERSION:
+            raise ValueError(f"unknown line map version {data.get('version')}")
+        self.data = data
+        self.lines = data["lines"]
+        # Pairs of (original line, decompiled line), sorted.
+        self.by_source_line = sorted(
+            (source_line, line) for line, source_line in self.lines
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LineMaps":
+        with open(path, encoding="utf-8") as fp:
+            return cls(json.load(fp))
+
+    def decompiled_lines(self, source_line: int) -> list:
+        """Return the decompiled lines that come from line `source_line`
+        of the original source. If there are none, use the next original
+        line that has decompiled lines."""
+        pairs = self.by_source_line
+        i = bisect_right(pairs, (source_line - 1, float("inf")))
+        if i == len(pairs):
+            return []
+        found = pairs[i][0]
+        lines = []
+        while i < len(pairs) and pairs[i][0] == found:
+            lines.append(pairs[i][1])
+            i += 1
+        return lines
+
+    def code_linemap(
+        self, name: str, firstlineno: Optional[int] = None
+    ) -> Optional[dict]:
+        """Return the map for the code object named `name` that starts on
+        line `firstlineno` of the original source, or the first code
+        object named `name` if `firstlineno` is None."""
+        for entry in self.data["code"]:
+            if entry["name"] == name and firstlineno in (None, entry["firstlineno"]):
+                return entry
+        return None
+
+
 def code_deparse_with_fragments_and_map(*args, **kwargs):
     """
     Like code_deparse_with_map but saves fragments.
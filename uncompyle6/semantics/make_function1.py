@@ -23,8 +23,7 @@ from uncompyle6.semantics.parser_error import ParserError
 from uncompyle6.parser import ParserError as ParserError2
 from uncompyle6.semantics.helper import (
     print_docstring,
-    find_all_globals,
-    find_globals_and_nonlocals,
+    find_tree_globals,
     find_none,
 )
 from xdis import iscode
@@ -169,11 +168,7 @@ def make_function1(self, node, is_lambda, nested=1, code_node=None):
     if not is_lambda:
         assert tree == "stmts"
 
-    all_globals = find_all_globals(tree, set())
-
-    globals, nonlocals = find_globals_and_nonlocals(
-        tree, set(), set(), code, self.version
-    )
+    all_globals, globals, nonlocals = find_tree_globals(tree, code, self.version)
 
     # Python 1 doesn't support the "nonlocal" statement
 
@@ -25,8 +25,7 @@ from xdis import code_has_star_arg, code_has_star_star_arg, iscode
 from uncompyle6.parser import ParserError as ParserError2
 from uncompyle6.scanner import Code
 from uncompyle6.semantics.helper import (
-    find_all_globals,
-    find_globals_and_nonlocals,
+    find_tree_globals,
     find_none,
     print_docstring,
 )
@@ -181,11 +180,7 @@ def make_function2(self, node, is_lambda, nested=1, code_node=None):
     if not is_lambda:
         assert ast == "stmts"
 
-    all_globals = find_all_globals(ast, set())
-
-    globals, nonlocals = find_globals_and_nonlocals(
-        ast, set(), set(), code, self.version
-    )
+    all_globals, globals, nonlocals = find_tree_globals(ast, code, self.version)
 
     # Python 2 doesn't support the "nonlocal" statement
     assert self.version >= (3, 0) or not nonlocals
@@ -22,8 +22,7 @@ from uncompyle6.parser import ParserError as ParserError2
 from uncompyle6.parsers.treenode import SyntaxTree
 from uncompyle6.scanner import Code
 from uncompyle6.semantics.helper import (
-    find_all_globals,
-    find_globals_and_nonlocals,
+    find_tree_globals,
     find_none,
     print_docstring,
 )
@@ -140,7 +139,7 @@ def make_function3_annotate(
     else:
         self.write("(")
 
-    last_line = self.f.getvalue().split("\n")[-1]
+    last_line = self.f.last_line()
     l = len(last_line)
     indent = " " * l
     line_number = self.line_number
@@ -281,10 +280,7 @@ def make_function3_annotate(
     code._tokens = None  # save memory
     assert ast == "stmts"
 
-    all_globals = find_all_globals(ast, set())
-    globals, nonlocals = find_globals_and_nonlocals(
-        ast, set(), set(), code, self.version
-    )
+    all_globals, globals, nonlocals = find_tree_globals(ast, code, self.version)
     for g in sorted((all_globals & self.mod_globs) | globals):
         self.println(self.indent, "global ", g)
     for nl in sorted(nonlocals):
@@ -640,10 +636,7 @@ def make_function3(self, node, is_lambda, nested=1, code_node=None):
 
     assert ast == "stmts"
 
-    all_globals = find_all_globals(ast, set())
-    globals, nonlocals = find_globals_and_nonlocals(
-        ast, set(), set(), code, self.version
-    )
+    all_globals, globals, nonlocals = find_tree_globals(ast, code, self.version)
 
     for g in sorted((all_globals & self.mod_globs) | globals):
         self.println(self.indent, "global ", g)
@@ -27,8 +27,7 @@ from xdis import (
 from uncompyle6.parser import ParserError as ParserError2
 from uncompyle6.scanner import Code
 from uncompyle6.semantics.helper import (
-    find_all_globals,
-    find_globals_and_nonlocals,
+    find_tree_globals,
     find_none,
 )
 from uncompyle6.semantics.parser_error import ParserError
@@ -337,10 +336,7 @@ def make_function36(self, node, is_lambda, nested=1, code_node=None):
 
     assert tree in ("stmts", "lambda_start")
 
-    all_globals = find_all_globals(tree, set())
-    globals, nonlocals = find_globals_and_nonlocals(
-        tree, set(), set(), code, self.version
-    )
+    all_globals, globals, nonlocals = find_tree_globals(tree, code, self.version)
 
     for g in sorted((all_globals & self.mod_globs) | globals):
         self.println(self.indent, "global ", g)
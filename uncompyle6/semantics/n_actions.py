@@ -779,7 +779,7 @@ class NonterminalActions:
         # then the first * has already been printed.
         # Until I have a better way to check for CALL_FUNCTION_VAR,
         # will assume that if the text ends in *.
-        last_was_star = self.f.getvalue().endswith("*")
+        last_was_star = self.f.endswith("*")
 
         if lastnodetype.endswith("UNPACK"):
             # FIXME: need to handle range of BUILD_LIST_UNPACK
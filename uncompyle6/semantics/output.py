@@ -0,0 +1,172 @@
+#  Copyright (c) 2026 by Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+The output buffer that the source walkers write source text into.
+"""
+
+from typing import Optional, TextIO
+
+# Number of characters an OutputBuffer collects before passing them on
+# to its output stream.
+FLUSH_SIZE = 64 * 1024
+
+
+class OutputBuffer:
+    """
+    Collects the source text written by a source walker as a list of
+    strings, which are joined only when the text is asked for.
+
+    Nested traversals share one buffer. SourceWalker.traverse() calls
+    mark() before writing the text for a node, and take() afterwards to
+    remove that text from the buffer and get it back as a string.
+    tell(), getvalue(), endswith() and last_line() only look at the text
+    written since the innermost mark, which is what a separate StringIO
+    for each traversal used to hold. line_number() on the other hand
+    counts all of the text, flushed or not.
+
+    If `out` is given, the text collected is written to `out` once there
+    are more than `flush_size` characters of it, provided that no mark is
+    outstanding and the text ends at the start of a line.
+    getvalue() then only gives the text written since the last flush.
+    Call flush() at the end to write the rest. If `keep` is true, the
+    text written to `out` is also kept, and written_text() gives it.
+    """
+
+    def __init__(
+        self,
+        out: Optional[TextIO] = None,
+        flush_size: int = FLUSH_SIZE,
+        keep: bool = False,
+    ):
+        self.parts = []
+        # The number of characters in self.parts.
+        self.size = 0
+        # The number of newlines in self.parts.
+        self.newlines = 0
+        # The number of characters and newlines written to self.out.
+        self.flushed = 0
+        self.flushed_newlines = 0
+        # For each outstanding mark, the length of self.parts,
+        # self.size and self.newlines when the mark was made.
+        self.marks = []
+        self.out = out
+        self.flush_size = flush_size
+        # The text written to self.out, if we keep it.
+        self.kept = [] if keep else None
+
+    def write(self, s: str):
+        if not s:
+            return
+        self.parts.append(s)
+        self.size += len(s)
+        self.newlines += s.count("\n")
+        if (
+            self.size > self.flush_size
+            and self.out is not None
+            and not self.marks
+            and s[-1] == "\n"
+        ):
+            self.flush()
+
+    def flush(self):
+        """Write the text collected so far to the output stream, unless
+        there is no output stream or a mark is outstanding."""
+        if self.out is None or self.marks:
+            return
+        text = "".join(self.parts)
+        self.out.write(text)
+        if self.kept is not None:
+            self.kept.append(text)
+        self.flushed += self.size
+        self.flushed_newlines += self.newlines
+        self.parts = []
+        self.size = 0
+        self.newlines = 0
+
+    def written_text(self) -> str:
+        """Return the text written to the output stream, which is kept
+        only if the buffer was made with `keep` set."""
+        text = "".join(self.kept)
+        self.kept = [text]
+        return text
+
+    def mark(self):
+        """Start collecting text for take()."""
+        self.marks.append((len(self.parts), self.size, self.newlines))
+
+    def take(self) -> str:
+        """Remove the text written since the innermost mark from the
+        buffer, and return it."""
+        index, size, newlines = self.marks.pop()
+        text = "".join(self.parts[index:])
+        del self.parts[index:]
+        self.size = size
+        self.newlines = newlines
+        return text
+
+    def start(self) -> int:
+        """Return the index in self.parts of the innermost mark."""
+        return self.marks[-1][0] if self.marks else 0
+
+    def tell(self) -> int:
+        """Return the number of characters written since the innermost
+        mark, or in all if there is no mark."""
+        if self.marks:
+            return self.size - self.marks[-1][1]
+        return self.flushed + self.size
+
+    def line_number(self) -> int:
+        """Return the line number, starting at 1, that the next text
+        written goes on."""
+        return self.flushed_newlines + self.newlines + 1
+
+    def getvalue(self) -> str:
+        """Return the text written since the innermost mark."""
+        start = self.start()
+        text = "".join(self.parts[start:])
+        # Keep the joined text so that asking again is cheap.
+        self.parts[start:] = [text] if text else []
+        return text
+
+    def tail(self, n: int) -> str:
+        """Return the last `n` characters of getvalue()."""
+        start = self.start()
+        chunks = []
+        length = 0
+        i = len(self.parts)
+        while i > start and length < n:
+            i -= 1
+            chunks.append(self.parts[i])
+            length += len(self.parts[i])
+        text = "".join(reversed(chunks))
+        return text[len(text) - n :] if length > n else text
+
+    def endswith(self, suffix: str) -> bool:
+        return self.tail(len(suffix)).endswith(suffix)
+
+    def last_line(self) -> str:
+        """Return the text after the last newline in getvalue()."""
+        start = self.start()
+        chunks = []
+        i = len(self.parts)
+        while i > start:
+            i -= 1
+            part = self.parts[i]
+            newline = part.rfind("\n")
+            if newline >= 0:
+                chunks.append(part[newline + 1 :])
+                break
+            chunks.append(part)
+        return "".join(reversed(chunks))
@@ -130,18 +130,17 @@ Python.
 #   evaluating the escape code.
 
 import sys
-from io import StringIO
 from typing import Optional
 
 from spark_parser import GenericASTTraversal
 from xdis import COMPILER_FLAG_BIT, IS_PYPY, iscode
 from xdis.version_info import PYTHON_VERSION_TRIPLE
 
-from uncompyle6.parser import get_python_parser, parse
+from uncompyle6.parser import checkin_parser, checkout_parser, parse
 from uncompyle6.parsers.treenode import SyntaxTree
+from uncompyle6.profiler import NULL_PROFILER
 from uncompyle6.scanner import Code, get_scanner
 from uncompyle6.scanners.tok import Token
-from uncompyle6.semantics.check_ast import checker
 from uncompyle6.semantics.consts import (
     ASSIGN_TUPLE_PARAM,
     INDENT_PER_LEVEL,
@@ -156,12 +155,12 @@ from uncompyle6.semantics.consts import (
     TAB,
     TABLE_DIRECT,
     TABLE_R,
-    escape,
+    compile_template,
 )
 from uncompyle6.semantics.customize import customize_for_version
 from uncompyle6.semantics.gencomp import ComprehensionMixin
 from uncompyle6.semantics.helper import (
-    find_globals_and_nonlocals,
+    find_tree_globals,
     is_lambda_mode,
     print_docstring,
 )
@@ -170,8 +169,10 @@ from uncompyle6.semantics.make_function2 import make_function2
 from uncompyle6.semantics.make_function3 import make_function3
 from uncompyle6.semantics.make_function36 import make_function36
 from uncompyle6.semantics.n_actions import NonterminalActions
+from uncompyle6.semantics.output import OutputBuffer
 from uncompyle6.semantics.parser_error import ParserError
 from uncompyle6.semantics.transform import TreeTransform, is_docstring
+from uncompyle6.semantics.traversal import StackTraversal
 from uncompyle6.show import maybe_show_tree
 from uncompyle6.util import better_repr
 
@@ -206,7 +207,7 @@ class SourceWalkerError(Exception):
         return self.errmsg
 
 
-class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
+class SourceWalker(StackTraversal, NonterminalActions, ComprehensionMixin):
     """
     Class to traverse a Parse Tree of the bytecode instruction built from parsing to
     produce some sort of source text.
@@ -253,12 +254,12 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         to use when there is ambiguity.
 
         """
-        GenericASTTraversal.__init__(self, ast=None)
+        StackTraversal.__init__(self, ast=None)
 
         self.scanner = scanner
         params = {"f": out, "indent": ""}
         self.version = version
-        self.p = get_python_parser(
+        self.p = checkout_parser(
             version,
             debug_parser=dict(debug_parser),
             compile_mode=compile_mode,
@@ -282,8 +283,12 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         self.params = params
         self.pending_newlines = 0
         self.prec = NO_PARENTHESIS_EVER
+        self.profiler = NULL_PROFILER
         self.return_none = False
         self.showast = showast
+        self.keep_text = False
+        self.stream_output = False
+        self.text = None
         self.version = version
 
         self.treeTransform = TreeTransform(version=self.version, show_ast=showast)
@@ -292,8 +297,9 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         # modularity is broken here
         self.insts = scanner.insts
 
-        # Initialize p_lambda on demand
-        self.p_lambda = None
+        # Parsers for other compile modes, checked out on demand.
+        # See mode_parser().
+        self.mode_parsers = {}
 
         # This is in Python 2.6 on. It changes the way
         # strings get interpreted. See n_LOAD_CONST
@@ -332,6 +338,45 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
 
         return
 
+    def checkin_parser(self):
+        """Return our parser to the parser pool for use by later walkers.
+        If this walker parses code objects after that, ensure_parser()
+        checks out another.
+        """
+        if self.p is not None:
+            checkin_parser(self.p)
+            self.p = None
+        for p in self.mode_parsers.values():
+            checkin_parser(p)
+        self.mode_parsers.clear()
+
+    def ensure_parser(self):
+        """Check out a parser if checkin_parser() gave ours back."""
+        if self.p is None:
+            self.p = checkout_parser(
+                self.version,
+                debug_parser=dict(self.debug_parser),
+                compile_mode=self.compile_mode,
+                is_pypy=self.is_pypy,
+            )
+
+    def mode_parser(self, compile_mode: str):
+        """Return a parser for `compile_mode`, such as the "exec" parser
+        that comprehensions need when we are decompiling a lambda. The
+        parser is checked out the first time a mode is asked for and
+        reused for later code objects. Its grammar is rolled back to the
+        base grammar, as if it were new.
+        """
+        p = self.mode_parsers.get(compile_mode)
+        if p is None:
+            p = checkout_parser(
+                self.version, compile_mode=compile_mode, is_pypy=self.is_pypy
+            )
+            self.mode_parsers[compile_mode] = p
+        else:
+            p.reset_grammar()
+        return p
+
     def maybe_show_tree(self, tree, phase):
         if self.showast.get("before", False):
             self.println(
@@ -445,9 +490,11 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         if hasattr(node, "linestart") and node.linestart:
             self.line_number = node.linestart
 
-    def preorder(self, node=None):
-        super(SourceWalker, self).preorder(node)
-        self.set_pos_info(node)
+    def preorder_finish(self, node, start):
+        # This is set_pos_info(), which is called for every node.
+        linestart = getattr(node, "linestart", None)
+        if linestart:
+            self.line_number = linestart
 
     def indent_more(self, indent=TAB):
         self.indent += indent
@@ -455,56 +502,65 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
     def indent_less(self, indent=TAB):
         self.indent = self.indent[: -len(indent)]
 
-    def traverse(self, node, indent=None, is_lambda=False):
+    def push_params(self, f, indent, is_lambda):
         self.param_stack.append(self.params)
         if indent is None:
             indent = self.indent
-        p = self.pending_newlines
-        self.pending_newlines = 0
         self.params = {
             "_globals": {},
             "_nonlocals": {},  # Python 3 has nonlocal
-            "f": StringIO(),
+            "f": f,
             "indent": indent,
             "is_lambda": is_lambda,
         }
-        self.preorder(node)
-        self.f.write("\n" * self.pending_newlines)
-        result = self.f.getvalue()
+
+    def traverse(self, node, indent=None, is_lambda=False) -> str:
+        """Return the source text for `node`. The text is written to
+        the end of the output buffer and then taken back out of it, so
+        that nested traversals don't each need a buffer of their own."""
+        f = self.f
+        if not isinstance(f, OutputBuffer):
+            f = OutputBuffer()
+        p = self.pending_newlines
+        self.pending_newlines = 0
+        f.mark()
+        self.push_params(f, indent, is_lambda)
+        try:
+            self.preorder(node)
+            f.write("\n" * self.pending_newlines)
+        finally:
+            result = f.take()
         self.params = self.param_stack.pop()
         self.pending_newlines = p
         return result
 
     def write(self, *data):
-        if (len(data) == 0) or (len(data) == 1 and data[0] == ""):
+        if len(data) == 1:
+            out = data[0]
+            if out == "":
+                return
+            if not isinstance(out, str):
+                out = str(out)
+        elif len(data) == 0:
+            return
+        else:
+            out = "".join((str(j) for j in data))
+
+        # Newlines at either end of `out` are held back in
+        # self.pending_newlines, so that consecutive blank lines can be
+        # merged.
+        text = out.lstrip("\n")
+        n = len(out) - len(text)
+        if n > self.pending_newlines:
+            self.pending_newlines = n
+        if not text:
             return
-        out = "".join((str(j) for j in data))
-        n = 0
-        for i in out:
-            if i == "\n":
-                n += 1
-                if n == len(out):
-                    self.pending_newlines = max(self.pending_newlines, n)
-                    return
-            elif n:
-                self.pending_newlines = max(self.pending_newlines, n)
-                out = out[n:]
-                break
-            else:
-                break
 
         if self.pending_newlines > 0:
             self.f.write("\n" * self.pending_newlines)
-            self.pending_newlines = 0
-
-        for i in out[::-1]:
-            if i == "\n":
-                self.pending_newlines += 1
-            else:
-                break
 
-        if self.pending_newlines:
-            out = out[: -self.pending_newlines]
+        out = text.rstrip("\n")
+        self.pending_newlines = len(text) - len(out)
         self.f.write(out)
 
     def println(self, *data):
@@ -531,7 +587,7 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
 
     def pp_tuple(self, tup):
         """Pretty print a tuple"""
-        last_line = self.f.getvalue().split("\n")[-1]
+        last_line = self.f.last_line()
         ll = len(last_line) + 1
         indent = " " * ll
         self.write("(")
@@ -728,19 +784,15 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         # print(entry[0])
         # print('======')
 
-        fmt = entry[0]
+        steps, tail = compile_template(entry[0])
         arg = 1
-        i = 0
 
-        m = escape.search(fmt)
-        while m:
-            i = m.end()
-            self.write(m.group("prefix"))
+        for prefix, typ, child, expr, code in steps:
+            self.write(prefix)
 
-            typ = m.group("type") or "{"
             node = startnode
-            if m.group("child"):
-                node = node[int(m.group("child"))]
+            if child is not None:
+                node = node[child]
 
             if typ == "%":
                 self.write("%")
@@ -873,8 +925,6 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
                 self.prec = p
                 arg += 1
             elif typ == "{":
-                expr = m.group("expr")
-
                 # Line mapping stuff
                 if (
                     hasattr(node, "linestart")
@@ -888,13 +938,14 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
                     self.template_engine((expr, index), node)
                     arg += 1
                 else:
-                    d = node.__dict__
+                    d = (
+                        node.attributes() if isinstance(node, Token) else node.__dict__
+                    )
                     try:
-                        self.write(eval(expr, d, d))
+                        self.write(eval(code, d, d))
                     except Exception:
                         raise
-            m = escape.search(fmt, i)
-        self.write(fmt[i:])
+        self.write(tail)
 
     def default(self, node):
         mapping = self._get_mapping(node)
@@ -1151,9 +1202,7 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
             # else:
             #    print stmt[-1]
 
-        globals, nonlocals = find_globals_and_nonlocals(
-            ast, set(), set(), code, self.version
-        )
+        _, globals, nonlocals = find_tree_globals(ast, code, self.version)
         # Add "global" declaration statements at the top
         # of the function
         for g in sorted(globals):
@@ -1191,6 +1240,22 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         # if code would be empty, append 'pass'
         if len(ast) == 0:
             self.println(self.indent, "pass")
+        elif isinstance(self.f, OutputBuffer) or self.stream_output:
+            # Write the source straight into the output buffer, which
+            # gives the same text as writing the result of traverse()
+            # below, without copying it.
+            self.customize(customize)
+            f = self.f
+            if not isinstance(f, OutputBuffer):
+                # Keeping the text streamed out for self.text holds all
+                # of it in memory, so we only do that if asked to.
+                f = OutputBuffer(self.f, keep=self.keep_text)
+            self.push_params(f, None, is_lambda)
+            self.preorder(ast)
+            self.params = self.param_stack.pop()
+            if f is not self.f:
+                f.flush()
+                self.text = f.written_text() if self.keep_text else None
         else:
             self.customize(customize)
             self.text = self.traverse(ast, is_lambda=is_lambda)
@@ -1217,6 +1282,7 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         # FIXME: DRY with fragments.py
 
         # assert isinstance(tokens[0], Token)
+        self.ensure_parser()
 
         if is_lambda:
             for t in tokens:
@@ -1231,13 +1297,14 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
                 p_insts = self.p.insts
                 self.p.insts = self.scanner.insts
                 self.p.offset2inst_index = self.scanner.offset2inst_index
-                ast = parse(self.p, tokens, customize, code)
+                ast = parse(self.p, tokens, customize, code, self.profiler)
                 self.customize(customize)
                 self.p.insts = p_insts
 
             except (ParserError, AssertionError) as e:
                 raise ParserError(e, tokens, self.p.debug["reduce"])
-            transform_tree = self.treeTransform.transform(ast, code)
+            with self.profiler.phase("transform", code):
+                transform_tree = self.treeTransform.transform(ast, code)
             self.maybe_show_tree(ast, phase="after")
             del ast  # Save memory
             return transform_tree
@@ -1279,16 +1346,16 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
             self.p.insts = self.scanner.insts
             self.p.offset2inst_index = self.scanner.offset2inst_index
             self.p.opc = self.scanner.opc
-            ast = parse(self.p, tokens, customize, code)
+            ast = parse(self.p, tokens, customize, code, self.profiler)
             self.p.insts = p_insts
         except (ParserError, AssertionError) as e:
             raise ParserError(e, tokens, self.p.debug["reduce"])
 
-        checker(ast, False, self.ast_errors)
-
         self.customize(customize)
 
-        transform_tree = self.treeTransform.transform(ast, code)
+        with self.profiler.phase("transform", code):
+            transform_tree = self.treeTransform.transform(ast, code)
+        self.ast_errors.extend(transform_tree.info.errors)
 
         self.maybe_show_tree(transform_tree, phase="after")
 
@@ -1310,10 +1377,22 @@ def code_deparse(
     walker=SourceWalker,
     start_offset: int = 0,
     stop_offset: int = -1,
+    profiler=NULL_PROFILER,
+    stream_output: bool = False,
+    keep_text: bool = False,
 ) -> Optional[SourceWalker]:
     """
     ingests and deparses a given code block 'co'. If version is None,
     we will use the current Python interpreter version.
+
+    `profiler` is an uncompyle6.profiler.Profiler to record the time
+    spent in each phase of decompilation in.
+
+    If `stream_output` is True, source text is written to `out` as it
+    is generated rather than all at the end, so that it isn't all held
+    in memory. The `text` attribute of the walker returned is then None,
+    unless `keep_text` is True too. Otherwise `text` always has the
+    source text.
     """
 
     assert iscode(co)
@@ -1326,10 +1405,13 @@ def code_deparse(
 
     # store final output stream for case of error
     scanner = get_scanner(version, is_pypy=is_pypy, show_asm=debug_opts["asm"])
+    scanner.profiler = profiler
 
-    tokens, customize = scanner.ingest(
-        co, code_objects=code_objects, show_asm=debug_opts["asm"]
-    )
+    with profiler.phase("ingest", co) as record:
+        tokens, customize = scanner.ingest(
+            co, code_objects=code_objects, show_asm=debug_opts["asm"]
+        )
+        record["tokens"] = len(tokens)
 
     if start_offset > 0:
         for i, t in enumerate(tokens):
@@ -1360,100 +1442,111 @@ def code_deparse(
         is_pypy=is_pypy,
         linestarts=linestarts,
     )
+    deparsed.profiler = profiler
+    deparsed.stream_output = stream_output
+    deparsed.keep_text = keep_text
 
-    is_top_level_module = co.co_name == "<module>"
-    if compile_mode == "eval":
-        deparsed.hide_internal = False
-    deparsed.compile_mode = compile_mode
-    deparsed.ast = deparsed.build_ast(
-        tokens,
-        customize,
-        co,
-        is_lambda=is_lambda_mode(compile_mode),
-        is_top_level_module=is_top_level_module,
-        compile_mode=compile_mode,
-    )
-
-    # XXX workaround for profiling
-    if deparsed.ast is None:
-        return None
-
-    # FIXME use a lookup table here.
-    if is_lambda_mode(compile_mode):
-        expected_start = "lambda_start"
-    elif compile_mode == "eval":
-        expected_start = "expr_start"
-    elif compile_mode == "expr":
-        expected_start = "expr_start"
-    elif compile_mode == "exec":
-        expected_start = "stmts"
-    elif compile_mode == "single":
-        # expected_start = "single_start"
-        expected_start = None
-    else:
-        expected_start = None
-
-    if expected_start:
-        assert deparsed.ast == expected_start, (
-            f"Should have parsed grammar start to '{expected_start}'; "
-            f"got: {deparsed.ast.kind}"
+    # Set once the walker is handed back to the caller.
+    returned = False
+    try:
+        is_top_level_module = co.co_name == "<module>"
+        if compile_mode == "eval":
+            deparsed.hide_internal = False
+        deparsed.compile_mode = compile_mode
+        deparsed.ast = deparsed.build_ast(
+            tokens,
+            customize,
+            co,
+            is_lambda=is_lambda_mode(compile_mode),
+            is_top_level_module=is_top_level_module,
+            compile_mode=compile_mode,
         )
-    # save memory
-    del tokens
 
-    deparsed.mod_globs, nonlocals = find_globals_and_nonlocals(
-        deparsed.ast, set(), set(), co, version
-    )
+        # XXX workaround for profiling
+        if deparsed.ast is None:
+            return None
+
+        # FIXME use a lookup table here.
+        if is_lambda_mode(compile_mode):
+            expected_start = "lambda_start"
+        elif compile_mode == "eval":
+            expected_start = "expr_start"
+        elif compile_mode == "expr":
+            expected_start = "expr_start"
+        elif compile_mode == "exec":
+            expected_start = "stmts"
+        elif compile_mode == "single":
+            # expected_start = "single_start"
+            expected_start = None
+        else:
+            expected_start = None
 
-    assert not nonlocals
+        if expected_start:
+            assert deparsed.ast == expected_start, (
+                f"Should have parsed grammar start to '{expected_start}'; "
+                f"got: {deparsed.ast.kind}"
+            )
+        # save memory
+        del tokens
 
-    # convert leading '__doc__ = "..." into doc string
-    try:
-        stmts = deparsed.ast
-        first_stmt = stmts[0]
-        if version >= (3, 6):
-            if first_stmt[0] == "SETUP_ANNOTATIONS":
-                del stmts[0]
-                assert stmts[0] == "sstmt"
-                # Nuke sstmt
-                first_stmt = stmts[0][0]
+        _, deparsed.mod_globs, nonlocals = find_tree_globals(deparsed.ast, co, version)
+
+        assert not nonlocals
+
+        # convert leading '__doc__ = "..." into doc string
+        try:
+            stmts = deparsed.ast
+            first_stmt = stmts[0]
+            if version >= (3, 6):
+                if first_stmt[0] == "SETUP_ANNOTATIONS":
+                    del stmts[0]
+                    assert stmts[0] == "sstmt"
+                    # Nuke sstmt
+                    first_stmt = stmts[0][0]
+                    pass
                 pass
+            if first_stmt == "docstring":
+                print_docstring(deparsed, "", co.co_consts[0])
+                del stmts[0]
+            if stmts[-1] == RETURN_NONE:
+                stmts.pop()  # remove last node
+                # todo: if empty, add 'pass'
+        except Exception:
             pass
-        if first_stmt == "docstring":
-            print_docstring(deparsed, "", co.co_consts[0])
-            del stmts[0]
-        if stmts[-1] == RETURN_NONE:
-            stmts.pop()  # remove last node
-            # todo: if empty, add 'pass'
-    except Exception:
-        pass
-
-    deparsed.FUTURE_UNICODE_LITERALS = (
-        COMPILER_FLAG_BIT["FUTURE_UNICODE_LITERALS"] & co.co_flags != 0
-    )
 
-    # What we've been waiting for: Generate source from Syntax Tree!
-    deparsed.gen_source(
-        deparsed.ast,
-        name=co.co_name,
-        customize=customize,
-        is_lambda=is_lambda_mode(compile_mode),
-        debug_opts=debug_opts,
-    )
+        deparsed.FUTURE_UNICODE_LITERALS = (
+            COMPILER_FLAG_BIT["FUTURE_UNICODE_LITERALS"] & co.co_flags != 0
+        )
 
-    for g in sorted(deparsed.mod_globs):
-        deparsed.write("# global %s ## Warning: Unused global\n" % g)
+        # What we've been waiting for: Generate source from Syntax Tree!
+        with profiler.phase("gen_source", co):
+            deparsed.gen_source(
+                deparsed.ast,
+                name=co.co_name,
+                customize=customize,
+                is_lambda=is_lambda_mode(compile_mode),
+                debug_opts=debug_opts,
+            )
+
+        for g in sorted(deparsed.mod_globs):
+            deparsed.write("# global %s ## Warning: Unused global\n" % g)
 
-    if deparsed.ast_errors:
-        deparsed.write("# NOTE: have internal decompilation grammar errors.\n")
-        deparsed.write("# Use -T option to show full context.")
-        for err in deparsed.ast_errors:
-            deparsed.write(err)
-        raise SourceWalkerError("Deparsing hit an internal grammar-rule bug")
+        if deparsed.ast_errors:
+            deparsed.write("# NOTE: have internal decompilation grammar errors.\n")
+            deparsed.write("# Use -T option to show full context.")
+            for err in deparsed.ast_errors:
+                deparsed.write(err)
+            raise SourceWalkerError("Deparsing hit an internal grammar-rule bug")
 
-    if deparsed.ERROR:
-        raise SourceWalkerError("Deparsing stopped due to parse error")
-    return deparsed
+        if deparsed.ERROR:
+            raise SourceWalkerError("Deparsing stopped due to parse error")
+        returned = True
+        return deparsed
+    finally:
+        if not returned:
+            # The walker is lost to the caller, so its parser can go back
+            # to the pool. Callers done with a walker we return check it in.
+            deparsed.checkin_parser()
 
 
 def deparse_code2str(
@@ -1472,7 +1565,7 @@ def deparse_code2str(
     Return the deparsed text for a Python code object. `out` is where
     any intermediate output for assembly or tree output will be sent.
     """
-    return code_deparse(
+    deparsed = code_deparse(
         code,
         out,
         version,
@@ -1481,7 +1574,9 @@ def deparse_code2str(
         compile_mode=compile_mode,
         is_pypy=is_pypy,
         walker=walker,
-    ).text
+    )
+    deparsed.checkin_parser()
+    return deparsed.text
 
 
 if __name__ == "__main__":
@@ -21,7 +21,13 @@ from spark_parser import GenericASTTraversal, GenericASTTraversalPruningExceptio
 from uncompyle6.parsers.treenode import SyntaxTree
 from uncompyle6.scanners.tok import NoneToken, Token
 from uncompyle6.semantics.consts import ASSIGN_DOC_STRING, RETURN_NONE
-from uncompyle6.semantics.helper import find_code_node
+from uncompyle6.semantics.helper import (
+    find_code_node,
+    nonglobal_ops,
+    read_global_ops,
+    read_write_global_ops,
+)
+from uncompyle6.semantics.traversal import HandlerTable
 from uncompyle6.show import maybe_show_tree
 
 
@@ -68,6 +74,27 @@ def is_not_docstring(call_stmt_node) -> bool:
         return False
 
 
+class TreeInfo:
+    """
+    What TreeTransform.transform() finds out about a tree as it walks
+    it, so that the source walkers don't have to walk the tree again:
+
+    * all_globals: the names that find_all_globals() would find,
+    * globals, nonlocals: the names that find_globals_and_nonlocals()
+      would find, which need "global" and "nonlocal" statements,
+    * errors: the mistakes in the tree that check_ast.checker() would
+      report, like a "continue" outside of a loop.
+
+    The transformed tree has this as its "info" attribute.
+    """
+
+    def __init__(self):
+        self.all_globals = set()
+        self.globals = set()
+        self.nonlocals = set()
+        self.errors = []
+
+
 class TreeTransform(GenericASTTraversal, object):
     def __init__(
         self,
@@ -78,6 +105,14 @@ class TreeTransform(GenericASTTraversal, object):
         self.version = version
         self.showast = show_ast
         self.is_pypy = is_pypy
+
+        # The n_* method for each kind of node; see HandlerTable.
+        self.handlers = HandlerTable(self)
+
+        # Set in transform().
+        self.code = None
+        self.info = TreeInfo()
+        self.loop_depth = 0
         return
 
     def maybe_show_tree(self, tree):
@@ -87,31 +122,93 @@ class TreeTransform(GenericASTTraversal, object):
             maybe_show_tree(self, tree)
 
     def preorder(self, node=None):
-        """Walk the tree in roughly 'preorder' (a bit of a lie explained below).
-        For each node with typestring name *name* if the
-        node has a method called n_*name*, call that before walking
-        children.
-
-        In typical use a node with children can call "preorder" in any
-        order it wants which may skip children or order then in ways
-        other than first to last.  In fact, this this happens.  So in
-        this sense this function not strictly preorder.
+        """Walk the tree in preorder, replacing each node by what the
+        n_*name* method for its typestring name *name* returns, if there
+        is such a method, and then walking the children of what it
+        returned. The transformed tree is returned.
+
+        The children are walked using a stack of our own, rather than
+        by recursion, so that deep trees don't exceed the recursion
+        limit.
         """
         if node is None:
             node = self.ast
 
+        node = self.transform_node(node)
+        if not isinstance(node, SyntaxTree):
+            return node
+
+        # Each entry is a node whose children we are walking, the index
+        # of the next child, and whether the node is a loop.
+        stack = [[node, 0, self.enter_tree(node)]]
+        while stack:
+            entry = stack[-1]
+            parent, i, is_loop = entry
+            if i < len(parent):
+                entry[1] = i + 1
+                kid = parent[i]
+                if not self.loop_depth and kid.kind in ("continue", "break"):
+                    text = str(kid)
+                    self.info.errors.append(
+                        "\n# not in loop:\n#\t" + "\n# ".join(text.split("\n"))
+                    )
+                kid = parent[i] = self.transform_node(kid)
+                if isinstance(kid, SyntaxTree):
+                    stack.append([kid, 0, self.enter_tree(kid)])
+                continue
+            stack.pop()
+            if is_loop:
+                self.loop_depth -= 1
+        return node
+
+    def transform_node(self, node):
+        """Return what the n_*name* method for `node` gives, or `node`
+        itself if there is no such method. None is returned if the
+        method prunes `node`."""
         try:
-            name = "n_" + self.typestring(node)
-            if hasattr(self, name):
-                func = getattr(self, name)
+            func = self.handlers[self.typestring(node)]
+            if func is not None:
                 node = func(node)
         except GenericASTTraversalPruningException:
-            return
+            return None
 
-        for i, kid in enumerate(node):
-            node[i] = self.preorder(kid)
+        if not isinstance(node, SyntaxTree) and node is not None:
+            self.note_token(node)
         return node
 
+    def enter_tree(self, node) -> bool:
+        """Do the checks of check_ast.checker() on `node`, whose children
+        we are about to walk. Return whether `node` is a loop."""
+        kind = node.kind
+        if kind in ("aug_assign1", "aug_assign2") and node[0][0] == "and":
+            text = str(node)
+            self.info.errors.append(
+                "\n# improper augmented assignment (e.g. +=, *=, ...):\n#\t"
+                + "\n# ".join(text.split("\n"))
+                + "\n"
+            )
+        is_loop = kind.startswith(("for", "while", "async_for"))
+        if is_loop:
+            self.loop_depth += 1
+        return is_loop
+
+    def note_token(self, token):
+        """Add the name in `token` to the global or nonlocal names in
+        self.info if it is one of those."""
+        kind = token.kind
+        if kind in read_write_global_ops:
+            self.info.all_globals.add(token.pattr)
+        if kind in read_global_ops:
+            self.info.globals.add(token.pattr)
+        elif (
+            self.version >= (3, 0)
+            and kind in nonglobal_ops
+            and token.pattr in self.code.co_freevars
+            and token.pattr != self.code.co_name
+            and self.code.co_name != "<lambda>"
+        ):
+            self.info.nonlocals.add(token.pattr)
+
     def n_mkfunc(self, node):
         """If the function has a docstring (this is found in the code
         constants), pull that out and make it part of the syntax
@@ -465,10 +562,17 @@ class TreeTransform(GenericASTTraversal, object):
         return node
 
     def transform(self, parse_tree: GenericASTTraversal, code) -> GenericASTTraversal:
+        """Return the transformed `parse_tree` of `code`. The tree that
+        is returned has a TreeInfo as its "info" attribute.
+        """
         self.maybe_show_tree(parse_tree)
         self.ast = copy(parse_tree)
         del parse_tree
+        self.code = code
+        self.info = TreeInfo()
+        self.loop_depth = 0
         self.ast = self.traverse(self.ast, is_lambda=False)
+        self.ast.info = self.info
         n = len(self.ast)
 
         try:
@@ -0,0 +1,162 @@
+#  Copyright (c) 2026 by Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Walking parse trees with a stack of our own rather than by recursion.
+
+A recursive walk uses a Python frame for each level of the tree, so a
+deep tree, like that of a long string concatenation, can exceed the
+recursion limit, and the frames cost time to set up besides. The walks
+here use a list as the stack, so the depth of the tree they can handle
+is limited only by memory.
+
+That goes for the walks between parsing and generating source, and for
+the walk of each statement and expression that generates source. But
+many handlers, and the %c, %p and similar specifiers of template_engine(),
+call preorder() for the subtrees they expand, and each such call starts
+a walk of its own. So generating source for a deeply nested expression
+still uses a few frames for each level, and the recursion limit that
+uncompyle6/__init__.py sets is what bounds the depth we can decompile.
+"""
+
+from spark_parser import GenericASTTraversal, GenericASTTraversalPruningException
+
+from uncompyle6.parsers.treenode import SyntaxTree
+
+
+class HandlerTable(dict):
+    """
+    The n_<kind> method of a walker for each kind of node, or None for a
+    kind that has none, so that finding the handler for a node is a
+    dictionary lookup. A kind's method is looked up by name the first
+    time the kind is asked for.
+
+    The handlers of a walker are found this way, rather than once for
+    each walker class, because some are set on the walker itself by
+    customize_for_version(). So a handler has to be set on a walker
+    before the walk that uses it starts.
+
+    With `suffix` "_exit", the table is of the n_<kind>_exit methods.
+    """
+
+    def __init__(self, walker, suffix: str = ""):
+        super().__init__()
+        self.walker = walker
+        self.suffix = suffix
+
+    def __missing__(self, kind: str):
+        func = getattr(self.walker, "n_" + kind + self.suffix, None)
+        self[kind] = func
+        return func
+
+
+class StackTraversal(GenericASTTraversal):
+    """
+    A GenericASTTraversal whose preorder() walks the children of a node
+    using a stack rather than by calling itself.
+
+    The handlers are called the same way: n_<kind>() or else default()
+    when a node is reached, and n_<kind>_exit() after its children have
+    been walked unless the node was pruned. A handler can still call
+    preorder() on any node it likes; that starts a walk of its own, so
+    it uses frames as a recursive walk would.
+
+    Since the children of a node are not walked by calling preorder(),
+    work that a subclass would do before and after walking each node
+    goes in preorder_start() and preorder_finish() instead; see below.
+    """
+
+    def __init__(self, ast):
+        super().__init__(ast)
+        self.handlers = HandlerTable(self)
+        self.exit_handlers = HandlerTable(self, "_exit")
+
+    # Subclasses can define these:
+    #
+    #   preorder_start(node): called when `node` is reached, before its
+    #     handler. What is returned is passed to preorder_finish().
+    #   preorder_finish(node, start): called when we are done with
+    #     `node`, whether or not it was pruned. `start` is what
+    #     preorder_start() returned for it, or None.
+    #
+    # Most walks have no use for them, so rather than calling methods
+    # that do nothing for each node, None means there is none.
+    preorder_start = None
+    preorder_finish = None
+
+    def preorder(self, node=None):
+        if node is None:
+            node = self.ast
+
+        # Each entry is a node whose children we are walking, its
+        # children (none for a token), the index of the next child, the
+        # node's kind, and what preorder_start() gave for it.
+        # Handlers often call preorder() themselves, so we call them
+        # here rather than in a method of their own, to keep the
+        # frames for each level of such a walk few.
+        stack = []
+        handlers = self.handlers
+        preorder_start = self.preorder_start
+        preorder_finish = self.preorder_finish
+        start = None
+        while True:
+            if preorder_start is not None:
+                start = preorder_start(node)
+            kind = self.typestring(node)
+            try:
+                func = handlers[kind]
+                if func is not None:
+                    func(node)
+                else:
+                    self.default(node)
+            except GenericASTTraversalPruningException:
+                if preorder_finish is not None:
+                    preorder_finish(node, start)
+            else:
+                kids = node if isinstance(node, SyntaxTree) else ()
+                stack.append([node, kids, 0, kind, start])
+
+            while stack:
+                entry = stack[-1]
+                node, kids, i, kind, start = entry
+                if i < len(kids):
+                    # The children are looked at as we get to them, as
+                    # a handler may have changed them.
+                    entry[2] = i + 1
+                    node = kids[i]
+                    break
+                stack.pop()
+                func = self.exit_handlers[kind]
+                if func is not None:
+                    func(node)
+                if preorder_finish is not None:
+                    preorder_finish(node, start)
+            else:
+                return
+
+
+def tree_tokens(node, skip=()):
+    """Yield the tokens of parse tree `node` from left to right. The
+    subtrees whose kind is in `skip` are left out."""
+    stack = [iter(node)]
+    while stack:
+        for kid in stack[-1]:
+            if isinstance(kid, SyntaxTree):
+                if kid.kind not in skip:
+                    stack.append(iter(kid))
+                    break
+            else:
+                yield kid
+        else:
+            stack.pop()
@@ -0,0 +1,232 @@
+#  Copyright (c) 2026 by Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Check decompiled source files in the background.
+
+uncompyle6.main.main() hands each file it writes to a Verifier, and
+goes on decompiling the next file while the checks run. Checks are run
+by a pool of threads:
+
+  syntax     parse the file with ast.parse()
+  run        run the file in a separate Python interpreter and check its
+             exit status
+  roundtrip  compile the file and compare its code with that of the
+             bytecode file it was decompiled from; see
+             uncompyle6.verify.compare_roundtrip()
+
+For "run" checks, each thread keeps a long-lived worker interpreter,
+uncompyle6/run_worker.py, which it feeds file names to over a pipe. The
+worker forks a child process for each file, so we don't pay for
+starting a new interpreter each time. A worker that dies is replaced
+when it is next needed.
+
+A program that we run is limited in the time and memory it can use,
+but that is all: it runs with our privileges, and can read and write
+whatever we can. So only run code that you would trust anyway.
+
+submit() returns a concurrent.futures.Future whose result is a
+VerifyResult.
+"""
+
+import ast
+import json
+import os
+import os.path as osp
+import subprocess
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from uncompyle6.verify import compare_roundtrip
+
+# The result of checking a file. `check` is "syntax", "run" or
+# "roundtrip", and `valid` says whether the check passed. For "run",
+# `output` and `errors` are what the program wrote to stdout and stderr;
+# for the others, `errors` says what was wrong.
+VerifyResult = namedtuple("VerifyResult", "filename check valid output errors")
+
+# How each check is named in messages.
+CHECK_DESCRIPTIONS = {
+    "syntax": "syntax check",
+    "run": "run",
+    "roundtrip": "round-trip check",
+}
+
+# The most threads, and so worker interpreters, a Verifier uses by
+# default.
+MAX_DEFAULT_JOBS = 4
+
+# The most seconds that a program we run to check it may take by
+# default, so that one which never ends doesn't hang the checks.
+DEFAULT_RUN_TIMEOUT = 60
+
+# The most bytes of address space that a program we run to check it may
+# use by default.
+DEFAULT_RUN_MEMORY = 2 * 1024 * 1024 * 1024
+
+# Seconds past a program's timeout that we wait for the worker running
+# it to reply before we kill the worker.
+WORKER_GRACE = 5
+
+RUN_WORKER_PATH = osp.join(osp.dirname(__file__), "run_worker.py")
+
+
+def syntax_check(filename: str) -> VerifyResult:
+    with open(filename) as f:
+        source = f.read()
+    try:
+        ast.parse(source, filename)
+    except SyntaxError as e:
+        return VerifyResult(filename, "syntax", False, "", str(e))
+    return VerifyResult(filename, "syntax", True, "", "")
+
+
+def roundtrip_check(filename: str, pyc_filename: str) -> VerifyResult:
+    message = compare_roundtrip(pyc_filename, filename)
+    return VerifyResult(filename, "roundtrip", message is None, "", message or "")
+
+
+class RunWorker:
+    """A worker interpreter running uncompyle6/run_worker.py."""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, RUN_WORKER_PATH],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            encoding="utf-8",
+        )
+
+    def run(
+        self, filename: str, timeout: Optional[float], max_memory: Optional[int]
+    ) -> dict:
+        """Run program `filename`, and return the worker's reply. Raise
+        OSError if the worker has died, or if it hasn't replied within
+        WORKER_GRACE seconds of `timeout`, in which case we kill it."""
+        request = {
+            "path": osp.abspath(filename),
+            "timeout": timeout,
+            "max_memory": max_memory,
+        }
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, ValueError) as e:
+            raise OSError(f"verify worker died: {e}")
+        # The worker kills a program that runs too long, so it should
+        # reply in time; if it doesn't, kill it so that we stop waiting.
+        timer = None
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            self.process.kill()
+
+        if timeout is not None:
+            timer = threading.Timer(timeout + WORKER_GRACE, kill)
+            timer.daemon = True
+            timer.start()
+        try:
+            reply = self.process.stdout.readline()
+        finally:
+            if timer is not None:
+                timer.cancel()
+        if not reply:
+            exitcode = self.process.wait()
+            if timed_out.is_set():
+                raise OSError(f"verify worker timed out after {timeout} seconds")
+            raise OSError(f"verify worker died with exit code {exitcode}")
+        return json.loads(reply)
+
+    def stop(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+
+class Verifier:
+    """Checks files in `jobs` threads. `timeout` is the most seconds a
+    program may take when running it, and `max_memory` the most bytes
+    of address space it may use; None means no limit.
+    """
+
+    def __init__(
+        self,
+        jobs: Optional[int] = None,
+        timeout: Optional[float] = DEFAULT_RUN_TIMEOUT,
+        max_memory: Optional[int] = DEFAULT_RUN_MEMORY,
+    ):
+        if jobs is None:
+            jobs = min(MAX_DEFAULT_JOBS, os.cpu_count() or 1)
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.local = threading.local()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def submit(self, filename: str, check: str, pyc_filename: Optional[str] = None):
+        """Start checking `filename`, and return a Future for the
+        VerifyResult. `check` is "syntax", "run" or "roundtrip"; for
+        "roundtrip", `pyc_filename` is the bytecode file that `filename`
+        was decompiled from."""
+        if check == "run":
+            return self.executor.submit(self.run_check, filename)
+        if check == "roundtrip":
+            return self.executor.submit(roundtrip_check, filename, pyc_filename)
+        return self.executor.submit(syntax_check, filename)
+
+    def run_check(self, filename: str) -> VerifyResult:
+        worker = getattr(self.local, "worker", None)
+        if worker is None or worker.process.poll() is not None:
+            worker = self.local.worker = RunWorker()
+            with self.lock:
+                self.workers.append(worker)
+        try:
+            reply = worker.run(filename, self.timeout, self.max_memory)
+        except OSError as e:
+            self.local.worker = None
+            return VerifyResult(filename, "run", False, "", str(e))
+        return VerifyResult(
+            filename,
+            "run",
+            reply["returncode"] == 0,
+            reply["stdout"],
+            reply["stderr"],
+        )
+
+    def close(self):
+        """Wait for the checks submitted to finish, and stop the
+        worker interpreters."""
+        self.executor.shutdown(wait=True)
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -18,15 +18,26 @@
 byte-code verification
 """
 
+import hashlib
 import operator
 import sys
+from bisect import bisect_left
+from collections import namedtuple
+from dis import get_instructions
 from functools import reduce
+from opcode import hasconst, hasjabs, hasjrel
 from subprocess import call
 
 import xdis.std as dis
 from xdis import PYTHON_MAGIC_INT, iscode, load_file, load_module, pretty_code_flags
-from xdis.version_info import PythonImplementation
-
+from xdis.version_info import (
+    IS_PYPY,
+    PYTHON_VERSION_TRIPLE,
+    PythonImplementation,
+    version_tuple_to_str,
+)
+
+from uncompyle6.code_fns import code_digest
 from uncompyle6.scanner import Token as ScannerToken, get_scanner
 
 truediv = operator.truediv
@@ -452,6 +463,8 @@ def cmp_code_objects(version, is_pypy, code_obj1, code_obj2, verify, name=""):
 class Token(ScannerToken):
     """Token class with changed semantics for 'cmp()'."""
 
+    __slots__ = ()
+
     def __cmp__(self, o):
         t = self.kind  # shortcut
         if t == "BUILD_TUPLE_0" and o.kind == "LOAD_CONST" and o.pattr == ():
@@ -476,6 +489,226 @@ class Token(ScannerToken):
         return "%s\t%-17s %r" % (self.offset, self.kind, self.pattr)
 
 
+# --- round-trip compare ---
+#
+# To check a decompilation, we compile the source text we wrote and
+# compare the code objects we get with the ones we started with.
+# cmp_code_objects() goes over both trees member by member, which is a
+# lot of work for the usual case, where everything matches. Instead we
+# first reduce each code object to a fingerprint, a digest of:
+#
+#   * its signature: argument counts and names, and flags,
+#   * its instructions, with jump targets given as instruction
+#     indices rather than offsets, and without the instructions that
+#     only pad or widen others,
+#   * the constants its instructions load, in the order they are first
+#     loaded. A code object constant is given by its own fingerprint,
+#     so the fingerprint of a module covers all the code in it.
+#
+# Line numbers, file names, stack sizes and the order of co_consts and
+# co_names are left out, since decompiled code can't be expected to
+# reproduce those. Only when fingerprints differ do we go back and look
+# for the instruction that differs. This works only for code compiled
+# by the Python we are running under.
+
+# Instructions that don't change what the code does.
+ROUNDTRIP_IGNORED_OPNAMES = frozenset(["CACHE", "EXTENDED_ARG", "NOP"])
+
+JUMP_OPCODES = frozenset(hasjrel) | frozenset(hasjabs)
+CONST_OPCODES = frozenset(hasconst)
+
+# `signature` is a tuple of (member, value) pairs. `ops` is a list of
+# (opname, argument) pairs for `instructions`, the dis.Instructions we
+# keep. The argument of a LOAD_CONST-like instruction is an index into
+# `consts`, and `codes` maps the entries of `consts` that stand for
+# code objects to those code objects.
+CanonicalCode = namedtuple("CanonicalCode", "signature ops instructions consts codes")
+
+
+def const_key(value):
+    """Return a hashable key for constant `value`, which is not a code
+    object. Equal constants have equal keys."""
+    if isinstance(value, tuple):
+        return ("tuple",) + tuple(const_key(item) for item in value)
+    if isinstance(value, frozenset):
+        # The iteration order of a set can vary from run to run.
+        return ("frozenset", code_digest(value))
+    return (type(value).__name__, repr(value))
+
+
+def canonical_code(co, fingerprints: dict) -> CanonicalCode:
+    """Return the CanonicalCode for code object `co`. `fingerprints` is
+    passed on to code_fingerprint() for the code objects in `co`."""
+    nargs = co.co_argcount + co.co_kwonlyargcount
+    if co.co_flags & 0x0004:  # CO_VARARGS
+        nargs += 1
+    if co.co_flags & 0x0008:  # CO_VARKEYWORDS
+        nargs += 1
+    signature = (
+        ("co_argcount", co.co_argcount),
+        ("co_posonlyargcount", getattr(co, "co_posonlyargcount", 0)),
+        ("co_kwonlyargcount", co.co_kwonlyargcount),
+        # As in cmp_code_objects(), we don't care about COROUTINE or
+        # GENERATOR.
+        ("co_flags", co.co_flags & ~0x000000A0),
+        ("arguments", co.co_varnames[:nargs]),
+    )
+
+    instructions = [
+        inst
+        for inst in get_instructions(co)
+        if inst.opname not in ROUNDTRIP_IGNORED_OPNAMES
+    ]
+    offsets = [inst.offset for inst in instructions]
+    ops = []
+    consts = []
+    const_indices = {}
+    codes = {}
+    for inst in instructions:
+        if inst.opcode in JUMP_OPCODES:
+            # A jump to an instruction that we dropped goes to the next
+            # one that we kept.
+            arg = bisect_left(offsets, inst.argval)
+        elif inst.opcode in CONST_OPCODES:
+            value = inst.argval
+            if iscode(value):
+                key = ("code", code_fingerprint(value, fingerprints))
+                codes[key] = value
+            else:
+                key = const_key(value)
+            arg = const_indices.get(key)
+            if arg is None:
+                arg = const_indices[key] = len(consts)
+                consts.append(key)
+        elif inst.arg is None:
+            arg = None
+        else:
+            arg = inst.argval
+        ops.append((inst.opname, arg))
+    return CanonicalCode(signature, ops, instructions, consts, codes)
+
+
+def code_fingerprint(co, fingerprints: dict) -> str:
+    """Return the fingerprint of code object `co` as a hex digest.
+
+    `fingerprints` caches the fingerprints of `co` and the code objects
+    in it. It maps the id() of a code object to a (code object,
+    fingerprint) pair.
+    """
+    entry = fingerprints.get(id(co))
+    if entry is not None and entry[0] is co:
+        return entry[1]
+    canonical = canonical_code(co, fingerprints)
+    h = hashlib.sha1()
+    h.update(
+        repr((canonical.signature, canonical.ops)).encode("utf-8", "backslashreplace")
+    )
+    h.update(b"K")
+    h.update(repr(canonical.consts).encode("utf-8", "backslashreplace"))
+    fingerprint = h.hexdigest()
+    fingerprints[id(co)] = (co, fingerprint)
+    return fingerprint
+
+
+def format_instruction(inst) -> str:
+    if inst.opcode in JUMP_OPCODES:
+        argrepr = "to %s" % inst.argval
+    else:
+        argrepr = inst.argrepr
+    return "%s\t%-17s %s" % (inst.offset, inst.opname, argrepr)
+
+
+def diff_code_objects(code_obj1, code_obj2, fingerprints1, fingerprints2, name=""):
+    """Raise a VerifyCmpError for the first difference between code
+    objects `code_obj1` and `code_obj2`, whose fingerprints differ.
+    `fingerprints1` and `fingerprints2` are the caches used in computing
+    those fingerprints.
+    """
+    name = "%s.%s" % (name, code_obj1.co_name) if name else code_obj1.co_name
+    canonical1 = canonical_code(code_obj1, fingerprints1)
+    canonical2 = canonical_code(code_obj2, fingerprints2)
+
+    for (member, value1), (_, value2) in zip(
+        canonical1.signature, canonical2.signature
+    ):
+        if value1 != value2:
+            if member == "co_flags":
+                value1, value2 = pretty_code_flags(value1), pretty_code_flags(value2)
+            raise CmpErrorMember(name, member, value1, value2)
+
+    tokens1 = [format_instruction(inst) for inst in canonical1.instructions]
+    tokens2 = [format_instruction(inst) for inst in canonical2.instructions]
+    children = []
+    for i, ((opname1, arg1), (opname2, arg2)) in enumerate(
+        zip(canonical1.ops, canonical2.ops)
+    ):
+        if canonical1.instructions[i].opcode in CONST_OPCODES:
+            arg1 = canonical1.consts[arg1]
+        if canonical2.instructions[i].opcode in CONST_OPCODES:
+            arg2 = canonical2.consts[arg2]
+        if opname1 == opname2 and arg1 == arg2:
+            continue
+        if opname1 == opname2 and arg1 in canonical1.codes and arg2 in canonical2.codes:
+            # Look inside the code objects once we know that everything
+            # around them matches.
+            children.append((canonical1.codes[arg1], canonical2.codes[arg2]))
+            continue
+        raise CmpErrorCode(
+            name,
+            canonical1.instructions[i].offset,
+            tokens1[i],
+            tokens2[i],
+            tokens1,
+            tokens2,
+        )
+    if len(tokens1) != len(tokens2):
+        raise CmpErrorCodeLen(name, tokens1, tokens2)
+
+    for child1, child2 in children:
+        diff_code_objects(child1, child2, fingerprints1, fingerprints2, name)
+
+
+def cmp_code_fingerprints(code_obj1, code_obj2):
+    """Compare two code objects, compiled by the Python we are running
+    under, by their fingerprints. If they differ, raise a VerifyCmpError
+    for the first difference.
+    """
+    fingerprints1 = {}
+    fingerprints2 = {}
+    if code_fingerprint(code_obj1, fingerprints1) != code_fingerprint(
+        code_obj2, fingerprints2
+    ):
+        diff_code_objects(code_obj1, code_obj2, fingerprints1, fingerprints2)
+
+
+def compare_roundtrip(pyc_filename, src_filename):
+    """Compile source file `src_filename`, decompiled from
+    `pyc_filename`, and compare its code with the code in
+    `pyc_filename`. If everything is okay, None is returned. Otherwise a
+    string message describing the mismatch is returned.
+    """
+    version, _, _, code_obj1, python_implementation, _, _, _ = load_module(
+        pyc_filename
+    )
+    is_pypy = python_implementation is PythonImplementation.PyPy
+    if version[:2] != PYTHON_VERSION_TRIPLE[:2] or is_pypy != IS_PYPY:
+        return "Can't compare code - Python is running %s, but code is %s" % (
+            version_tuple_to_str(PYTHON_VERSION_TRIPLE, end=2),
+            version_tuple_to_str(version, end=2),
+        )
+    with open(src_filename, "rb") as f:
+        source = f.read()
+    try:
+        code_obj2 = compile(source, pyc_filename, "exec")
+    except SyntaxError as e:
+        return str(e)
+    try:
+        cmp_code_fingerprints(code_obj1, code_obj2)
+    except VerifyCmpError as e:
+        return str(e)
+    return None
+
+
 def compare_code_with_srcfile(pyc_filename, src_filename, verify):
     """Compare a .pyc with a source code file. If everything is okay, None
     is returned. Otherwise a string message describing the mismatch is returned.
@@ -504,7 +737,7 @@ def compare_code_with_srcfile(pyc_filename, src_filename, verify):
     cmp_code_objects(version, python_implementation, code_obj1, code_obj2, verify)
     if verify == "verify-run":
         try:
-            retcode = call("%s %s" % (sys.executable, src_filename), shell=True)
+            retcode = call([sys.executable, src_filename])
             if retcode != 0:
                 return "Child was terminated by signal %d" % retcode
             pass